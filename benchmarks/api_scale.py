@@ -0,0 +1,208 @@
+"""Data-scale benchmark for the list and detail endpoints.
+
+Seeds a large session (benchmarks/seed_data.py) into a throwaway SQLite database, plus
+smaller sessions around it, then calls the endpoints through the Flask test client:
+/api/applications with every combination of its filters, /api/scraped-jds, /api/status
+and /api/applications/<id>. For each request it reports latency (median and p95 over
+--repeat calls), ORM rows read, SQL statements, rows returned, response bytes and peak
+Python memory. A filtered request that reads far more rows than it returns is being
+filtered in Python.
+
+    python -m benchmarks.api_scale [--applications 5000] [--scraped-jds 1250] [--repeat 3]
+        [--database sqlite:///bench.db --session seed-50-0] [--save report.json]
+        [--compare baseline.json] [--tolerance 0.2] [--max-read-ratio 2]
+
+--compare fails (exit code 1) when a request got slower, read more rows or used more
+memory than in the baseline by more than --tolerance. --max-read-ratio fails filtered
+requests that read more than that many rows per row returned. Needs the app's
+dependencies; start Redis first, because /api/scraped-jds reads prefetch state from it.
+
+Runtime grows with the seeded rows and --repeat. The defaults finish in a minute or two;
+a full-scale run (--applications 20000 --scraped-jds 5000 --repeat 5) takes more than
+eight minutes, most of it seeding. Seed once with benchmarks/seed_data.py and pass
+--database/--session to repeat runs without reseeding.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+FILTER_NAMES = ('company', 'status', 'min_score', 'max_score', 'from_date', 'to_date')
+
+
+def filter_values(now):
+    return {
+        'company': 'acme',  # matched case-insensitively as a substring
+        'status': 'interview',
+        'min_score': '60',
+        'max_score': '90',
+        'from_date': (now - timedelta(days=365)).isoformat(),
+        'to_date': (now - timedelta(days=30)).isoformat(),
+    }
+
+
+def requests_to_run(application_ids, now):
+    """[(name, url, filtered)]"""
+    values = filter_values(now)
+    cases = []
+    for size in range(len(FILTER_NAMES) + 1):
+        for names in itertools.combinations(FILTER_NAMES, size):
+            query = '&'.join(f"{name}={values[name]}" for name in names)
+            cases.append((f"applications[{'+'.join(names) or 'all'}]", f"/api/applications?{query}".rstrip('?'), bool(names)))
+    cases.append(('scraped_jds', '/api/scraped-jds', False))
+    cases.append(('status', '/api/status', False))
+    for position, app_id in zip(('first', 'middle', 'last'), application_ids):
+        cases.append((f"application_detail[{position}]", f"/api/applications/{app_id}", False))
+    return cases
+
+
+class Counters:
+    """ORM rows loaded and SQL statements run, via SQLAlchemy events"""
+
+    def __init__(self, db):
+        from sqlalchemy import event
+        self.rows = 0
+        self.statements = 0
+        event.listen(db.Model, 'load', self._loaded, propagate=True)
+        event.listen(db.engine, 'before_cursor_execute', self._executed)
+
+    def _loaded(self, target, context):
+        self.rows += 1
+
+    def _executed(self, *args):
+        self.statements += 1
+
+    def reset(self):
+        self.rows = self.statements = 0
+
+
+def run_case(client, counters, url, repeat):
+    client.get(url)  # warm up
+    samples = []
+    for _ in range(repeat):
+        counters.reset()
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+    rows, statements = counters.rows, counters.statements
+    body = response.get_json(silent=True)
+
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ordered = sorted(samples)
+    return {
+        'status_code': response.status_code,
+        'median_seconds': round(statistics.median(samples), 5),
+        'p95_seconds': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 5),
+        'rows_read': rows,
+        'rows_returned': len(body) if isinstance(body, list) else 1,
+        'statements': statements,
+        'response_bytes': len(response.data),
+        'peak_memory_bytes': peak,
+    }
+
+
+def regressions(name, result, before, tolerance):
+    problems = []
+    for field in ('median_seconds', 'rows_read', 'peak_memory_bytes'):
+        if before.get(field) and result[field] > before[field] * (1 + tolerance):
+            problems.append(f"{name}: {field} {result[field]} > baseline {before[field]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='already seeded database to use (with --session) instead of a fresh one')
+    parser.add_argument('--session', help='seeded session id to query')
+    parser.add_argument('--applications', type=int, default=5000)
+    parser.add_argument('--scraped-jds', type=int, default=1250)
+    parser.add_argument('--resumes', type=int, default=20)
+    parser.add_argument('--other-sessions', type=int, default=2, help='smaller sessions seeded around the measured one')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-k', dest='keyword', help='only run requests whose name contains this')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--max-read-ratio', type=float, help='fail filtered requests reading more rows than this per row returned')
+    args = parser.parse_args(argv)
+
+    from benchmarks import seed_data
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.database:
+            if not args.session:
+                parser.error('--database needs --session')
+            database, session_id = args.database, args.session
+            seed_app = seed_data.create_seed_app(database)
+        else:
+            database = f"sqlite:///{os.path.join(workdir, 'api_scale.db')}"
+            seed_app = seed_data.create_seed_app(database)
+            print(f"Seeding {args.applications} applications and {args.scraped_jds} scraped JDs...")
+            started = time.monotonic()
+            with seed_app.app_context():
+                session_id = seed_data.seed_session('seed-bench-0', args.applications, args.scraped_jds, args.resumes)
+                for i in range(args.other_sessions):
+                    seed_data.seed_session(f"seed-bench-other-{i}", args.applications // 4, args.scraped_jds // 4, 5)
+            print(f"Seeded in {time.monotonic() - started:.1f}s")
+
+        # Imported only now: the app reads DATABASE_URL (set by create_seed_app) on import
+        import app as web
+        from core.models import Application, db
+
+        now = datetime.utcnow()
+        with web.app.app_context():
+            ids = [row.id for row in Application.query.with_entities(Application.id)
+                   .filter_by(user_session_id=session_id).order_by(Application.id)]
+            application_ids = [ids[0], ids[len(ids) // 2], ids[-1]] if ids else []
+            counters = Counters(db)
+
+        client = web.app.test_client()
+        with client.session_transaction() as browser_session:
+            browser_session['user_session_id'] = session_id
+            browser_session['user_first_name'] = 'Seed'
+
+        baseline = {}
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = {r['name']: r for r in json.load(f)['requests']}
+
+        results = []
+        failures = []
+        print(f"{'request':<58} {'median':>9} {'p95':>9} {'read':>7} {'returned':>8} {'sql':>4} {'bytes':>11} {'peak MB':>8}")
+        for name, url, filtered in requests_to_run(application_ids, now):
+            if args.keyword and args.keyword not in name:
+                continue
+            result = dict(name=name, url=url, **run_case(client, counters, url, args.repeat))
+            results.append(result)
+            print(f"{name:<58} {result['median_seconds'] * 1000:7.1f}ms {result['p95_seconds'] * 1000:7.1f}ms "
+                  f"{result['rows_read']:>7} {result['rows_returned']:>8} {result['statements']:>4} "
+                  f"{result['response_bytes']:>11} {result['peak_memory_bytes'] / 2 ** 20:8.1f}")
+
+            if result['status_code'] != 200:
+                failures.append(f"{name}: HTTP {result['status_code']}")
+            if filtered and args.max_read_ratio and result['rows_read'] > args.max_read_ratio * max(result['rows_returned'], 1):
+                failures.append(f"{name}: read {result['rows_read']} rows to return {result['rows_returned']}")
+            if name in baseline:
+                failures += regressions(name, result, baseline[name], args.tolerance)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'applications': args.applications,
+                       'scraped_jds': args.scraped_jds, 'requests': results}, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
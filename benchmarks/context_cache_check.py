@@ -0,0 +1,144 @@
+"""Hit/miss and expiry check for core/context_cache.py against the in-process backend.
+
+Drives get_or_create() with a fake clock through the lifecycle a resume goes through:
+first use (sent inline), creation on reuse, hits, a different resume or key getting its
+own entry, expiry of the cache and of the use count, and invalidation after the
+provider rejects a cache. Also checks where split_template() cuts each default prompt:
+the cached part has to hold every instruction section and end on a section boundary.
+Needs no Redis and no API key.
+
+    python -m benchmarks.context_cache_check
+
+Fails (exit code 1) when a step gives a different result than expected.
+"""
+import argparse
+import sys
+
+
+class Clock:
+    """Stands in for the time module inside core.context_cache"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class Client:
+    def __init__(self, key_index=1, model_name='gemini-2.5-pro'):
+        self.key_index = key_index
+        self.model_name = model_name
+
+
+class NotFound(Exception):
+    """Named like the provider error for a deleted cache"""
+
+
+def run_checks():
+    """[(step, ok, detail)]"""
+    from core import context_cache, metrics
+
+    results = []
+    counted = []
+    metrics.inc = lambda name, **labels: counted.append(labels.get('result'))
+    clock = Clock()
+    context_cache.time = clock
+    backend = context_cache._backend = context_cache.LocalContextCache()
+
+    prefix = 'You are an expert career coach.\n' * 600
+    resume = 'Senior engineer who shipped things. ' * 100
+    client = Client()
+
+    def check(step, ok, detail=''):
+        results.append((step, bool(ok), detail))
+
+    def call(c=client, r=resume):
+        counted.clear()
+        name = context_cache.get_or_create(c, prefix, r)
+        return name, counted[-1] if counted else None
+
+    name, result = call()
+    check('first use is sent inline', name is None and result == 'first_use', result)
+    created, result = call()
+    check('second use creates a cache', created and result == 'created', result)
+    name, result = call()
+    check('third use hits it', name == created and result == 'hit', result)
+    prompt, cached_content = context_cache.resolve(created, 'JD part')
+    check('resolve puts the cached text in front', prompt.startswith(prefix.strip()) and prompt.endswith('JD part')
+          and cached_content is None)
+
+    name, result = call(r=resume + 'Changed.')
+    check('another resume is a miss', name is None and result == 'first_use', result)
+    name, result = call(c=Client(key_index=2))
+    check('another API key is a miss', name is None and result == 'first_use', result)
+
+    short = context_cache.get_or_create(client, 'Short prompt', 'Short resume')
+    check('short prompts are never cached', short is None)
+    flash = Client(model_name='gemini-2.5-flash')
+    small = prefix[:len(prefix) // 4]
+    check('the minimum size follows the model', context_cache.large_enough(flash, small, resume)
+          and not context_cache.large_enough(client, small, resume))
+
+    clock.now += context_cache.LLM_CONTEXT_CACHE_TTL
+    name, result = call()
+    check('an expired cache is a miss again', name is None and result == 'first_use', result)
+    check('expired entries are pruned', created not in backend._entries and len(backend._registry) == 0
+          and len(backend._seen) == 1, f"{len(backend._seen)} use counts left")
+
+    clock.now += context_cache.SEEN_TTL_SECONDS
+    name, result = call()
+    check('a use count expires', name is None and result == 'first_use', result)
+    recreated, result = call()
+    check('reuse within the window creates a new cache', recreated and recreated != created and result == 'created',
+          result)
+
+    retry = context_cache.invalidate(client, prefix, resume, NotFound('cache gone'))
+    name, result = call()
+    check('a rejected cache is forgotten', retry and result != 'hit', result)
+    check('other errors are not retried inline', not context_cache.invalidate(client, prefix, resume, TimeoutError()))
+    return results
+
+
+def split_checks():
+    """[(step, ok, detail)] for how each default prompt is split into cached prefix and per-call body"""
+    from core import context_cache, prompts
+
+    results = []
+    for prompt_key, template in prompts.DEFAULT_PROMPTS.items():
+        split = context_cache.split_template(template)
+        if 'FULL_RESUME_TEXT' not in prompts.PLACEHOLDERS[prompt_key]['required']:
+            results.append((f"{prompt_key} is sent inline", split is None, ''))
+            continue
+        if split is None:
+            results.append((f"{prompt_key} splits", False, 'no split'))
+            continue
+        prefix, body = split
+        last_paragraph = prefix.rsplit('\n\n', 1)[-1]
+        sections = [line for line in template.splitlines() if context_cache._is_heading(line) and line != 'CONTEXT:']
+        results.append((f"{prompt_key} prefix ends on a section boundary",
+                         template.startswith(prefix + '\n\n') and not context_cache._is_heading(last_paragraph),
+                         repr(last_paragraph[-60:])))
+        results.append((f"{prompt_key} prefix holds every instruction section",
+                         all(section in prefix for section in sections),
+                         ', '.join(section for section in sections if section not in prefix)))
+        results.append((f"{prompt_key} body is only the context", body.startswith('CONTEXT:') and len(body) < 200,
+                        f"{len(body)} chars: {body[:60]!r}"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args(argv)
+
+    results = run_checks() + split_checks()
+    for step, ok, detail in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {step}" + (f" ({detail})" if detail and not ok else ''))
+    failures = [step for step, ok, _ in results if not ok]
+    if failures:
+        print(f"{len(failures)} of {len(results)} context cache checks failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Local stand-in for the Gemini generateContent REST endpoint, for load tests.
+
+Answers every prompt the processor sends (paragraphs, single paragraph, cover letter,
+interview prep) with well-formed JSON of the requested shape after a sampled delay, and
+can inject failures: 5xx errors, 429 rate limits and malformed JSON that exercises the
+repair paths. Point the workers at it with
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 GEMINI_API_KEY=fake
+
+    python -m benchmarks.fake_gemini [--port 8765] [--latency lognormal:3,0.4]
+        [--error-rate 0.01] [--rate-limit-rate 0.02] [--malformed-rate 0.05] [--seed 1]
+
+Latency distributions (seconds): fixed:S, uniform:LOW,HIGH, normal:MEAN,SD,
+lognormal:MEDIAN,SIGMA, exp:MEAN. Prefix one with a model name to give that model
+its own, e.g. --latency gemini-2.5-pro=lognormal:12,0.5. GET /stats returns counters.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GENERATE_PATH = re.compile(r'^/v1\w*/models/([^/:]+):generateContent$')
+# Ids in the SELECTED_PARAGRAPHS_JSON of a paragraphs prompt
+PARAGRAPH_ID = re.compile(r'"(\d+)"\s*:\s*"')
+
+FILLER = ("Led a cross-functional team to deliver measurable results, aligning the work with "
+          "the priorities in the job description and the company's goals.")
+
+
+def parse_distribution(spec):
+    """A no-argument sampler for a distribution spec like 'lognormal:3,0.4'"""
+    name, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    samplers = {
+        'fixed': lambda s: s,
+        'uniform': lambda low, high: random.uniform(low, high),
+        'normal': lambda mean, sd: max(0.0, random.gauss(mean, sd)),
+        'lognormal': lambda median, sigma: random.lognormvariate(math.log(median), sigma),
+        'exp': lambda mean: random.expovariate(1 / mean),
+    }
+    if name not in samplers:
+        raise argparse.ArgumentTypeError(f"unknown distribution {name!r} (choose from {', '.join(samplers)})")
+    sampler = samplers[name]
+    sampler(*values)  # fail now on the wrong number of arguments
+    return lambda: sampler(*values)
+
+
+def answer_for(prompt):
+    """(prompt kind, JSON answer) matching the JSON_STRUCTURE the prompt asks for"""
+    if '"enhanced_text"' in prompt:
+        return 'single_paragraph', {'enhanced_text': FILLER}
+    if '"customized_paragraphs"' in prompt:
+        ids = dict.fromkeys(PARAGRAPH_ID.findall(prompt))
+        return 'paragraphs', {'customized_paragraphs': {pid: f"{FILLER} ({pid})" for pid in ids}}
+    if '"cover_letter"' in prompt:
+        return 'cover_letter', {
+            'cover_letter': "Dear Hiring Manager,\n\n" + "\n\n".join([FILLER] * 4) + "\n\nSincerely,\nCandidate",
+            'match_score': random.randint(60, 95),
+            'match_score_analysis': {'strengths': FILLER, 'gaps': FILLER, 'justification': FILLER},
+        }
+    groups = [group for group in ('general_questions', 'role_based_questions') if f'"{group}"' in prompt]
+    if groups:
+        question = {'question': "Tell me about a project you are proud of.", 'talking_points': [FILLER] * 3, 'answer': FILLER}
+        return 'interview_prep', {group: [question] * 5 for group in groups}
+    return 'other', {'text': FILLER}
+
+
+def malform(text):
+    """The kinds of broken JSON models really return"""
+    damage = random.choice((
+        lambda t: t[:max(1, len(t) * 2 // 3)],                      # cut off mid-answer
+        lambda t: re.sub(r'"\s*([}\]])', r'",\1', t, count=1),       # trailing comma
+        lambda t: f"Here is the JSON you asked for:\n```json\n{t}\n```",
+        lambda t: t.replace('\\n', '\n'),                           # raw newlines inside strings
+    ))
+    return damage(text)
+
+
+class FakeGemini:
+    def __init__(self, latency, error_rate=0.0, rate_limit_rate=0.0, malformed_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.counts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {'counts': dict(self.counts), 'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight}
+
+    def delay_for(self, model):
+        return (self.latency.get(model) or self.latency['default'])()
+
+    def generate(self, model, body):
+        """(HTTP status, response body) for one generateContent request"""
+        prompt = '\n'.join(part.get('text', '') for content in body.get('contents', [])
+                           for part in content.get('parts', []))
+        kind, answer = answer_for(prompt)
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            roll = random.random()
+            if roll < self.rate_limit_rate:
+                self.count('rate_limited')
+                return 429, error_body(429, 'RESOURCE_EXHAUSTED', 'Resource has been exhausted (e.g. check quota).')
+            time.sleep(self.delay_for(model))
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.count('error')
+                return 500, error_body(500, 'INTERNAL', 'An internal error has occurred.')
+            text = json.dumps(answer, indent=2, ensure_ascii=False)
+            if roll < self.rate_limit_rate + self.error_rate + self.malformed_rate:
+                self.count('malformed')
+                text = malform(text)
+            self.count(kind)
+            return 200, {
+                'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+                'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(text) // 4,
+                                  'totalTokenCount': (len(prompt) + len(text)) // 4},
+                'modelVersion': model,
+            }
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def error_body(code, status, message):
+    return {'error': {'code': code, 'message': message, 'status': status}}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            match = GENERATE_PATH.match(self.path.split('?', 1)[0])
+            if not match:
+                fake.count('unsupported')
+                self._send(404, error_body(404, 'NOT_FOUND', f"{self.path} is not served by the fake Gemini server"))
+                return
+            self._send(*fake.generate(match.group(1), body))
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, fake.stats())
+            else:
+                self._send(404, error_body(404, 'NOT_FOUND', self.path))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(fake, host='127.0.0.1', port=8765):
+    """Start the server in a background thread; returns it (call shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', action='append', default=[],
+                        help='[model=]distribution; the one without a model is the default (lognormal:3,0.4)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests failing with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests rejected with a 429')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='share of answers with broken JSON')
+    parser.add_argument('--seed', type=int, help='make the injected latencies and failures repeatable')
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    latency = {'default': parse_distribution('lognormal:3,0.4')}
+    for spec in args.latency:
+        model, _, distribution = spec.rpartition('=')
+        latency[model or 'default'] = parse_distribution(distribution)
+
+    fake = FakeGemini(latency, args.error_rate, args.rate_limit_rate, args.malformed_rate)
+    server = serve(fake, args.host, args.port)
+    print(f"Fake Gemini listening on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(fake.stats(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
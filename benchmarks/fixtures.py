@@ -0,0 +1,111 @@
+"""Generated inputs for the hot path benchmarks: DOCX resumes of different shapes and a
+corpus of clean and malformed LLM JSON answers. Everything is built from a fixed seed,
+so two runs (and two machines) benchmark the same bytes.
+"""
+import json
+import os
+import random
+import struct
+import zlib
+
+BULLET_WORDS = ('designed', 'shipped', 'scaled', 'migrated', 'automated', 'reduced', 'latency', 'revenue',
+                'pipeline', 'customers', 'Python', 'Kubernetes', 'PostgreSQL', 'Redis', 'observability',
+                'throughput', 'stakeholders', 'roadmap', 'incident', 'cost', 'quarterly', 'platform')
+
+
+def sentence(rng, words=28):
+    text = ' '.join(rng.choice(BULLET_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _png(width, height, rng):
+    """An uncompressible RGB PNG (noise), so image-heavy fixtures are as large as real photos"""
+    raw = b''.join(b'\x00' + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def _resume(path, rng, jobs, bullets, tables=0, images=0):
+    import io
+
+    import docx
+    from docx.shared import Inches
+
+    document = docx.Document()
+    document.add_heading('Jane Doe', level=1)
+    document.add_paragraph('Senior Software Engineer | jane@example.com | +1 555 0100')
+    document.add_heading('Summary', level=2)
+    document.add_paragraph(sentence(rng, 60))
+    for job in range(jobs):
+        document.add_heading(f"Engineer, Company {job} (20{10 + job % 15}-20{11 + job % 15})", level=2)
+        for _ in range(bullets):
+            document.add_paragraph(sentence(rng), style='List Bullet')
+        if job < tables:
+            table = document.add_table(rows=6, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = sentence(rng, 6)
+        if job < images:
+            document.add_picture(io.BytesIO(_png(320, 240, rng)), width=Inches(2))
+    document.add_heading('Education', level=2)
+    document.add_paragraph('B.Sc. Computer Science')
+    document.save(path)
+    return path
+
+
+# name -> (jobs, bullets per job, jobs followed by a table, jobs followed by an image)
+RESUMES = {
+    'small': (3, 4, 0, 0),
+    'huge': (40, 12, 0, 0),
+    'tables': (8, 4, 8, 0),
+    'images': (6, 4, 0, 6),
+}
+
+
+def build_resumes(directory, seed=47):
+    """{name: path} of the generated DOCX resumes"""
+    os.makedirs(directory, exist_ok=True)
+    return {name: _resume(os.path.join(directory, f"resume_{name}.docx"), random.Random(f"{seed}-{name}"), *shape)
+            for name, shape in RESUMES.items()}
+
+
+def _interview_prep(rng, questions):
+    question = lambda: {'question': sentence(rng, 12) + '?', 'talking_points': [sentence(rng, 10) for _ in range(3)],
+                        'answer': sentence(rng, 80)}
+    return {'general_questions': [question() for _ in range(questions)],
+            'role_based_questions': [question() for _ in range(questions)]}
+
+
+def json_corpus(seed=47, cassette_dir=None):
+    """{name: LLM answer text}: clean answers, the broken variants models really return,
+    and (with cassette_dir) every recorded answer from core/cassette.py cassettes"""
+    rng = random.Random(seed)
+    paragraphs = json.dumps({'customized_paragraphs': {str(i): sentence(rng, 40) for i in range(12)}}, indent=2)
+    cover_letter = json.dumps({'cover_letter': '\n\n'.join(sentence(rng, 70) for _ in range(5)), 'match_score': 82,
+                               'match_score_analysis': {'strengths': sentence(rng), 'gaps': sentence(rng),
+                                                        'justification': sentence(rng)}}, indent=2)
+    interview = json.dumps(_interview_prep(rng, 10), indent=2)
+
+    corpus = {
+        'paragraphs_clean': paragraphs,
+        'cover_letter_clean': cover_letter,
+        'interview_prep_clean': interview,
+        'paragraphs_fenced': f"Here are the customized paragraphs:\n```json\n{paragraphs}\n```\nLet me know if you need changes.",
+        'paragraphs_trailing_commas': paragraphs.replace('"\n', '",\n'),
+        'cover_letter_raw_newlines': cover_letter.replace('\\n', '\n'),
+        'cover_letter_inner_quotes': cover_letter.replace('"strengths": "', '"strengths": "A "hands-on" lead. ', 1),
+        'cover_letter_python_literals': cover_letter.replace('"match_score": 82', '"match_score": 82, "tailored": True, "notes": None'),
+        'interview_prep_missing_commas': interview.replace('},\n    {', '}\n    {'),
+        'interview_prep_truncated': interview[:len(interview) * 2 // 3],
+    }
+    if cassette_dir:
+        from core import cassette
+        for entries in cassette.load(cassette_dir).values():
+            for entry in entries:
+                if entry.get('text'):
+                    corpus[f"recorded_{entry['prompt_key']}_{entry['key'][:8]}"] = entry['text']
+    return corpus
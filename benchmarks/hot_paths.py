@@ -0,0 +1,171 @@
+"""Micro-benchmarks for the document and LLM-answer parsing hot paths.
+
+Covers DOCX extraction and rendering, cover letter creation, resume reconstruction,
+file hashing and the JSON clean/repair chain, over generated fixtures
+(benchmarks/fixtures.py): small, huge, table-heavy and image-heavy resumes and a corpus
+of clean and malformed LLM answers. Each benchmark is calibrated to run for at least
+--min-time per round, then timed over --rounds rounds.
+
+    python -m benchmarks.hot_paths [-k docx] [--rounds 15] [--save report.json]
+        [--compare baseline.json] [--tolerance 0.15] [--cassettes cassettes/]
+
+--compare fails (exit code 1) when a benchmark's median is more than --tolerance slower
+than in a report saved earlier with --save. Timings only compare on the same machine, so
+baselines are kept locally rather than in the repo. The JSON cases run the parser
+_call_gemini_api uses (ResumeProcessor._parse_json_response). Metrics writes are switched
+off while timing so the numbers don't depend on Redis; pass --with-metrics to keep them.
+Log output of the code under test is discarded.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def build_cases(workdir, cassette_dir=None):
+    """{benchmark name: (callable, details)}"""
+    from benchmarks import fixtures
+    from core.cache import calculate_file_hash
+    from core.document import ResumeDocument
+    from core.processor import ResumeProcessor
+    from core.renderer import DocumentRenderer
+
+    renderer = DocumentRenderer(upload_folder=workdir)
+    processor = ResumeProcessor()
+    cases = {}
+
+    for name, path in fixtures.build_resumes(os.path.join(workdir, 'fixtures')).items():
+        structured = renderer.extract_text_from_docx(path)
+        document = ResumeDocument.from_structured(structured)
+        # Every other paragraph customized, about what a broad paragraph selection produces
+        enhanced = {pid: document.text(pid) + ' Tailored to the role.' for pid in document.ids[::2]}
+        details = {'bytes': os.path.getsize(path), 'paragraphs': len(document.ids), 'customized': len(enhanced)}
+
+        cases[f"extract_text_from_docx[{name}]"] = (lambda path=path: renderer.extract_text_from_docx(path), details)
+        by_id = {'paragraphs': document.paragraphs_view(enhanced)}
+        cases[f"update_docx_with_customizations[{name}]"] = (
+            lambda path=path, c=by_id: _remove(renderer.update_docx_with_customizations(path, c)), details)
+        by_text = {'customized_paragraphs': document.text_view(enhanced)}
+        cases[f"update_docx_with_customizations[{name}-by-text]"] = (
+            lambda path=path, c=by_text: _remove(renderer.update_docx_with_customizations(path, c)), details)
+        cases[f"calculate_file_hash[{name}]"] = (lambda path=path: calculate_file_hash(path), details)
+        cases[f"resume_document[{name}]"] = (lambda s=structured: ResumeDocument.from_structured(s), details)
+        cases[f"reconstruct_resume[{name}]"] = (
+            lambda s=structured, d=document, e=enhanced: processor._reconstruct_resume_with_enhanced_paragraphs(s, d, e),
+            details)
+
+    corpus = fixtures.json_corpus(cassette_dir=cassette_dir)
+    for name in ('short', 'long'):
+        letter = '\n\n'.join(fixtures.sentence(random.Random(name), 70) for _ in range(4 if name == 'short' else 40))
+        cases[f"create_cover_letter_docx[{name}]"] = (
+            lambda letter=letter: _remove(renderer.create_cover_letter_docx(letter, 'Company', 'Jane Doe')),
+            {'chars': len(letter)})
+    for name, text in corpus.items():
+        cases[f"json_repair_chain[{name}]"] = (lambda text=text: processor._parse_json_response(text),
+                                               {'chars': len(text), 'path': processor._parse_json_response(text)[1]})
+    return cases
+
+
+def measure(function, rounds, min_time):
+    """Seconds per call: calibrate iterations per round to take at least min_time, then time the rounds"""
+    function()  # warm up (imports, caches)
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or iterations >= 1_000_000:
+            break
+        iterations *= 10 if elapsed < min_time / 10 else 2
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        samples.append((time.perf_counter() - start) / iterations)
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'mean': statistics.mean(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'iterations': iterations,
+    }
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return f"{seconds * scale:8.2f} {unit}"
+    return f"{seconds * 1e9:8.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='keyword', help='only run benchmarks whose name contains this')
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--min-time', type=float, default=0.02, help='minimum seconds per round')
+    parser.add_argument('--save', help='write the results to this file (use it as a baseline later)')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown of a median')
+    parser.add_argument('--cassettes', help='also benchmark the repair chain on answers recorded in this cassette directory')
+    parser.add_argument('--with-metrics', action='store_true', help='keep writing metrics to Redis while timing')
+    args = parser.parse_args(argv)
+
+    from core import metrics
+    if not args.with_metrics:
+        metrics.inc = metrics.observe = lambda *a, **k: None
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {b['name']: b for b in json.load(f)['benchmarks']}
+
+    failures = []
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, 'w') as devnull:
+        # The repair chain logs every failed step; that would drown the report
+        with contextlib.redirect_stdout(devnull):
+            cases = build_cases(workdir, args.cassettes)
+        for name, (function, details) in cases.items():
+            if args.keyword and args.keyword not in name:
+                continue
+            with contextlib.redirect_stdout(devnull):
+                stats = measure(function, args.rounds, args.min_time)
+            results.append({'name': name, 'stats': stats, 'details': details})
+
+            line = f"{name:<58} median {_format(stats['median'])}  min {_format(stats['min'])}"
+            before = baseline.get(name)
+            if before:
+                change = stats['median'] / before['stats']['median'] - 1
+                status = 'FAIL' if change > args.tolerance else 'ok'
+                line += f"  {change:+7.1%} vs baseline {status}"
+                if status == 'FAIL':
+                    failures.append(name)
+            print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                                   'processor': platform.processor()},
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'benchmarks': results}, f, indent=2)
+
+    if failures:
+        print(f"{len(failures)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Cold-start import benchmark for the core package and the two entry points.
+
+Each module is imported in a fresh interpreter so nothing is shared between runs.
+Fails (exit code 1) when a core module drags in one of the heavy libraries that
+must stay lazy, or when an import exceeds its time budget.
+
+    python -m benchmarks.import_time [--runs 5] [--json report.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only the code paths needing them may import
+HEAVY_MODULES = ('google.generativeai', 'docx', 'docx2pdf', 'pythoncom', 'celery', 'flask_socketio', 'eventlet')
+
+# module -> (budget in seconds, heavy modules it is allowed to load)
+TARGETS = {
+    'core.config': (0.05, ()),
+    'core.processor': (0.3, ()),
+    'core.renderer': (0.3, ()),
+    'core.models': (1.0, ()),
+    'core.factory': (1.0, ()),
+    'celery_worker': (5.0, ('celery', 'flask_socketio', 'eventlet')),
+    'app': (5.0, ('flask_socketio', 'eventlet')),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'loaded': heavy}}))
+"""
+
+
+def measure(module, runs):
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {'module': module, 'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import failed'}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        loaded = result['loaded']
+    return {
+        'module': module,
+        'median_seconds': round(statistics.median(samples), 4),
+        'max_seconds': round(max(samples), 4),
+        'loaded_heavy_modules': loaded,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('modules', nargs='*', help='subset of modules to measure')
+    args = parser.parse_args(argv)
+
+    failures = []
+    results = []
+    for module in args.modules or TARGETS:
+        budget, allowed = TARGETS.get(module, (None, ()))
+        result = measure(module, args.runs)
+        results.append(result)
+
+        if 'error' in result:
+            print(f"{module:<20} could not be imported: {result['error']}")
+            failures.append(module)
+            continue
+
+        leaked = [name for name in result['loaded_heavy_modules'] if name not in allowed]
+        over_budget = budget is not None and result['median_seconds'] > budget
+        status = 'FAIL' if leaked or over_budget else 'ok'
+        print(f"{module:<20} {result['median_seconds'] * 1000:8.1f} ms (budget {budget * 1000 if budget else 0:.0f} ms) {status}"
+              + (f"  eagerly loads {', '.join(leaked)}" if leaked else ''))
+        if status == 'FAIL':
+            failures.append(module)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
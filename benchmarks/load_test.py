@@ -0,0 +1,310 @@
+"""End-to-end load test against a running app, workers and (normally) benchmarks/fake_gemini.py.
+
+Each simulated user gets its own session: it uploads a resume, selects paragraphs and
+opens a Socket.IO connection, then repeatedly submits /customize, waits for
+task_success, requests a download of the result and waits for download_ready.
+Reports throughput, p50/p95/p99 end-to-end latency per stage, rejections and errors,
+and the Celery queue depth sampled from /metrics while the test runs.
+
+    python -m benchmarks.load_test [--url http://127.0.0.1:5001] [--users 10] [--iterations 5]
+        [--resume resume.docx] [--json report.json] [--baseline baseline.json] [--tolerance 0.2]
+
+Exits with 1 when the error rate is above --max-error-rate or, with --baseline, when
+throughput drops or a p95 rises by more than --tolerance compared with the baseline
+report. Needs `requests` and `python-socketio[client]`.
+"""
+import argparse
+import io
+import json
+import math
+import re
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+QUEUE_DEPTH = re.compile(r'^resumeai_queue_depth\{queue="([^"]+)"\}\s+(\d+)', re.MULTILINE)
+STAGES = ('customize', 'download')
+
+JOB_DESCRIPTION = """We are hiring a senior backend engineer to design and operate Python services.
+You will own APIs built with Flask, background processing with Celery and Redis, and work
+with product teams on performance, reliability and observability. ({tag})"""
+
+
+def sample_resume():
+    """A small DOCX resume, so the test needs no fixture files"""
+    import docx
+    document = docx.Document()
+    document.add_heading('Jane Doe', level=1)
+    document.add_paragraph('Senior Software Engineer - jane@example.com')
+    for i in range(6):
+        document.add_paragraph(f"Built and ran service {i} handling thousands of requests per second, "
+                               f"cutting p95 latency by {10 + i * 5}% through caching and query tuning.")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    # Nearest rank
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {stage: [] for stage in STAGES}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, outcome, seconds=None):
+        with self._lock:
+            key = f"{stage}:{outcome}"
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+            if outcome == 'ok':
+                self.latencies[stage].append(seconds)
+
+
+class QueueSampler(threading.Thread):
+    """Polls /metrics for queue depths until stopped"""
+
+    def __init__(self, http, url, interval):
+        super().__init__(daemon=True)
+        self.http = http
+        self.url = url
+        self.interval = interval
+        self.samples = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                text = self.http.get(f"{self.url}/metrics", timeout=5).text
+                for queue, depth in QUEUE_DEPTH.findall(text):
+                    self.samples.setdefault(queue, []).append(int(depth))
+            except Exception as e:
+                print(f"Queue sampler warning: {e}")
+            self.stopped.wait(self.interval)
+
+    def summary(self):
+        return {queue: {'max': max(depths), 'mean': round(statistics.mean(depths), 2)}
+                for queue, depths in self.samples.items()}
+
+
+class User:
+    """One browser session: its own cookie, resume and Socket.IO connection"""
+
+    def __init__(self, args, results, index):
+        import requests
+        import socketio
+
+        self.args = args
+        self.results = results
+        self.index = index
+        self.http = requests.Session()
+        self.socket = socketio.Client(reconnection=False)
+        self.events = {}
+        self.arrived = threading.Condition()
+        for event in ('task_success', 'task_error', 'task_cancelled', 'download_ready'):
+            self.socket.on(event, self._handler(event))
+
+    def _handler(self, event):
+        def handle(payload):
+            with self.arrived:
+                self.events[payload.get('job_id')] = (event, payload)
+                self.arrived.notify_all()
+        return handle
+
+    def wait_for(self, job_id, timeout):
+        deadline = time.monotonic() + timeout
+        with self.arrived:
+            while job_id not in self.events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return 'timeout', None
+                self.arrived.wait(remaining)
+            return self.events.pop(job_id)
+
+    def setup(self, resume_bytes):
+        url = self.args.url
+        self.http.get(f"{url}/", timeout=30).raise_for_status()
+        self.socket.connect(url, headers={'Cookie': '; '.join(f"{k}={v}" for k, v in self.http.cookies.items())},
+                            transports=['websocket'])
+        response = self.http.post(f"{url}/api/resumes", files={'resume_file': ('resume.docx', resume_bytes)},
+                                  data={'resume_name': f"load test {self.index}", 'first_name': 'Load', 'last_name': 'Test'},
+                                  timeout=60)
+        response.raise_for_status()
+        self.resume_id = response.json()['id']
+        paragraphs = self.http.get(f"{url}/api/resumes/{self.resume_id}", timeout=30).json().get('paragraphs', [])
+        selected = [p['id'] for p in paragraphs][-self.args.paragraphs:]
+        self.http.put(f"{url}/api/resumes/{self.resume_id}/selections",
+                      json={'selected_paragraph_ids': selected}, timeout=30).raise_for_status()
+
+    def submit(self, stage, path, payload):
+        """(job id, submit time) or (None, None) after recording why the request was refused"""
+        started = time.monotonic()
+        response = self.http.post(f"{self.args.url}{path}", json=payload, timeout=60)
+        if response.status_code == 429:
+            self.results.record(stage, 'rejected')
+            time.sleep(min(float(response.headers.get('Retry-After', 5)), self.args.max_retry_wait))
+            return None, None
+        if not response.ok:
+            self.results.record(stage, f"http_{response.status_code}")
+            return None, None
+        return response.json()['job_id'], started
+
+    def customize(self, iteration):
+        payload = {'resume_id': self.resume_id, 'company_name': f"Company {self.index}",
+                   # Distinct per request, so single-flight doesn't fold the load into one job
+                   'job_description': JOB_DESCRIPTION.format(tag=f"{self.index}-{iteration}-{uuid.uuid4().hex[:8]}"),
+                   'ai_model': self.args.model, 'custom_prompt_ids': {}}
+        job_id, started = self.submit('customize', '/customize', payload)
+        if not job_id:
+            return None
+        event, message = self.wait_for(job_id, self.args.timeout)
+        if event != 'task_success':
+            self.results.record('customize', event)
+            return None
+        self.results.record('customize', 'ok', time.monotonic() - started)
+        result = message.get('result')
+        if result is None and message.get('result_ref'):
+            result = self.http.get(f"{self.args.url}{message['result_ref']}", timeout=30).json()
+        return dict(result or {}, company_name=payload['company_name'])
+
+    def download(self, result):
+        payload = {'resume_id': self.resume_id, 'company_name': result['company_name'], 'format': self.args.format,
+                   'customizations': {'customized_paragraphs': result.get('customized_paragraphs') or {},
+                                      'paragraphs': result.get('paragraphs')}}
+        job_id, started = self.submit('download', '/api/download_resume', payload)
+        if not job_id:
+            return
+        event, _ = self.wait_for(job_id, self.args.timeout)
+        if event == 'download_ready':
+            self.results.record('download', 'ok', time.monotonic() - started)
+        else:
+            self.results.record('download', event)
+
+    def run(self):
+        try:
+            for iteration in range(self.args.iterations):
+                result = self.customize(iteration)
+                if result and not self.args.skip_download:
+                    self.download(result)
+        except Exception as e:
+            print(f"User {self.index} failed: {e}")
+            self.results.record('user', 'crashed')
+        finally:
+            self.socket.disconnect()
+
+
+def summarize(results, elapsed, queues, args):
+    stages = {}
+    for stage, samples in results.latencies.items():
+        stages[stage] = {
+            'completed': len(samples),
+            'p50_seconds': percentile(samples, 50),
+            'p95_seconds': percentile(samples, 95),
+            'p99_seconds': percentile(samples, 99),
+        }
+    attempted = sum(results.outcomes.values())
+    failed = sum(count for key, count in results.outcomes.items() if not key.endswith((':ok', ':rejected')))
+    return {
+        'users': args.users,
+        'iterations': args.iterations,
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_per_minute': round(len(results.latencies['customize']) / elapsed * 60, 2) if elapsed else 0,
+        'stages': stages,
+        'outcomes': results.outcomes,
+        'error_rate': round(failed / attempted, 4) if attempted else 0,
+        'queue_depth': queues,
+    }
+
+
+def regressions(report, baseline, tolerance):
+    """What got worse than the baseline report by more than the tolerance"""
+    problems = []
+    if report['throughput_per_minute'] < baseline['throughput_per_minute'] * (1 - tolerance):
+        problems.append(f"throughput {report['throughput_per_minute']}/min < baseline {baseline['throughput_per_minute']}/min")
+    for stage, numbers in report['stages'].items():
+        before = baseline.get('stages', {}).get(stage, {}).get('p95_seconds')
+        after = numbers['p95_seconds']
+        if before and after and after > before * (1 + tolerance):
+            problems.append(f"{stage} p95 {after}s > baseline {before}s")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5001')
+    parser.add_argument('--users', type=int, default=10, help='concurrent sessions')
+    parser.add_argument('--iterations', type=int, default=5, help='customize (+ download) rounds per user')
+    parser.add_argument('--paragraphs', type=int, default=4, help='paragraphs selected for customization')
+    parser.add_argument('--model', default='gemini-2.5-flash')
+    parser.add_argument('--format', default='docx', choices=('docx', 'pdf'))
+    parser.add_argument('--skip-download', action='store_true')
+    parser.add_argument('--resume', help='DOCX to upload instead of the generated sample')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for a job to finish')
+    parser.add_argument('--max-retry-wait', type=float, default=30, help='cap on Retry-After sleeps after a 429')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='seconds between queue depth samples')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='report of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression against the baseline')
+    parser.add_argument('--max-error-rate', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    import requests
+
+    if args.resume:
+        with open(args.resume, 'rb') as f:
+            resume_bytes = f.read()
+    else:
+        resume_bytes = sample_resume()
+
+    results = Results()
+    users = [User(args, results, i) for i in range(args.users)]
+    for user in users:
+        user.setup(resume_bytes)
+    print(f"{len(users)} users ready, starting {args.iterations} rounds each against {args.url}")
+
+    sampler = QueueSampler(requests.Session(), args.url, args.sample_interval)
+    sampler.start()
+    started = time.monotonic()
+    threads = [threading.Thread(target=user.run) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    sampler.stopped.set()
+    sampler.join()
+
+    report = summarize(results, elapsed, sampler.summary(), args)
+    print(f"Finished in {report['elapsed_seconds']}s: {report['throughput_per_minute']} customizations/min, "
+          f"error rate {report['error_rate']:.1%}")
+    for stage, numbers in report['stages'].items():
+        print(f"  {stage:<10} {numbers['completed']:>5} done  p50 {numbers['p50_seconds']}s  "
+              f"p95 {numbers['p95_seconds']}s  p99 {numbers['p99_seconds']}s")
+    print(f"  outcomes   {json.dumps(report['outcomes'], sort_keys=True)}")
+    print(f"  queues     {json.dumps(report['queue_depth'], sort_keys=True)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report['error_rate'] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.1%} > {args.max_error_rate:.1%}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += regressions(report, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Fill a database with large sessions for data-scale benchmarks.
+
+Creates, per session, resumes, applications and scraped JDs with realistic text sizes:
+multi-KB job descriptions and cover letters, customized paragraphs, interview prep on
+about a third of the applications, a spread of statuses, scores and dates, and a small
+pool of companies so filters match subsets. Rows are written in batches. Point it at a
+separate database - never the one the app uses:
+
+    python -m benchmarks.seed_data --database sqlite:///bench.db [--sessions 1]
+        [--applications 20000] [--scraped-jds 5000] [--resumes 20] [--seed 50]
+
+Prints the seeded session ids; benchmarks/api_scale.py seeds its own database the same way.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+STATUSES = ('not_applied', 'applied', 'interview', 'offer', 'rejected')
+STATUS_WEIGHTS = (40, 35, 15, 3, 7)
+COMPANIES = ('Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises', 'Wonka',
+             'Cyberdyne', 'Soylent', 'Tyrell', 'Aperture', 'Massive Dynamic', 'Pied Piper', 'Vandelay Industries')
+TITLES = ('Backend Engineer', 'Senior Software Engineer', 'Data Engineer', 'Platform Engineer', 'Engineering Manager',
+          'Site Reliability Engineer', 'Full Stack Developer', 'Machine Learning Engineer')
+WORDS = ('design', 'build', 'operate', 'scalable', 'services', 'customers', 'Python', 'APIs', 'distributed',
+         'systems', 'reliability', 'observability', 'teams', 'product', 'data', 'pipelines', 'latency', 'cloud',
+         'ownership', 'mentoring', 'roadmap', 'quality', 'security', 'performance', 'collaborate', 'deliver')
+BATCH_SIZE = 1000
+# Created dates are spread over this many days before now
+DATE_SPREAD_DAYS = 730
+
+
+def text(rng, chars):
+    """About `chars` characters of sentence-like text"""
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    sentences = [' '.join(words[i:i + 18]).capitalize() + '.' for i in range(0, len(words), 18)]
+    return ' '.join(sentences)
+
+
+def _interview_prep(rng):
+    group = lambda: [{'question': text(rng, 90) + '?', 'talking_points': [text(rng, 120) for _ in range(3)],
+                      'answer': text(rng, 600)} for _ in range(8)]
+    return {'general_questions': group(), 'role_based_questions': group()}
+
+
+def _created(rng, now):
+    return now - timedelta(days=rng.uniform(0, DATE_SPREAD_DAYS))
+
+
+def _token(rng):
+    return '%032x' % rng.getrandbits(128)
+
+
+def _resume_rows(rng, session_id, count, now):
+    rows = []
+    for i in range(count):
+        paragraphs = [{'id': p, 'text': text(rng, rng.randint(60, 400))} for p in range(40)]
+        rows.append({
+            'resume_name': f"Resume {i}",
+            'original_file_path': f"uploads/seed_{_token(rng)}.docx",
+            'user_session_id': session_id,
+            'selected_paragraph_ids': [p['id'] for p in paragraphs[5:12]],
+            'user_first_name': 'Seed',
+            'user_last_name': f"User {i}",
+            'structured_text': {'paragraphs': paragraphs, 'full_text': '\n'.join(p['text'] for p in paragraphs)},
+            'file_hash': _token(rng) * 2,
+            'created_date': _created(rng, now),
+        })
+    return rows
+
+
+def _application_row(rng, session_id, resume_ids, now):
+    created = _created(rng, now)
+    analysis = {'strengths': text(rng, 300), 'gaps': text(rng, 250), 'justification': text(rng, 250)}
+    return {
+        'company_name': rng.choice(COMPANIES),
+        'job_title': rng.choice(TITLES),
+        'job_description': text(rng, rng.randint(2500, 6000)),
+        'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+        'match_score': rng.randint(35, 98) if rng.random() < 0.95 else None,
+        'match_score_analysis': json.dumps(analysis),
+        'cover_letter': text(rng, rng.randint(1800, 3200)),
+        'customized_paragraphs': {text(rng, 200): text(rng, 230) for _ in range(rng.randint(3, 8))},
+        'interview_prep': _interview_prep(rng) if rng.random() < 0.3 else None,
+        'created_date': created,
+        'updated_date': created + timedelta(days=rng.uniform(0, 30)),
+        'user_session_id': session_id,
+        'resume_id': rng.choice(resume_ids),
+        'job_posting_url': f"https://jobs.example.com/{_token(rng)}",
+    }
+
+
+def _scraped_jd_row(rng, session_id, now):
+    return {
+        'job_title': rng.choice(TITLES),
+        'company_name': rng.choice(COMPANIES),
+        'job_description': text(rng, rng.randint(2000, 7000)),
+        'page_url': f"https://jobs.example.com/{_token(rng)}",
+        'application_type': 'Easy Apply' if rng.random() < 0.3 else 'Normal',
+        'created_date': _created(rng, now),
+        'user_session_id': session_id,
+        'status': 'generated' if rng.random() < 0.4 else 'active',
+    }
+
+
+def _insert(model, rows):
+    from core.models import db
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE])
+        db.session.commit()
+
+
+def seed_session(session_id, applications=20000, scraped_jds=5000, resumes=20, seed=50):
+    """Seed one session (inside an app context); the same session id and seed give the same rows"""
+    from core.models import Application, Resume, ScrapedJD
+
+    rng = random.Random(f"{seed}-{session_id}")
+    now = datetime.utcnow()
+
+    _insert(Resume, _resume_rows(rng, session_id, resumes, now))
+    resume_ids = [r.id for r in Resume.query.with_entities(Resume.id).filter_by(user_session_id=session_id)]
+    for start in range(0, applications, BATCH_SIZE):
+        _insert(Application, [_application_row(rng, session_id, resume_ids, now)
+                              for _ in range(min(BATCH_SIZE, applications - start))])
+    for start in range(0, scraped_jds, BATCH_SIZE):
+        _insert(ScrapedJD, [_scraped_jd_row(rng, session_id, now) for _ in range(min(BATCH_SIZE, scraped_jds - start))])
+    return session_id
+
+
+def create_seed_app(database_url):
+    """Flask app bound to the given database, with the tables created"""
+    # The database URL is read from the environment when core.config is first imported
+    os.environ['DATABASE_URL'] = database_url
+    from core.config import BASE_CONFIG
+    from core.factory import create_app
+    from core.models import db
+
+    if BASE_CONFIG['SQLALCHEMY_DATABASE_URI'] != database_url:
+        raise RuntimeError("core.config was imported before the seed database was chosen")
+    app = create_app('resumeai-seed')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='SQLAlchemy URL of the database to fill')
+    parser.add_argument('--sessions', type=int, default=1)
+    parser.add_argument('--applications', type=int, default=20000, help='applications per session')
+    parser.add_argument('--scraped-jds', type=int, default=5000, help='scraped JDs per session')
+    parser.add_argument('--resumes', type=int, default=20, help='resumes per session')
+    parser.add_argument('--seed', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.database in (os.environ.get('DATABASE_URL'), 'sqlite:///resumeai.db'):
+        parser.error("refusing to seed the app's own database; pass a separate one")
+
+    app = create_seed_app(args.database)
+    with app.app_context():
+        for i in range(args.sessions):
+            session_id = seed_session(f"seed-{args.seed}-{i}", applications=args.applications, scraped_jds=args.scraped_jds,
+                                      resumes=args.resumes, seed=args.seed)
+            print(f"Seeded {session_id}: {args.resumes} resumes, {args.applications} applications, "
+                  f"{args.scraped_jds} scraped JDs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
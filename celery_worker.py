@@ -1,332 +1,524 @@
 import eventlet
 eventlet.monkey_patch()
 
-import os
+import json
 import time
 import traceback
-import redis
-import tempfile
-from docx import Document
-import pythoncom
+from dotenv import load_dotenv
 from flask_socketio import SocketIO
-from app import celery, ResumeProcessor, Resume, db, Application, ScrapedJD
+from celery.signals import task_prerun, task_postrun, task_revoked, worker_init
+
+load_dotenv()
+
+from core import admission, jobs, llm, metrics, payloads, prefetch, prompts, routing, singleflight, tracing
+from core.celery_app import make_celery
+from core.config import LLM_EXECUTION_MODE, REDIS_URL, load_api_keys
+from core.engine import get_engine
+from core.factory import create_app
+from core.jobs import DeadlineExceeded, JobCancelled, JobContext
+from core.models import db, Resume, Application, GenerationResult, ScrapedJD
+from core.processor import ResumeProcessor
+from core.progress import NullProgress, ProgressChannel, ProgressReporter
+from core.renderer import DocumentRenderer
+
+# Worker entry point: `celery -A celery_worker.celery worker`. Builds only the
+# Flask app context needed by SQLAlchemy - no routes, SocketIO server or CORS.
+flask_app = create_app(__name__)
+celery = make_celery(flask_app)
 
 # Initialize SocketIO with Redis message queue for cross-process communication
-socketio = SocketIO(message_queue='redis://localhost:6379/0')
-
-def initialize_worker_system():
+socketio = SocketIO(message_queue=REDIS_URL)
+
+def emit(event, payload, room):
+    """Emit to a session room through the Redis message queue and count it"""
+    socketio.emit(event, payload, room=room)
+    metrics.inc('resumeai_socket_emits_total', event=event, process='worker')
+
+# Progress updates are queued and sent by a background dispatcher so tasks never wait on them
+progress_channel = ProgressChannel(emit)
+
+_task_start_times = {}
+
+# Admission control kind of each task, so a finished or revoked job frees its session's slot
+TASK_KINDS = {
+    'generate_customization_task': 'customization',
+    'generate_interview_prep_task': 'interview_prep',
+    'create_download_file_task': 'download',
+}
+
+@task_prerun.connect
+def _record_task_start(task_id=None, task=None, **kwargs):
+    _task_start_times[task_id] = time.time()
+
+@task_postrun.connect
+def _record_task_end(task_id=None, task=None, retval=None, state=None, **kwargs):
+    start = _task_start_times.pop(task_id, None)
+    # Tasks report handled failures as {'error': ...} rather than raising
+    if isinstance(retval, dict) and retval.get('cancelled'):
+        outcome = 'cancelled'
+    else:
+        outcome = 'error' if state != 'SUCCESS' or (isinstance(retval, dict) and 'error' in retval) else 'success'
+    task_name = task.name.rsplit('.', 1)[-1] if task else 'unknown'
+    if start is not None:
+        metrics.observe('resumeai_task_duration_seconds', time.time() - start, task=task_name, outcome=outcome)
+    metrics.inc('resumeai_tasks_total', task=task_name, outcome=outcome)
+
+@task_revoked.connect
+def _release_revoked_task(request=None, expired=False, **kwargs):
+    # A task revoked before it started never reaches its finally block
+    data = (request.args or [{}])[0] if request is not None else {}
+    if isinstance(data, dict):
+        if expired:
+            # Its deadline passed while it sat in the queue
+            jobs.request_cancel(request.id, 'expired')
+            metrics.inc('resumeai_deadline_exceeded_total', task=(request.task_name or 'unknown').rsplit('.', 1)[-1])
+        singleflight.release(data.get('singleflight_key'), request.id)
+        jobs.finish(data.get('session_id'), request.id, data.get('supersede_key'))
+        task_name = (request.task_name or '').rsplit('.', 1)[-1]
+        if task_name in TASK_KINDS:
+            admission.release(data.get('session_id'), TASK_KINDS[task_name], request.id)
+
+@worker_init.connect
+def initialize_worker_system(**kwargs):
     """Initialize system components in Celery worker to eliminate first-request delays"""
     print("🚀 Starting Celery worker system initialization...")
 
     try:
-        # 1. Initialize Python COM for DOCX processing (main culprit for slow first request)
+        # 1. Initialize Python COM and document libraries (main culprit for slow first request)
         print("📄 Initializing Python COM in worker...")
-        pythoncom.CoInitialize()
-        # Create a dummy document to force COM initialization
         try:
-            temp_doc = Document()
-            temp_doc.add_paragraph("Worker initialization test")
-            temp_path = tempfile.mktemp(suffix='.docx')
-            temp_doc.save(temp_path)
-            os.remove(temp_path)
+            renderer.warm_up()
             print("✅ Worker COM initialization complete")
         except Exception as e:
             print(f"⚠️ Worker COM initialization warning: {e}")
 
-        # 2. Pre-initialize heavy modules
-        print("📦 Pre-loading heavy modules in worker...")
+        # 2. Pre-load the Gemini SDK and build one client per (API key, model)
+        print("📦 Pre-warming Gemini client pool in worker...")
         try:
-            # Import modules that might be slow on first use
-            import docx2pdf
-            print("✅ Worker heavy modules pre-loaded")
+            client_count = llm.pool.warm()
+            print(f"✅ Worker Gemini client pool ready ({client_count} clients)")
         except Exception as e:
-            print(f"⚠️ Worker module pre-loading warning: {e}")
+            print(f"⚠️ Worker client pool warning: {e}")
+
+        # 3. Start the asyncio LLM engine when running in async execution mode
+        if LLM_EXECUTION_MODE == 'async':
+            get_engine().start()
+            print("✅ Async LLM engine started")
 
         print("🎉 Celery worker initialization complete")
 
     except Exception as e:
         print(f"❌ Celery worker initialization failed: {e}")
-    finally:
-        # Clean up COM
-        try:
-            pythoncom.CoUninitialize()
-        except:
-            pass
-
-# Initialize worker system immediately when worker starts
-initialize_worker_system()
 
 processor = ResumeProcessor()
+renderer = DocumentRenderer(flask_app.config['UPLOAD_FOLDER'])
+
+def _generate_customization(resume_content, selected_ids, data, models_to_try, job, emit_progress, percent_range, sections=None):
+    """Run generate_ai_customization through the key/model fallback loop; None if every attempt failed"""
+    api_keys = load_api_keys()
+    start_percent, done_percent = percent_range
+    result = None
+
+    # Try each model with all available API keys
+    for model in models_to_try:
+        used_keys = set()
+        while len(used_keys) < len(api_keys):
+            # Skip attempts that could not finish within the job's remaining time budget
+            job.check()
+            try:
+                api_key = api_keys[len(used_keys)]
+                used_keys.add(api_key)
 
-@celery.task(bind=True)
-def generate_customization_task(self, data):
-    session_id = data.get('session_id')
-    
-    def emit_progress(status):
-        socketio.emit('task_progress', {'status': status}, room=session_id)
-        time.sleep(1)
-
-    try:
-        # Load multiple API keys from environment
-        api_keys = []
-        combined_keys = os.environ.get('GEMINI_API_KEYS', '')
-        if combined_keys:
-            api_keys = [key.strip() for key in combined_keys.split(',') if key.strip()]
-
-        if not api_keys:
-            for i in range(1, 11):  # Support up to 10 individual keys
-                key = os.environ.get(f'GEMINI_API_KEY_{i}')
-                if key:
-                    api_keys.append(key)
-                else:
-                    break
-
-        if not api_keys:
-            single_key = os.environ.get('GEMINI_API_KEY')
-            if single_key:
-                api_keys = [single_key]
-
-        if not api_keys:
-            raise Exception("No GEMINI_API_KEY found on worker.")
-
-        emit_progress("Fetching resume details...")
-        resume = Resume.query.get(data.get('resume_id'))
-        if not resume:
-            raise Exception("Resume not found.")
-
-        if resume.structured_text:
-            emit_progress("Using cached resume content...")
-            resume_content = resume.structured_text
-        else:
-            emit_progress("No cache found. Parsing DOCX file...")
-            resume_content = processor.extract_text_from_docx(resume.original_file_path)
-        selected_ids_as_int = {int(id_val) for id_val in resume.selected_paragraph_ids or [] if str(id_val).isdigit()}
-
-        result = None
-        # MODIFIED: Implement robust model fallback logic with multiple API keys
-        initial_model = data.get('ai_model', 'gemini-2.5-pro')
-        models_to_try = [initial_model]
-        if initial_model != 'gemini-2.5-flash':
-            models_to_try.append('gemini-2.5-flash')
-
-        # Try each model with all available API keys
-        for model in models_to_try:
-            used_keys = set()
-            while len(used_keys) < len(api_keys):
-                try:
-                    api_key = api_keys[len(used_keys)]
-                    used_keys.add(api_key)
-
-                    emit_progress(f"Attempting generation with {model} (API key {len(used_keys)}/{len(api_keys)})...")
+                emit_progress(f"Attempting generation with {model} (API key {len(used_keys)}/{len(api_keys)})...", stage='generate', percent=start_percent)
+                with tracing.span('attempt', model=model, key_index=len(used_keys)):
                     result = processor.generate_ai_customization(
                         api_key,
                         model,
                         resume_content,
-                        selected_ids_as_int,
+                        selected_ids,
                         data.get('job_description', ''),
                         data.get('company_name', ''),
                         data.get('regenerate'),
-                        data.get('custom_prompts') # Pass custom prompts
+                        data.get('custom_prompts'), # Pass custom prompts
+                        job=job,
+                        sections=sections
                     )
-                    emit_progress(f"Successfully generated content with {model}!")
-                    break
-                except Exception as e:
-                    print(f"Model {model} with API key {len(used_keys)} failed: {e}")
-                    emit_progress(f"Model {model} failed. Trying next API key...")
-                    if len(used_keys) == len(api_keys):
-                        emit_progress(f"All API keys failed for {model}. Trying next model...")
-                        break
-            if result:
+                emit_progress(f"Successfully generated content with {model}!", stage='generate', percent=done_percent)
                 break
-        
-        if isinstance(data.get('regenerate'), dict) and 'single_paragraph' in data.get('regenerate'):
-            result['original_paragraph'] = data['regenerate']['single_paragraph']
+            except (JobCancelled, DeadlineExceeded):
+                raise
+            except Exception as e:
+                print(f"Model {model} with API key {len(used_keys)} failed: {e}")
+                metrics.inc('resumeai_llm_retries_total', source='generate_customization_task', model=model)
+                emit_progress(f"Model {model} failed. Trying next API key...", stage='generate', percent=start_percent)
+                if len(used_keys) == len(api_keys):
+                    emit_progress(f"All API keys failed for {model}. Trying next model...", stage='generate', percent=start_percent)
+                    break
+        if result:
+            break
+        if model != models_to_try[-1]:
+            metrics.inc('resumeai_llm_fallbacks_total', source='generate_customization_task', from_model=model, to_model=models_to_try[models_to_try.index(model) + 1])
+    return result
 
-        if data.get('regenerate'):
-            result['regenerate'] = data.get('regenerate')
 
-        # Update scraped job status in database if it was used
-        if data.get('scraped_jd_id'):
-            try:
-                # Import here to avoid circular imports
-                from app import ScrapedJD
+def _record_generation(job_id, session_id, data, result, sections=None):
+    """Store a result as the session's GenerationResult, in the same transaction as the
+    scraped JD's status. Returns the row id the client saves it by, or None."""
+    try:
+        with tracing.span('record_generation', scraped_jd_id=data.get('scraped_jd_id')):
+            generation = GenerationResult.record(job_id, session_id, data, result, sections)
+            if data.get('scraped_jd_id'):
                 jd = ScrapedJD.query.get(data.get('scraped_jd_id'))
                 if jd and jd.user_session_id == session_id:
                     jd.status = 'generated'
-                    db.session.commit()
-            except Exception as e:
-                print(f"Warning: Could not update scraped job status: {e}")
+            db.session.commit()
+            return generation.id if generation else None
+    except Exception as e:
+        db.session.rollback()
+        print(f"Warning: Could not store generation result for {job_id}: {e}")
+        return None
 
-        socketio.emit('task_success', {'job_id': self.request.id, 'result': result}, room=session_id)
-        return result
 
-    except Exception as e:
-        traceback.print_exc()
-        error_message = str(e)
-        socketio.emit('task_error', {'job_id': self.request.id, 'error': error_message}, room=session_id)
-        return {'error': error_message}
+@celery.task(bind=True)
+def generate_customization_task(self, data):
+    session_id = data.get('session_id')
+    # Background pre-generation for a scraped JD: silent unless a user attaches to it
+    prefetch_jd_id = data.get('prefetch_jd_id')
+
+    if prefetch_jd_id:
+        emit_progress = NullProgress()
+        data['deadline'] = time.time() + jobs.time_budget('customization')
+    else:
+        emit_progress = ProgressReporter(progress_channel, session_id, job_id=self.request.id)
+    job = JobContext(self.request.id, data.get('deadline'), progress=emit_progress)
+
+    with tracing.start_trace(self.request.id, 'generate_customization_task', session_id=session_id):
+        try:
+            # Load multiple API keys from environment
+            api_keys = load_api_keys()
+            if not api_keys:
+                raise Exception("No GEMINI_API_KEY found on worker.")
+
+            # Stored prompts arrive as ids; the processor works with their text
+            data['custom_prompts'] = prompts.for_task(data)
+
+            if prefetch_jd_id and not ScrapedJD.query.get(prefetch_jd_id):
+                raise JobCancelled(self.request.id, 'jd_deleted')
+
+            emit_progress("Fetching resume details...", stage='fetch_resume', percent=5)
+            with tracing.span('fetch_resume', resume_id=data.get('resume_id')):
+                resume = Resume.query.get(data.get('resume_id'))
+            if not resume:
+                raise Exception("Resume not found.")
+
+            with tracing.span('load_resume_content') as content_span:
+                if resume.structured_text:
+                    metrics.inc('resumeai_resume_cache_total', source='database', result='hit')
+                    content_span.set(cached=True)
+                    emit_progress("Using cached resume content...", stage='load_resume', percent=10)
+                    resume_content = resume.structured_text
+                else:
+                    metrics.inc('resumeai_resume_cache_total', source='database', result='miss')
+                    content_span.set(cached=False)
+                    emit_progress("No cache found. Parsing DOCX file...", stage='load_resume', percent=10)
+                    resume_content = renderer.extract_text_from_docx(resume.original_file_path)
+            selected_ids_as_int = {int(id_val) for id_val in resume.selected_paragraph_ids or [] if str(id_val).isdigit()}
+
+            # Model order comes from the router: the user's model (falling back to flash),
+            # unless it is currently missing its latency SLO and the other model isn't
+            initial_model = data.get('ai_model', 'gemini-2.5-pro')
+            models_to_try = routing.choose_models(initial_model, processor.customization_prompt_keys(data.get('regenerate')),
+                                                  job_id=self.request.id)
+            tracing.annotate(requested_model=initial_model, routed_model=models_to_try[0])
+            generation_args = (resume_content, selected_ids_as_int, data)
+            # A regeneration reuses the sections of the result it regenerates that are still current
+            stored_sections = GenerationResult.stored_sections(data.get('result_id'), session_id) if data.get('regenerate') else None
+
+            # Progressive mode: show a quick flash draft while the slower model works on the real thing
+            draft = None
+            if data.get('progressive') and not data.get('regenerate') and models_to_try[0] != 'gemini-2.5-flash':
+                emit_progress("Writing a quick draft with gemini-2.5-flash...", stage='draft', percent=15)
+                with tracing.span('draft'):
+                    draft = _generate_customization(*generation_args, ['gemini-2.5-flash'], job.scoped('draft'), emit_progress, (15, 40))
+                if draft:
+                    job.raise_if_cancelled()
+                    draft_sections = draft.pop('sections', None)
+                    draft['generation_id'] = _record_generation(self.request.id, session_id, data, draft, draft_sections)
+                    emit_progress.flush()
+                    emit('task_draft', {'job_id': self.request.id, 'model': 'gemini-2.5-flash',
+                                        **payloads.by_reference(f"{self.request.id}-draft", session_id, draft)}, session_id)
+                    # Flash already produced the draft, so it is no longer useful as a fallback
+                    models_to_try = [m for m in models_to_try if m != 'gemini-2.5-flash']
+                    emit_progress(f"Draft ready. Refining with {models_to_try[0]}...", stage='upgrade', percent=45)
+
+            try:
+                result = _generate_customization(*generation_args, models_to_try, job, emit_progress, (45, 90) if draft else (20, 90),
+                                                 sections=stored_sections)
+                # Don't deliver a result nobody is waiting for any more
+                job.raise_if_cancelled()
+            except JobCancelled as e:
+                if draft is None or e.reason != 'draft_accepted':
+                    raise
+                # The user saved or downloaded the draft - it is the final result
+                print(f"Draft of job {self.request.id} was accepted; upgrade stopped")
+                metrics.inc('resumeai_progressive_total', outcome='draft_accepted')
+                delivery = payloads.by_reference(self.request.id, session_id, dict(draft, draft_accepted=True))
+                return delivery.get('result', delivery)
+            except DeadlineExceeded:
+                if draft is None:
+                    raise
+                result = None
+
+            if draft is not None:
+                if result:
+                    result['upgraded_from_draft'] = True
+                    metrics.inc('resumeai_progressive_total', outcome='upgraded')
+                else:
+                    # The upgrade failed, but the user still has a usable draft
+                    result = dict(draft, upgrade_failed=True, sections=draft_sections)
+                    metrics.inc('resumeai_progressive_total', outcome='upgrade_failed')
+            if not result:
+                raise Exception("All API keys and models failed.")
+
+            if isinstance(data.get('regenerate'), dict) and 'single_paragraph' in data.get('regenerate'):
+                result['original_paragraph'] = data['regenerate']['single_paragraph']
+
+            if data.get('regenerate'):
+                result['regenerate'] = data.get('regenerate')
+
+            if prefetch_jd_id:
+                # Kept until the user opens the JD and asks for this result
+                if prefetch.store_draft(prefetch_jd_id, self.request.id, data['prefetch_fingerprint'], result):
+                    emit('prefetch_ready', {'scraped_jd_id': prefetch_jd_id, 'job_id': self.request.id}, session_id)
+                    # The result itself lives in the draft; the result backend only needs to know where
+                    return {'prefetched': True, 'scraped_jd_id': prefetch_jd_id}
+                # A user attached while it ran - deliver it like their own job (errors included)
+                data['scraped_jd_id'] = prefetch_jd_id
+                prefetch_jd_id = None
+
+            # Saving it as an application later only needs this id
+            generation_id = _record_generation(self.request.id, session_id, data, result, result.pop('sections', None))
+            if not data.get('regenerate'):
+                result['generation_id'] = generation_id
+
+            with tracing.span('emit', event='task_success'):
+                emit_progress.flush()
+                delivery = payloads.by_reference(self.request.id, session_id, result)
+                emit('task_success', {'job_id': self.request.id, **delivery}, session_id)
+            # The status endpoint serves the same inline result or reference
+            return delivery.get('result', delivery)
+
+        except JobCancelled as e:
+            print(f"Customization job {self.request.id} stopped: {e.reason}")
+            emit_progress.flush()
+            if not prefetch_jd_id or prefetch.adopted(self.request.id):
+                emit('task_cancelled', {'job_id': self.request.id, 'reason': e.reason}, session_id)
+            if prefetch_jd_id:
+                prefetch.finished(prefetch_jd_id, self.request.id, 'cancelled')
+            return {'cancelled': True, 'reason': e.reason}
+
+        except Exception as e:
+            traceback.print_exc()
+            error_message = str(e)
+            if isinstance(e, DeadlineExceeded):
+                metrics.inc('resumeai_deadline_exceeded_total', task='generate_customization_task')
+            emit_progress.flush()
+            if not prefetch_jd_id or prefetch.adopted(self.request.id):
+                emit('task_error', {'job_id': self.request.id, 'error': error_message}, session_id)
+            if prefetch_jd_id:
+                prefetch.finished(prefetch_jd_id, self.request.id, 'failed')
+            return {'error': error_message}
+        finally:
+            singleflight.release(data.get('singleflight_key'), self.request.id)
+            jobs.finish(session_id, self.request.id, data.get('supersede_key'))
+            admission.release(session_id, 'customization', self.request.id)
 
 
 @celery.task(bind=True)
 def create_download_file_task(self, data):
     session_id = data.get('session_id')
-    try:
-        resume_id = data.get('resume_id')
-        customizations = data.get('customizations', {})
-        company_name = data.get('company_name', 'resume')
+    with tracing.start_trace(self.request.id, 'create_download_file_task', session_id=session_id):
+        try:
+            resume_id = data.get('resume_id')
+            customizations = data.get('customizations', {})
+            company_name = data.get('company_name', 'resume')
 
-        print(f"DEBUG: Download task started with customizations: {customizations}")
-        print(f"DEBUG: Customizations type: {type(customizations)}")
+            print(f"DEBUG: Download task started with customizations: {customizations}")
+            print(f"DEBUG: Customizations type: {type(customizations)}")
 
-        resume = Resume.query.get(resume_id)
-        if not resume:
-            raise Exception("Resume not found for download task.")
+            resume = Resume.query.get(resume_id)
+            if not resume:
+                raise Exception("Resume not found for download task.")
 
-        # Ensure customizations is in the right format
-        if isinstance(customizations, str):
-            try:
-                customizations = json.loads(customizations)
-                print(f"DEBUG: Parsed customizations from string: {customizations}")
-            except json.JSONDecodeError:
-                print(f"DEBUG: Could not parse customizations string, using empty dict")
+            # Ensure customizations is in the right format
+            if isinstance(customizations, str):
+                try:
+                    customizations = json.loads(customizations)
+                    print(f"DEBUG: Parsed customizations from string: {customizations}")
+                except json.JSONDecodeError:
+                    print(f"DEBUG: Could not parse customizations string, using empty dict")
+                    customizations = {}
+
+            if not isinstance(customizations, dict):
+                print(f"DEBUG: Customizations is not a dict, converting to dict")
                 customizations = {}
 
-        if not isinstance(customizations, dict):
-            print(f"DEBUG: Customizations is not a dict, converting to dict")
-            customizations = {}
-
-        updated_docx_path = processor.update_docx_with_customizations(
-            resume.original_file_path,
-            customizations
-        )
-        output_filename = f"{resume.user_first_name}_{resume.user_last_name}_{company_name}".upper().replace(" ", "_")
-
-        # Check the requested format
-        requested_format = data.get('format', 'pdf')
-        print(f"DEBUG: Requested format: {requested_format}")
-
-        if requested_format == 'docx':
-            # User explicitly requested DOCX - just copy the file
-            print(f"DEBUG: User requested DOCX format, copying file directly")
-            final_path, final_filename = processor.convert_docx_to_docx(updated_docx_path, output_filename)
-        else:
-            # Try PDF conversion, fallback to DOCX if it fails
-            print(f"DEBUG: Attempting PDF conversion (will fallback to DOCX if needed)")
-            final_path, final_filename = processor.convert_docx_to_pdf(updated_docx_path, output_filename)
-
-        download_url = f'/download/{final_filename}'
-        socketio.emit('download_ready', {'job_id': self.request.id, 'download_url': download_url}, room=session_id)
-        return {'download_url': download_url}
+            with tracing.span('render_docx', customized_count=len(customizations.get('customized_paragraphs') or {})):
+                updated_docx_path = renderer.update_docx_with_customizations(
+                    resume.original_file_path,
+                    customizations
+                )
+            output_filename = f"{resume.user_first_name}_{resume.user_last_name}_{company_name}".upper().replace(" ", "_")
+
+            # Check the requested format
+            requested_format = data.get('format', 'pdf')
+            print(f"DEBUG: Requested format: {requested_format}")
+
+            with tracing.span('convert', format=requested_format):
+                if requested_format == 'docx':
+                    # User explicitly requested DOCX - just copy the file
+                    print(f"DEBUG: User requested DOCX format, copying file directly")
+                    final_path, final_filename = renderer.convert_docx_to_docx(updated_docx_path, output_filename)
+                else:
+                    # Try PDF conversion, fallback to DOCX if it fails
+                    print(f"DEBUG: Attempting PDF conversion (will fallback to DOCX if needed)")
+                    final_path, final_filename = renderer.convert_docx_to_pdf(updated_docx_path, output_filename)
 
-    except Exception as e:
-        traceback.print_exc()
-        error_message = str(e)
-        socketio.emit('task_error', {'job_id': self.request.id, 'error': f'Download failed: {error_message}'}, room=session_id)
-        return {'error': error_message}
+            download_url = f'/download/{final_filename}'
+            emit('download_ready', {'job_id': self.request.id, 'download_url': download_url}, session_id)
+            return {'download_url': download_url}
+
+        except Exception as e:
+            traceback.print_exc()
+            error_message = str(e)
+            emit('task_error', {'job_id': self.request.id, 'error': f'Download failed: {error_message}'}, session_id)
+            return {'error': error_message}
+        finally:
+            admission.release(session_id, 'download', self.request.id)
 
 @celery.task(bind=True)
 def generate_interview_prep_task(self, data):
     session_id = data.get('session_id')
     app_id = data.get('app_id')
     
-    def emit_progress(status):
-        socketio.emit('task_progress', {'status': status, 'context': {'type': 'interview_prep', 'app_id': app_id}}, room=session_id)
-        time.sleep(1)
+    emit_progress = ProgressReporter(progress_channel, session_id, job_id=self.request.id,
+                                     context={'type': 'interview_prep', 'app_id': app_id})
+    job = JobContext(self.request.id, data.get('deadline'), progress=emit_progress)
 
-    try:
-        # Load multiple API keys from environment
-        api_keys = []
-        combined_keys = os.environ.get('GEMINI_API_KEYS', '')
-        if combined_keys:
-            api_keys = [key.strip() for key in combined_keys.split(',') if key.strip()]
-
-        if not api_keys:
-            for i in range(1, 11):  # Support up to 10 individual keys
-                key = os.environ.get(f'GEMINI_API_KEY_{i}')
-                if key:
-                    api_keys.append(key)
-                else:
+    with tracing.start_trace(self.request.id, 'generate_interview_prep_task', session_id=session_id):
+        try:
+            # Load multiple API keys from environment
+            api_keys = load_api_keys()
+            if not api_keys:
+                raise Exception("No GEMINI_API_KEY found on worker.")
+
+            # Stored prompts arrive as ids; the processor works with their text
+            data['custom_prompts'] = prompts.for_task(data)
+
+            emit_progress("Fetching application and resume...", stage='fetch_application', percent=5)
+            with tracing.span('fetch_application', app_id=app_id):
+                application = Application.query.get(app_id)
+            if not application:
+                raise Exception("Application not found.")
+
+            resume = application.resume
+            if not resume or not resume.structured_text or 'full_text' not in resume.structured_text:
+                raise Exception("Cached resume text not found for this application.")
+
+            scraped_jd = ScrapedJD.query.filter_by(
+                user_session_id=session_id,
+                company_name=application.company_name
+            ).order_by(ScrapedJD.created_date.desc()).first()
+            job_title = scraped_jd.job_title if scraped_jd else f"Role at {application.company_name}"
+
+            emit_progress("Generating interview questions with AI... (this may take over a minute)", stage='generate', percent=15)
+
+            result = None
+            # Model order comes from the router: the user's model (falling back to flash),
+            # unless it is currently missing its latency SLO and the other model isn't
+            initial_model = data.get('ai_model', 'gemini-2.5-pro')
+            models_to_try = routing.choose_models(initial_model, ['interview_prep'], job_id=self.request.id)
+            tracing.annotate(requested_model=initial_model, routed_model=models_to_try[0])
+
+            # Try each model with all available API keys
+            for model in models_to_try:
+                used_keys = set()
+                while len(used_keys) < len(api_keys):
+                    # Skip attempts that could not finish within the job's remaining time budget
+                    job.check()
+                    try:
+                        api_key = api_keys[len(used_keys)]
+                        used_keys.add(api_key)
+
+                        emit_progress(f"Attempting generation with {model} (API key {len(used_keys)}/{len(api_keys)})...", stage='generate', percent=20)
+                        with tracing.span('attempt', model=model, key_index=len(used_keys)):
+                            result = processor.generate_interview_prep(
+                                api_key,
+                                model,
+                                resume.structured_text['full_text'],
+                                application.job_description,
+                                application.company_name,
+                                job_title,
+                                data.get('custom_prompts'), # Pass custom prompts
+                                job=job,
+                                previous=application.interview_prep,
+                                regenerate=data.get('regenerate')
+                            )
+                        emit_progress(f"Successfully generated content with {model}!", stage='generate', percent=90)
+                        break
+                    except (JobCancelled, DeadlineExceeded):
+                        raise
+                    except Exception as e:
+                        print(f"Model {model} with API key {len(used_keys)} failed: {e}")
+                        metrics.inc('resumeai_llm_retries_total', source='generate_interview_prep_task', model=model)
+                        emit_progress(f"Model {model} failed. Trying next API key...", stage='generate', percent=20)
+                        if len(used_keys) == len(api_keys):
+                            emit_progress(f"All API keys failed for {model}. Trying next model...", stage='generate', percent=20)
+                            break
+                if result:
                     break
+                if model != models_to_try[-1]:
+                    metrics.inc('resumeai_llm_fallbacks_total', source='generate_interview_prep_task', from_model=model, to_model=models_to_try[models_to_try.index(model) + 1])
 
-        if not api_keys:
-            single_key = os.environ.get('GEMINI_API_KEY')
-            if single_key:
-                api_keys = [single_key]
-
-        if not api_keys:
-            raise Exception("No GEMINI_API_KEY found on worker.")
-
-        emit_progress("Fetching application and resume...")
-        application = Application.query.get(app_id)
-        if not application:
-            raise Exception("Application not found.")
-
-        resume = application.resume
-        if not resume or not resume.structured_text or 'full_text' not in resume.structured_text:
-            raise Exception("Cached resume text not found for this application.")
-
-        scraped_jd = ScrapedJD.query.filter_by(
-            user_session_id=session_id,
-            company_name=application.company_name
-        ).order_by(ScrapedJD.created_date.desc()).first()
-        job_title = scraped_jd.job_title if scraped_jd else f"Role at {application.company_name}"
-
-        emit_progress("Generating interview questions with AI... (this may take over a minute)")
-
-        result = None
-        # MODIFIED: Implement robust model fallback logic with multiple API keys
-        initial_model = data.get('ai_model', 'gemini-2.5-pro')
-        models_to_try = [initial_model]
-        if initial_model != 'gemini-2.5-flash':
-            models_to_try.append('gemini-2.5-flash')
-
-        # Try each model with all available API keys
-        for model in models_to_try:
-            used_keys = set()
-            while len(used_keys) < len(api_keys):
-                try:
-                    api_key = api_keys[len(used_keys)]
-                    used_keys.add(api_key)
+            job.raise_if_cancelled()
 
-                    emit_progress(f"Attempting generation with {model} (API key {len(used_keys)}/{len(api_keys)})...")
-                    result = processor.generate_interview_prep(
-                        api_key,
-                        model,
-                        resume.structured_text['full_text'],
-                        application.job_description,
-                        application.company_name,
-                        job_title,
-                        data.get('custom_prompts') # Pass custom prompts
-                    )
-                    emit_progress(f"Successfully generated content with {model}!")
-                    break
-                except Exception as e:
-                    print(f"Model {model} with API key {len(used_keys)} failed: {e}")
-                    emit_progress(f"Model {model} failed. Trying next API key...")
-                    if len(used_keys) == len(api_keys):
-                        emit_progress(f"All API keys failed for {model}. Trying next model...")
-                        break
-            if result:
-                break
-
-        emit_progress("Saving results to database...")
-        application.interview_prep = result
-        db.session.commit()
+            emit_progress("Saving results to database...", stage='save', percent=95)
+            with tracing.span('status_update'):
+                application.interview_prep = result
+                db.session.commit()
         
-        socketio.emit('interview_prep_ready', {
-            'job_id': self.request.id, 
-            'app_id': app_id, 
-            'interview_prep': result
-        }, room=session_id)
+            emit_progress.flush()
+            emit('interview_prep_ready', {
+                'job_id': self.request.id,
+                'app_id': app_id,
+                **payloads.by_reference(self.request.id, session_id, result, field='interview_prep')
+            }, session_id)
         
-        return {'app_id': app_id, 'status': 'success'}
+            return {'app_id': app_id, 'status': 'success'}
+
+        except JobCancelled as e:
+            print(f"Interview prep job {self.request.id} stopped: {e.reason}")
+            emit_progress.flush()
+            emit('task_cancelled', {
+                'job_id': self.request.id,
+                'reason': e.reason,
+                'context': {'type': 'interview_prep', 'app_id': app_id}
+            }, session_id)
+            return {'cancelled': True, 'reason': e.reason}
 
-    except Exception as e:
-        traceback.print_exc()
-        error_message = str(e)
-        socketio.emit('task_error', {
-            'job_id': self.request.id, 
-            'error': error_message,
-            'context': {'type': 'interview_prep', 'app_id': app_id}
-        }, room=session_id)
-        return {'error': error_message}
+        except Exception as e:
+            traceback.print_exc()
+            error_message = str(e)
+            if isinstance(e, DeadlineExceeded):
+                metrics.inc('resumeai_deadline_exceeded_total', task='generate_interview_prep_task')
+            emit_progress.flush()
+            emit('task_error', {
+                'job_id': self.request.id,
+                'error': error_message,
+                'context': {'type': 'interview_prep', 'app_id': app_id}
+            }, session_id)
+            return {'error': error_message}
+        finally:
+            singleflight.release(data.get('singleflight_key'), self.request.id)
+            jobs.finish(session_id, self.request.id, data.get('supersede_key'))
+            admission.release(session_id, 'interview_prep', self.request.id)
@@ -0,0 +1,6 @@
+"""Shared core of ResumeAI used by both the web app (app.py) and the Celery worker (celery_worker.py).
+
+Modules in this package keep their heavy third-party imports (google.generativeai,
+python-docx, pythoncom, docx2pdf, celery) inside the functions that need them, so
+importing the package is cheap and each process only pays for what it uses.
+"""
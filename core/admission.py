@@ -0,0 +1,164 @@
+import math
+import time
+
+from core import hedging, metrics
+from core.config import (ADMISSION_LIMITS, ADMISSION_MAX_KEY_USAGE, ADMISSION_MAX_QUEUE_DEPTH, ADMISSION_SATURATED_DEPTH,
+                         JOB_DEADLINES, LLM_KEY_CALLS_PER_MINUTE, load_api_keys)
+from core.redis_client import get_redis
+
+# Redis bookkeeping for admission control:
+#   admission:active:<session_id>:<kind>         the session's queued and running jobs (score: when the job is over at the latest)
+#   admission:running                            every admitted job as <session_id>|<job_id>, same score (for fair share)
+#   admission:rate:<session_id>:<kind>:<minute>  jobs of the kind the session started in that minute
+#   admission:done:<minute>                jobs finished in that minute (throughput behind wait estimates)
+LLM_KINDS = ('customization', 'interview_prep')
+# Jobs without a time budget (downloads) stop counting against their session after this long
+UNTIMED_JOB_SECONDS = 600
+# Retry-After when there is no throughput to estimate from
+DEFAULT_RETRY_SECONDS = 15
+MAX_RETRY_SECONDS = 300
+
+# Check and record the session's limits in one step so parallel requests can't both slip in
+_ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+redis.call('zremrangebyscore', KEYS[3], '-inf', now)
+local active = redis.call('zcard', KEYS[1])
+if ARGV[6] ~= '' and redis.call('zscore', KEYS[1], ARGV[6]) then
+    active = active - 1
+end
+if active >= tonumber(ARGV[4]) then
+    return {'session_concurrency', active}
+end
+if tonumber(redis.call('get', KEYS[2]) or '0') >= tonumber(ARGV[5]) then
+    return {'session_rate', active}
+end
+if tonumber(ARGV[7]) >= 0 and active >= tonumber(ARGV[7]) then
+    return {'fair_share', active}
+end
+redis.call('zadd', KEYS[1], ARGV[3], ARGV[2])
+redis.call('expireat', KEYS[1], math.ceil(tonumber(ARGV[3])))
+redis.call('zadd', KEYS[3], ARGV[3], ARGV[8] .. '|' .. ARGV[2])
+redis.call('incr', KEYS[2])
+redis.call('expire', KEYS[2], 120)
+return {'admitted', active + 1}
+"""
+
+MESSAGES = {
+    'session_concurrency': "You already have {active} jobs of this kind queued or running",
+    'session_rate': "Too many requests in the last minute",
+    'fair_share': "The system is busy and your jobs already have their share of it",
+    'queue_full': "The system is at capacity",
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, kind, reason, retry_after, queue_position=None, estimated_wait=None, active=None):
+        message = MESSAGES[reason].format(active=active)
+        if reason in ('fair_share', 'queue_full') and queue_position:
+            message += f" ({queue_position - 1} jobs are waiting)"
+        super().__init__(f"{message}. Please try again in {retry_after}s.")
+        self.kind = kind
+        self.reason = reason
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+        self.estimated_wait = estimated_wait
+
+    def to_dict(self):
+        return {'error': str(self), 'reason': self.reason, 'retry_after': self.retry_after,
+                'queue_position': self.queue_position, 'estimated_wait_seconds': self.estimated_wait}
+
+
+def _minute():
+    return int(time.time() // 60)
+
+
+def throughput_per_minute():
+    """Jobs finished per minute over the last two minutes"""
+    minute = _minute()
+    counts = get_redis().mget(f"admission:done:{minute}", f"admission:done:{minute - 1}")
+    return sum(int(count or 0) for count in counts) / 2
+
+
+def _fair_share(now):
+    """Average queued/running jobs per session with any; a session at or above it waits while saturated"""
+    members = get_redis().zrangebyscore('admission:running', now, '+inf')
+    sessions = {member.split('|', 1)[0] for member in members}
+    return max(1, len(members) // len(sessions)) if sessions else 1
+
+
+def _saturation(kind):
+    """'queue_full', 'saturated' or None, from the live queue depth and key-pool headroom"""
+    depth = metrics.queue_depths(('celery',)).get('celery', 0)
+    if depth >= ADMISSION_MAX_QUEUE_DEPTH:
+        return 'queue_full', depth
+    if depth >= ADMISSION_SATURATED_DEPTH:
+        return 'saturated', depth
+    if kind in LLM_KINDS:
+        capacity = LLM_KEY_CALLS_PER_MINUTE * max(len(load_api_keys()), 1)
+        if hedging.calls_per_minute() >= ADMISSION_MAX_KEY_USAGE * capacity:
+            return 'saturated', depth
+    return None, depth
+
+
+def _retry_after(reason, depth, throughput):
+    if reason == 'session_rate':
+        return 60 - int(time.time() % 60)
+    if not throughput:
+        return DEFAULT_RETRY_SECONDS
+    # Roughly when the jobs ahead (or one of the session's own) will be done
+    jobs_ahead = depth + 1 if reason in ('queue_full', 'fair_share') else 1
+    return min(MAX_RETRY_SECONDS, max(1, math.ceil(jobs_ahead / throughput * 60)))
+
+
+def admit(session_id, kind, job_id, replacing=None):
+    """Admit a job for the session or raise AdmissionRejected.
+
+    `replacing` is a job this one supersedes; it doesn't count against the session.
+    """
+    try:
+        now = time.time()
+        saturation, depth = _saturation(kind)
+        throughput = throughput_per_minute()
+        if saturation == 'queue_full':
+            reason, active = 'queue_full', None
+        else:
+            max_active, per_minute = ADMISSION_LIMITS[kind]
+            fair_share = _fair_share(now) if saturation else -1
+            expires = now + JOB_DEADLINES.get(kind, UNTIMED_JOB_SECONDS)
+            reason, active = get_redis().eval(
+                _ADMIT_SCRIPT, 3,
+                f"admission:active:{session_id}:{kind}", f"admission:rate:{session_id}:{kind}:{_minute()}", 'admission:running',
+                now, job_id, expires, max_active, per_minute, replacing or '', fair_share, session_id)
+    except Exception as e:
+        # Admission control must not take the endpoints down with it
+        print(f"Admission warning: admitting {job_id} unchecked: {e}")
+        metrics.inc('resumeai_admission_total', kind=kind, outcome='unchecked')
+        return
+
+    metrics.inc('resumeai_admission_total', kind=kind, outcome=reason)
+    if reason == 'admitted':
+        return
+    position = depth + 1
+    estimated_wait = math.ceil(position / throughput * 60) if throughput else None
+    raise AdmissionRejected(kind, reason, _retry_after(reason, depth, throughput), position, estimated_wait, active)
+
+
+def release(session_id, kind, job_id):
+    """A job finished (or was dropped); it no longer counts against its session"""
+    if not session_id or not job_id:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zrem(f"admission:active:{session_id}:{kind}", job_id)
+        pipe.zrem('admission:running', f"{session_id}|{job_id}")
+        removed, _ = pipe.execute()
+        # Counted once, however many places report the same job as over
+        if removed:
+            minute_key = f"admission:done:{_minute()}"
+            pipe = get_redis().pipeline()
+            pipe.incr(minute_key)
+            pipe.expire(minute_key, 180)
+            pipe.execute()
+    except Exception as e:
+        print(f"Admission warning: could not release {job_id}: {e}")
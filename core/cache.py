@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+from core import metrics
+from core.redis_client import get_redis
+
+
+def calculate_file_hash(file_path):
+    """Calculate SHA-256 hash of a file for cache invalidation"""
+    hash_sha256 = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_sha256.update(chunk)
+        return hash_sha256.hexdigest()
+    except Exception as e:
+        print(f"Error calculating file hash: {e}")
+        return None
+
+
+def get_cached_resume_content(file_hash):
+    """Get cached resume content from Redis with error handling"""
+    if not file_hash:
+        return None
+    try:
+        cached_data = get_redis().get(f"resume_content:{file_hash}")
+        if cached_data:
+            metrics.inc('resumeai_resume_cache_total', source='redis', result='hit')
+            return json.loads(cached_data)
+        metrics.inc('resumeai_resume_cache_total', source='redis', result='miss')
+    except json.JSONDecodeError as e:
+        metrics.inc('resumeai_resume_cache_total', source='redis', result='corrupt')
+        print(f"Error decoding cached JSON for hash {file_hash}: {e}")
+        # Delete corrupted cache entry
+        try:
+            get_redis().delete(f"resume_content:{file_hash}")
+        except:
+            pass
+    except Exception as e:
+        print(f"Error retrieving cached content for hash {file_hash}: {e}")
+    return None
+
+
+def set_cached_resume_content(file_hash, content):
+    """Cache resume content in Redis with TTL and error handling"""
+    if not file_hash or not content:
+        return
+    try:
+        get_redis().setex(
+            f"resume_content:{file_hash}",
+            7200,  # 2 hour TTL (increased from 1 hour)
+            json.dumps(content, ensure_ascii=False)
+        )
+    except Exception as e:
+        print(f"Error caching content for hash {file_hash}: {e}")
+
+
+def clear_resume_cache(file_hash):
+    """Clear cached resume content from Redis"""
+    if not file_hash:
+        return
+    try:
+        get_redis().delete(f"resume_content:{file_hash}")
+    except Exception as e:
+        print(f"Error clearing cache for hash {file_hash}: {e}")
@@ -0,0 +1,134 @@
+import glob
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+from core import metrics
+from core.config import LLM_CASSETTE_DIR, LLM_CASSETTE_LATENCY_SCALE, LLM_CASSETTE_MATCH, LLM_TRANSPORT
+
+# Recorded LLM calls, one JSON object per line in <LLM_CASSETTE_DIR>/<host>-<pid>.jsonl
+# (one file per recording process, so workers never write to the same file):
+#   {"key", "model", "prompt_key", "prompt", "text" or "error", "latency_seconds", "recorded_at"}
+# Replay loads every file once. A key with several recordings answers with them in turn,
+# so repeated identical prompts see the same sequence of answers (including failures)
+# they saw when recorded.
+
+_write_lock = threading.Lock()
+_load_lock = threading.Lock()
+_entries = None
+_cursors = {}
+
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a call"""
+
+
+class ReplayedError(Exception):
+    """A call that failed when it was recorded fails the same way on replay"""
+
+
+class ReplayedResponse:
+    """Stands in for a GenerateContentResponse; callers only read .text"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def prompt_hash(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()[:24]
+
+
+def _match_key(model_name, prompt_key, prompt):
+    if LLM_CASSETTE_MATCH == 'prompt_key':
+        return f"{model_name}:{prompt_key}"
+    return prompt_hash(model_name, prompt)
+
+
+def _path():
+    return os.path.join(LLM_CASSETTE_DIR, f"{socket.gethostname()}-{os.getpid()}.jsonl")
+
+
+def _write(entry):
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _write_lock:
+        os.makedirs(LLM_CASSETTE_DIR, exist_ok=True)
+        with open(_path(), 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def load(directory=None):
+    """{match key: [entries in recording order]} for every cassette file in the directory"""
+    entries = {}
+    for path in sorted(glob.glob(os.path.join(directory or LLM_CASSETTE_DIR, '*.jsonl'))):
+        with open(path, encoding='utf-8') as f:
+            recorded = [json.loads(line) for line in f if line.strip()]
+        for entry in sorted(recorded, key=lambda e: e['recorded_at']):
+            entries.setdefault(_match_key(entry['model'], entry['prompt_key'], entry['prompt']), []).append(entry)
+    return entries
+
+
+def _next_entry(key):
+    global _entries
+    if _entries is None:
+        with _load_lock:
+            if _entries is None:
+                _entries = load()
+                print(f"🎞️ Loaded {sum(len(e) for e in _entries.values())} recorded LLM calls from {LLM_CASSETTE_DIR}")
+    recorded = _entries.get(key)
+    if not recorded:
+        return None
+    with _load_lock:
+        index = _cursors.get(key, 0)
+        _cursors[key] = index + 1
+    return recorded[index % len(recorded)]
+
+
+def _replay(client, prompt, prompt_key):
+    entry = _next_entry(_match_key(client.model_name, prompt_key, prompt))
+    if entry is None:
+        metrics.inc('resumeai_cassette_total', mode='replay', outcome='miss')
+        raise CassetteMiss(f"No recorded {prompt_key} call for {client.model_name} in {LLM_CASSETTE_DIR} "
+                           f"(prompt {prompt_hash(client.model_name, prompt)}, match={LLM_CASSETTE_MATCH})")
+    if LLM_CASSETTE_LATENCY_SCALE > 0:
+        time.sleep(entry['latency_seconds'] * LLM_CASSETTE_LATENCY_SCALE)
+    if 'error' in entry:
+        metrics.inc('resumeai_cassette_total', mode='replay', outcome='error')
+        raise ReplayedError(entry['error'])
+    metrics.inc('resumeai_cassette_total', mode='replay', outcome='hit')
+    return ReplayedResponse(entry['text'])
+
+
+def _record(client, prompt, prompt_key, call):
+    started = time.monotonic()
+    entry = {'key': prompt_hash(client.model_name, prompt), 'model': client.model_name, 'prompt_key': prompt_key,
+             'prompt': prompt, 'recorded_at': time.time()}
+    try:
+        response = call()
+    except Exception as e:
+        entry.update(error=f"{type(e).__name__}: {e}", latency_seconds=round(time.monotonic() - started, 3))
+        _save(entry)
+        raise
+    entry.update(text=response.text if response else '', latency_seconds=round(time.monotonic() - started, 3))
+    _save(entry)
+    return response
+
+
+def _save(entry):
+    # A full disk must not fail the call that was just paid for
+    try:
+        _write(entry)
+        metrics.inc('resumeai_cassette_total', mode='record', outcome='error' if 'error' in entry else 'ok')
+    except Exception as e:
+        print(f"Cassette warning: could not record {entry['prompt_key']} call: {e}")
+
+
+def generate(client, prompt, prompt_key, call):
+    """Make an LLM call through the configured transport; `call` does the live request"""
+    if LLM_TRANSPORT == 'replay':
+        return _replay(client, prompt, prompt_key)
+    if LLM_TRANSPORT == 'record':
+        return _record(client, prompt, prompt_key, call)
+    return call()
@@ -0,0 +1,31 @@
+from core.config import RESULT_TTL_SECONDS
+
+
+def make_celery(app):
+    from celery import Celery, Task
+
+    celery = Celery(
+        app.import_name,
+        backend=app.config['result_backend'],
+        broker=app.config['broker_url']
+    )
+    celery.conf.update(app.config)
+    celery.conf.update(
+        # Task args carry full JDs and resumes; msgpack + zlib keeps broker and backend entries small.
+        # JSON is still accepted so messages queued by an older web process are not rejected.
+        task_serializer='msgpack',
+        result_serializer='msgpack',
+        accept_content=['msgpack', 'json'],
+        result_accept_content=['msgpack', 'json'],
+        task_compression='zlib',
+        result_compression='zlib',
+        result_expires=RESULT_TTL_SECONDS,
+    )
+
+    class ContextTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery.Task = ContextTask
+    return celery
@@ -0,0 +1,160 @@
+import os
+
+REDIS_URL = 'redis://localhost:6379/0'
+UPLOAD_FOLDER = 'uploads'
+DEFAULT_DATABASE_URL = 'sqlite:///resumeai.db'
+
+BASE_CONFIG = {
+    'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-here'),
+    'UPLOAD_FOLDER': UPLOAD_FOLDER,
+    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,
+    'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL),
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'broker_url': REDIS_URL,
+    'result_backend': REDIS_URL,
+    # Workers started with -Q celery,prefetch drain the interactive queue before prefetch jobs
+    'broker_transport_options': {'queue_order_strategy': 'priority'},
+}
+
+# 'sync' calls Gemini directly from the task; 'async' runs calls on the shared
+# asyncio engine (core/engine.py) so one worker can keep many requests in flight
+LLM_EXECUTION_MODE = os.environ.get('LLM_EXECUTION_MODE', 'sync')
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.environ.get('LLM_MAX_CONCURRENCY_PER_KEY', 4))
+LLM_MAX_CONCURRENCY_PER_MODEL = int(os.environ.get('LLM_MAX_CONCURRENCY_PER_MODEL', 8))
+LLM_DEFAULT_TIMEOUT = int(os.environ.get('LLM_DEFAULT_TIMEOUT', 300))
+
+# Hedged requests: when a call is still running after the LLM_HEDGE_PERCENTILE of
+# recent latencies (never sooner than LLM_HEDGE_MIN_DELAY), send a duplicate on another
+# key and keep whichever answers first. LLM_HEDGE_BUDGET caps duplicates as a share of calls.
+LLM_HEDGING_ENABLED = os.environ.get('LLM_HEDGING_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', 5))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))
+LLM_HEDGE_BUDGET = float(os.environ.get('LLM_HEDGE_BUDGET', 0.1))
+
+# Model routing: the user's model is swapped for a healthy one when its p90 latency
+# for a prompt type exceeds the SLO below (seconds), or it errors / returns broken JSON
+# too often. Needs LLM_ROUTING_MIN_SAMPLES calls from the last LLM_ROUTING_WINDOW_SECONDS
+# before it judges a model, so a model that lost its traffic is tried again once its
+# bad samples age out.
+LLM_ROUTING_ENABLED = os.environ.get('LLM_ROUTING_ENABLED', 'true').lower() == 'true'
+LLM_ROUTING_SLOS = {
+    'single_paragraph': float(os.environ.get('LLM_SLO_SINGLE_PARAGRAPH', 20)),
+    'paragraphs': float(os.environ.get('LLM_SLO_PARAGRAPHS', 90)),
+    'cover_letter': float(os.environ.get('LLM_SLO_COVER_LETTER', 90)),
+    'interview_prep': float(os.environ.get('LLM_SLO_INTERVIEW_PREP', 180)),
+}
+LLM_ROUTING_MAX_ERROR_RATE = float(os.environ.get('LLM_ROUTING_MAX_ERROR_RATE', 0.5))
+LLM_ROUTING_MAX_PARSE_FAILURE_RATE = float(os.environ.get('LLM_ROUTING_MAX_PARSE_FAILURE_RATE', 0.3))
+LLM_ROUTING_MIN_SAMPLES = int(os.environ.get('LLM_ROUTING_MIN_SAMPLES', 10))
+LLM_ROUTING_WINDOW_SECONDS = float(os.environ.get('LLM_ROUTING_WINDOW_SECONDS', 600))
+
+# Context caching for the stable part of resume-heavy prompts (role instructions +
+# resume text): 'off', 'gemini' (provider-side CachedContent) or 'local' (in-process
+# stand-in that sends the full prompt, for development and tests)
+LLM_CONTEXT_CACHE = os.environ.get('LLM_CONTEXT_CACHE', 'off').lower()
+LLM_CONTEXT_CACHE_TTL = int(os.environ.get('LLM_CONTEXT_CACHE_TTL', 3600))
+# Gemini rejects cached contexts below a per-model token count; smaller ones are sent inline
+LLM_CONTEXT_CACHE_MIN_TOKENS = {
+    'gemini-2.5-pro': int(os.environ.get('LLM_CONTEXT_CACHE_MIN_TOKENS_PRO', 4096)),
+    'gemini-2.5-flash': int(os.environ.get('LLM_CONTEXT_CACHE_MIN_TOKENS_FLASH', 1024)),
+}
+
+# 'live' calls Gemini; 'record' also writes every prompt -> response pair (with its latency)
+# to the cassette directory; 'replay' answers from the cassettes without any network
+# (see core/cassette.py). LLM_CASSETTE_MATCH 'prompt' replays the response recorded for
+# the exact prompt, 'prompt_key' the recorded responses of the same model and prompt type
+# in turn (for benchmarking prompt changes). LLM_CASSETTE_LATENCY_SCALE 1 replays at the
+# recorded latency, 0 answers at once.
+LLM_TRANSPORT = os.environ.get('LLM_TRANSPORT', 'live').lower()
+LLM_CASSETTE_DIR = os.environ.get('LLM_CASSETTE_DIR', 'cassettes')
+LLM_CASSETTE_MATCH = os.environ.get('LLM_CASSETTE_MATCH', 'prompt').lower()
+LLM_CASSETTE_LATENCY_SCALE = float(os.environ.get('LLM_CASSETTE_LATENCY_SCALE', 0))
+
+# Finished results live this long in the Celery result backend and the result store.
+# Results larger than RESULT_INLINE_MAX_BYTES (msgpack-encoded) are not put into socket
+# events or status responses; the client fetches them from /api/results/<job_id>
+RESULT_TTL_SECONDS = int(os.environ.get('RESULT_TTL_SECONDS', 12 * 3600))
+RESULT_INLINE_MAX_BYTES = int(os.environ.get('RESULT_INLINE_MAX_BYTES', 8192))
+
+# Progress events per session are spaced at least this far apart; at most
+# PROGRESS_MAX_PENDING undelivered updates are kept (older ones are superseded)
+PROGRESS_MIN_INTERVAL = float(os.environ.get('PROGRESS_MIN_INTERVAL', 1.0))
+PROGRESS_MAX_PENDING = int(os.environ.get('PROGRESS_MAX_PENDING', 3))
+
+# End-to-end time budget per job type in seconds. Requests may ask for less with
+# `deadline_seconds`; every LLM call's timeout shrinks to what is left of the budget
+JOB_DEADLINES = {
+    'customization': int(os.environ.get('CUSTOMIZATION_DEADLINE_SECONDS', 600)),
+    'interview_prep': int(os.environ.get('INTERVIEW_PREP_DEADLINE_SECONDS', 600)),
+}
+# A key/model attempt is skipped when less than this is left of the budget
+LLM_MIN_ATTEMPT_SECONDS = int(os.environ.get('LLM_MIN_ATTEMPT_SECONDS', 20))
+
+# Generation jobs of a session with no open socket for this long are cancelled
+JOB_ABANDON_GRACE_SECONDS = int(os.environ.get('JOB_ABANDON_GRACE_SECONDS', 60))
+
+# Prefetch: when the extension scrapes a JD, users who opted in get a customization
+# generated in the background on the low-priority 'prefetch' queue - only while no more
+# than PREFETCH_MAX_QUEUE_DEPTH interactive jobs are waiting, fewer than
+# PREFETCH_MAX_PENDING prefetches are queued and the keys run below PREFETCH_MAX_KEY_USAGE
+# of LLM_KEY_CALLS_PER_MINUTE
+PREFETCH_QUEUE = 'prefetch'
+PREFETCH_MAX_QUEUE_DEPTH = int(os.environ.get('PREFETCH_MAX_QUEUE_DEPTH', 0))
+PREFETCH_MAX_PENDING = int(os.environ.get('PREFETCH_MAX_PENDING', 5))
+PREFETCH_MAX_KEY_USAGE = float(os.environ.get('PREFETCH_MAX_KEY_USAGE', 0.5))
+LLM_KEY_CALLS_PER_MINUTE = int(os.environ.get('LLM_KEY_CALLS_PER_MINUTE', 10))
+# Unused prefetched results are dropped after this long
+PREFETCH_DRAFT_TTL_SECONDS = int(os.environ.get('PREFETCH_DRAFT_TTL_SECONDS', 3 * 24 * 3600))
+
+# Admission control for /customize, interview prep and downloads. Per session and kind,
+# ADMISSION_LIMITS = (jobs queued or running at once, jobs started per minute). While the
+# 'celery' queue holds ADMISSION_SATURATED_DEPTH messages or the keys run at
+# ADMISSION_MAX_KEY_USAGE of LLM_KEY_CALLS_PER_MINUTE, only sessions below the average
+# number of jobs per session are admitted; at ADMISSION_MAX_QUEUE_DEPTH nobody is
+ADMISSION_LIMITS = {
+    'customization': (int(os.environ.get('ADMISSION_CUSTOMIZATION_CONCURRENCY', 3)),
+                      int(os.environ.get('ADMISSION_CUSTOMIZATION_PER_MINUTE', 10))),
+    'interview_prep': (int(os.environ.get('ADMISSION_INTERVIEW_PREP_CONCURRENCY', 2)),
+                       int(os.environ.get('ADMISSION_INTERVIEW_PREP_PER_MINUTE', 5))),
+    'download': (int(os.environ.get('ADMISSION_DOWNLOAD_CONCURRENCY', 3)),
+                 int(os.environ.get('ADMISSION_DOWNLOAD_PER_MINUTE', 20))),
+}
+ADMISSION_SATURATED_DEPTH = int(os.environ.get('ADMISSION_SATURATED_DEPTH', 10))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get('ADMISSION_MAX_QUEUE_DEPTH', 50))
+ADMISSION_MAX_KEY_USAGE = float(os.environ.get('ADMISSION_MAX_KEY_USAGE', 0.9))
+
+# Point the Gemini clients at another server (e.g. benchmarks/fake_gemini.py) over REST; unset means Google's API
+GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT', '')
+
+GEMINI_MODELS = {
+    'gemini-2.5-flash': 'gemini-2.5-flash',
+    'gemini-2.5-pro': 'gemini-2.5-pro'
+}
+
+
+def load_api_keys():
+    """Load multiple API keys from environment variables"""
+    api_keys = []
+
+    # Try to load comma-separated API keys first
+    combined_keys = os.environ.get('GEMINI_API_KEYS', '')
+    if combined_keys:
+        api_keys = [key.strip() for key in combined_keys.split(',') if key.strip()]
+
+    # If no combined keys, try individual keys
+    if not api_keys:
+        for i in range(1, 11):  # Support up to 10 individual keys
+            key = os.environ.get(f'GEMINI_API_KEY_{i}')
+            if key:
+                api_keys.append(key)
+            else:
+                break
+
+    # Fallback to single key for backward compatibility
+    if not api_keys:
+        single_key = os.environ.get('GEMINI_API_KEY')
+        if single_key:
+            api_keys = [single_key]
+
+    return api_keys
@@ -0,0 +1,220 @@
+import hashlib
+import re
+import threading
+import time
+import uuid
+
+from core import metrics
+from core.config import LLM_CONTEXT_CACHE, LLM_CONTEXT_CACHE_MIN_TOKENS, LLM_CONTEXT_CACHE_TTL
+from core.redis_client import get_redis
+
+# Resume-heavy prompts start with long role instructions and embed the whole resume,
+# then add the JD. Both of the first parts are identical for every JD a user targets,
+# so they go into a cached context once and each call only sends the JD-specific rest.
+
+# Placeholders that change per job description - the cached prefix ends before the first one
+JD_PLACEHOLDERS = ('{COMPANY}', '{JOB_DESCRIPTION}', '{JOB_TITLE}')
+RESUME_HEADER = "FULL RESUME TEXT:\n"
+# What {FULL_RESUME_TEXT} becomes in the per-call part of the prompt
+RESUME_REFERENCE = "[the FULL RESUME TEXT provided in the context above]"
+# Token counts are estimated without an API call. English prose averages about 4 characters
+# a token; assuming 5 underestimates, so a context that passes really is above the minimum
+CHARS_PER_TOKEN = 5
+# A failed creation is not retried for this long
+FAILURE_TTL_SECONDS = 600
+# A context must come back within this long to get a cache; the use count expires after it
+SEEN_TTL_SECONDS = 900
+_FAILED = '-'
+
+_placeholder_re = re.compile(r'\{[A-Z_]+\}')
+
+
+def _is_heading(paragraph):
+    paragraph = paragraph.strip()
+    return '\n' not in paragraph and paragraph.endswith(':')
+
+
+def split_template(template):
+    """Split a prompt template into (cacheable prefix, per-call body), or None if it can't be cached.
+
+    The prefix ends at the section boundary (blank line) before the first
+    JD-specific placeholder, with a heading right above that placeholder moved
+    to the body, and must not contain placeholders itself; the body must be
+    where the resume goes.
+    """
+    positions = [template.find(p) for p in JD_PLACEHOLDERS if p in template]
+    if '{FULL_RESUME_TEXT}' not in template or not positions:
+        return None
+    cut = template.rfind('\n\n', 0, min(positions))
+    while cut > 0 and _is_heading(template[template.rfind('\n\n', 0, cut) + 2:cut]):
+        cut = template.rfind('\n\n', 0, cut)
+    if cut <= 0:
+        return None
+    prefix, body = template[:cut].strip(), template[cut:].lstrip('\n')
+    if _placeholder_re.search(prefix) or '{FULL_RESUME_TEXT}' not in body:
+        return None
+    return prefix, body
+
+
+def large_enough(client, prefix, resume_text):
+    """Whether prefix + resume clear the model's minimum size for a cached context"""
+    min_tokens = LLM_CONTEXT_CACHE_MIN_TOKENS.get(client.model_name, max(LLM_CONTEXT_CACHE_MIN_TOKENS.values()))
+    return (len(prefix) + len(RESUME_HEADER) + len(resume_text)) / CHARS_PER_TOKEN >= min_tokens
+
+
+def _is_cache_error(error):
+    """Errors that mean the cached context is gone or unusable (rather than a slow or failed call)"""
+    return type(error).__name__ in ('NotFound', 'InvalidArgument', 'FailedPrecondition', 'PermissionDenied')
+
+
+class GeminiContextCache:
+    """Provider-side CachedContent. Caches live in the API key's project, so there is one per key and model."""
+
+    name = 'gemini'
+
+    def lookup(self, key):
+        return get_redis().get(key)
+
+    def store(self, key, value, ttl):
+        get_redis().set(key, value, ex=ttl)
+
+    def forget(self, key):
+        get_redis().delete(key)
+
+    def seen(self, key):
+        """How often this context was asked for recently (a cache is only created on reuse)"""
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(f"{key}:seen")
+        pipe.expire(f"{key}:seen", SEEN_TTL_SECONDS)
+        return pipe.execute()[0]
+
+    def create(self, client, system_instruction, text, ttl):
+        return client.create_cached_content(system_instruction, text, ttl)
+
+    def resolve(self, name, prompt):
+        return prompt, name
+
+
+class LocalContextCache:
+    """In-process stand-in with the same bookkeeping; resolve() puts the cached text back in front of the prompt"""
+
+    name = 'local'
+
+    def __init__(self):
+        self._entries = {}
+        self._registry = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        value, expires = self._registry.get(key, (None, 0))
+        return value if expires > time.time() else None
+
+    def _prune(self, now):
+        """Drop expired pointers, their cached texts and use counts (call with the lock held)"""
+        for key, (value, expires) in list(self._registry.items()):
+            if expires <= now:
+                del self._registry[key]
+                self._entries.pop(value, None)
+        for key, (count, expires) in list(self._seen.items()):
+            if expires <= now:
+                del self._seen[key]
+
+    def store(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            self._registry[key] = (value, now + ttl)
+
+    def forget(self, key):
+        with self._lock:
+            self._registry.pop(key, None)
+
+    def seen(self, key):
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            count = self._seen.get(key, (0, 0))[0] + 1
+            self._seen[key] = (count, now + SEEN_TTL_SECONDS)
+            return count
+
+    def create(self, client, system_instruction, text, ttl):
+        name = f"local/{uuid.uuid4().hex}"
+        with self._lock:
+            self._entries[name] = (system_instruction, text)
+        return name
+
+    def resolve(self, name, prompt):
+        system_instruction, text = self._entries[name]
+        return '\n\n'.join(part for part in (system_instruction, text, prompt) if part), None
+
+
+_backends = {'gemini': GeminiContextCache, 'local': LocalContextCache}
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None and LLM_CONTEXT_CACHE in _backends:
+        _backend = _backends[LLM_CONTEXT_CACHE]()
+    return _backend
+
+
+def registry_key(client, prefix, resume_text):
+    """Same prompt version (prefix) + same resume text + same key and model -> same cached context"""
+    prompt_version = hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:12]
+    resume_hash = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()[:24]
+    return f"ctxcache:{client.key_index}:{client.model_name}:{prompt_version}:{resume_hash}"
+
+
+def get_or_create(client, prefix, resume_text):
+    """Name of a cached context holding prefix + resume for this client, or None to send the prompt inline"""
+    backend = get_backend()
+    if backend is None or not large_enough(client, prefix, resume_text):
+        return None
+
+    key = registry_key(client, prefix, resume_text)
+    try:
+        name = backend.lookup(key)
+        if name == _FAILED:
+            return None
+        if name:
+            metrics.inc('resumeai_context_cache_total', result='hit', backend=backend.name)
+            return name
+        # Creating a cache costs a write plus storage - only worth it once the same context comes back
+        if backend.seen(key) < 2:
+            metrics.inc('resumeai_context_cache_total', result='first_use', backend=backend.name)
+            return None
+        name = backend.create(client, prefix, RESUME_HEADER + resume_text, LLM_CONTEXT_CACHE_TTL)
+        # Expire our pointer a little before the provider drops the cache
+        backend.store(key, name, max(LLM_CONTEXT_CACHE_TTL - 60, 60))
+        metrics.inc('resumeai_context_cache_total', result='created', backend=backend.name)
+        print(f"🗃️ Created cached context {name} for {client.model_name} (key {client.key_index})")
+        return name
+    except Exception as e:
+        print(f"Context cache warning: falling back to inline prompt: {e}")
+        metrics.inc('resumeai_context_cache_total', result='error', backend=backend.name)
+        try:
+            backend.store(key, _FAILED, FAILURE_TTL_SECONDS)
+        except Exception:
+            pass
+        return None
+
+
+def resolve(name, prompt):
+    """(prompt, cached_content) to actually send for a prompt built against a cached context"""
+    return get_backend().resolve(name, prompt)
+
+
+def invalidate(client, prefix, resume_text, error=None):
+    """Drop a cached context the provider no longer accepts. Returns True if the call should be retried inline."""
+    if error is not None and not _is_cache_error(error):
+        return False
+    backend = get_backend()
+    if backend is not None:
+        try:
+            backend.forget(registry_key(client, prefix, resume_text))
+        except Exception as e:
+            print(f"Context cache warning: could not forget entry: {e}")
+        metrics.inc('resumeai_context_cache_total', result='fallback', backend=backend.name)
+    return True
@@ -0,0 +1,75 @@
+# A resume as stored in Resume.structured_text - {'paragraphs': [{'id', 'text'}], 'full_text'} -
+# indexed by paragraph id. A paragraph's id is its index in the DOCX (doc.paragraphs[id]),
+# and its span in full_text is found once, so replacing paragraphs never searches the text.
+
+
+class ResumeDocument:
+    """A resume's non-empty paragraphs by id, with where each one sits in full_text"""
+
+    def __init__(self, paragraphs, full_text=None):
+        self.ids = [p['id'] for p in paragraphs]
+        self.texts = {p['id']: p['text'] for p in paragraphs}
+        self.full_text = full_text if full_text is not None else '\n'.join(p['text'] for p in paragraphs)
+        self.spans = self._locate()
+        self._ids_by_text = None
+
+    @classmethod
+    def from_structured(cls, structured_text):
+        return cls(structured_text.get('paragraphs') or [], structured_text.get('full_text'))
+
+    def _locate(self):
+        """(start, end) of each paragraph in full_text, in a single forward pass"""
+        spans = {}
+        cursor = 0
+        for pid in self.ids:
+            text = self.texts[pid]
+            # full_text is the paragraphs joined by newlines, so this is almost always right at the cursor
+            start = cursor if self.full_text.startswith(text, cursor) else self.full_text.find(text, cursor)
+            if start < 0:
+                continue
+            spans[pid] = (start, start + len(text))
+            cursor = start + len(text)
+        return spans
+
+    def text(self, pid):
+        return self.texts.get(pid)
+
+    def id_for(self, text):
+        """Id of the first paragraph with this text (for customizations keyed the old way, by text)"""
+        if self._ids_by_text is None:
+            self._ids_by_text = {}
+            for pid in self.ids:
+                self._ids_by_text.setdefault(self.texts[pid].strip(), pid)
+        return self._ids_by_text.get((text or '').strip())
+
+    def by_id(self, customizations):
+        """{id: new text} from a map keyed by paragraph id or, for older results, by original text"""
+        result = {}
+        for key, value in (customizations or {}).items():
+            if isinstance(value, dict):
+                value = value.get('enhanced')
+            pid = int(key) if str(key).isdigit() and int(key) in self.texts else self.id_for(key)
+            if pid is not None and value is not None:
+                result[pid] = value
+        return result
+
+    def render(self, replacements):
+        """full_text with the given paragraphs ({id: new text}) replaced"""
+        pieces = []
+        cursor = 0
+        for pid in sorted((pid for pid in replacements if pid in self.spans), key=lambda pid: self.spans[pid][0]):
+            start, end = self.spans[pid]
+            pieces.append(self.full_text[cursor:start])
+            pieces.append(replacements[pid])
+            cursor = end
+        pieces.append(self.full_text[cursor:])
+        return ''.join(pieces)
+
+    def paragraphs_view(self, replacements):
+        """Customized paragraphs for results and downloads: {"<id>": {"original", "enhanced"}} in resume order"""
+        return {str(pid): {'original': self.texts[pid], 'enhanced': replacements[pid]}
+                for pid in self.ids if pid in replacements}
+
+    def text_view(self, replacements):
+        """The older {original text: enhanced text} form, still read by saved applications"""
+        return {self.texts[pid]: replacements[pid] for pid in self.ids if pid in replacements}
@@ -0,0 +1,173 @@
+import asyncio
+
+from core.config import LLM_DEFAULT_TIMEOUT, LLM_MAX_CONCURRENCY_PER_KEY, LLM_MAX_CONCURRENCY_PER_MODEL
+
+
+def _native_threading():
+    """The real threading module, even when eventlet has monkey-patched it"""
+    try:
+        from eventlet import patcher
+        return patcher.original('threading')
+    except ImportError:
+        import threading
+        return threading
+
+
+def _green_wait(event, timeout):
+    """Wait on a native Event without blocking the eventlet hub (and every other task in the worker)"""
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(event.wait, timeout)
+    except ImportError:
+        pass
+    return event.wait(timeout)
+
+
+class LLMCallCancelled(Exception):
+    pass
+
+
+class EngineCall:
+    """Handle for one LLM request running on the engine loop"""
+
+    def __init__(self, engine, deadline):
+        self._engine = engine
+        self._done = _native_threading().Event()
+        self._lock = _native_threading().Lock()
+        self._callbacks = []
+        self._task = None
+        self.deadline = deadline
+        self.result = None
+        self.error = None
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.result = result
+            self.error = error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """Call callback(call) once the call finishes (immediately if it already has); runs on the loop thread"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def cancel(self):
+        """Cancel the request; the coroutine is interrupted at its next await"""
+        if self._task is not None:
+            self._engine._loop.call_soon_threadsafe(self._task.cancel)
+        elif not self._done.is_set():
+            self._finish(error=LLMCallCancelled("LLM call cancelled before it started"))
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        if not _green_wait(self._done, timeout):
+            self.cancel()
+            raise TimeoutError(f"LLM call did not finish within {timeout:.0f}s")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class AsyncLLMEngine:
+    """Runs Gemini calls as coroutines on one asyncio loop in a dedicated OS thread.
+
+    Celery tasks keep calling the synchronous GeminiClient.generate_content(); in
+    async mode that submits the request here and waits for it, so one worker
+    process can have many requests in flight while each Celery task still looks
+    sequential. Concurrency is bounded per API key and per model.
+    """
+
+    def __init__(self, per_key_limit=LLM_MAX_CONCURRENCY_PER_KEY, per_model_limit=LLM_MAX_CONCURRENCY_PER_MODEL,
+                 default_timeout=LLM_DEFAULT_TIMEOUT):
+        self.per_key_limit = per_key_limit
+        self.per_model_limit = per_model_limit
+        self.default_timeout = default_timeout
+        self._loop = None
+        self._thread = None
+        self._start_lock = _native_threading().Lock()
+        self._key_semaphores = {}
+        self._model_semaphores = {}
+
+    def start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            threading = _native_threading()
+            ready = threading.Event()
+
+            def run_loop():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run_loop, name='llm-engine', daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _semaphores(self, client):
+        # Only touched from the loop thread, so no locking needed
+        if client.api_key not in self._key_semaphores:
+            self._key_semaphores[client.api_key] = asyncio.Semaphore(self.per_key_limit)
+        if client.model_name not in self._model_semaphores:
+            self._model_semaphores[client.model_name] = asyncio.Semaphore(self.per_model_limit)
+        return self._key_semaphores[client.api_key], self._model_semaphores[client.model_name]
+
+    async def _run(self, call, client, prompt, request_options, cached_content=None):
+        try:
+            key_sem, model_sem = self._semaphores(client)
+            loop = asyncio.get_running_loop()
+            async with key_sem, model_sem:
+                remaining = call.deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError("LLM call deadline passed while waiting for a free slot")
+                options = dict(request_options or {}, timeout=remaining)
+                response = await asyncio.wait_for(client.generate_content_async(prompt, options, cached_content), remaining)
+            call._finish(result=response)
+        except asyncio.CancelledError:
+            call._finish(error=LLMCallCancelled("LLM call cancelled"))
+        except asyncio.TimeoutError:
+            call._finish(error=TimeoutError("LLM call exceeded its deadline"))
+        except Exception as e:
+            call._finish(error=e)
+
+    def submit(self, client, prompt, request_options=None, timeout=None, cached_content=None):
+        """Schedule a call and return its EngineCall handle without waiting"""
+        self.start()
+        timeout = timeout or (request_options or {}).get('timeout') or self.default_timeout
+        call = EngineCall(self, self._loop.time() + timeout)
+
+        def schedule():
+            if not call.done():
+                call._task = self._loop.create_task(self._run(call, client, prompt, request_options, cached_content))
+
+        self._loop.call_soon_threadsafe(schedule)
+        return call
+
+    def run(self, client, prompt, request_options=None, timeout=None, cached_content=None):
+        """Submit a call and block the calling task (not the worker) until it finishes"""
+        timeout = timeout or (request_options or {}).get('timeout') or self.default_timeout
+        call = self.submit(client, prompt, request_options, timeout, cached_content)
+        # Small grace period so the loop reports its own deadline error first
+        return call.wait(timeout + 5)
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = AsyncLLMEngine()
+    return _engine
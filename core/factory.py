@@ -0,0 +1,19 @@
+import os
+
+from flask import Flask
+
+from core.config import BASE_CONFIG
+from core.models import db
+
+
+def create_app(import_name='resumeai'):
+    """Minimal Flask app with config and SQLAlchemy - shared by the web server and the workers.
+
+    Web-only pieces (routes, SocketIO server, CORS, migrations, warm-up thread) are
+    added by app.py so workers never build them.
+    """
+    app = Flask(import_name, root_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app.config.update(BASE_CONFIG)
+    db.init_app(app)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app
@@ -0,0 +1,240 @@
+import threading
+import time
+
+from core import llm, metrics, tracing
+from core.config import (LLM_DEFAULT_TIMEOUT, LLM_EXECUTION_MODE, LLM_HEDGE_BUDGET, LLM_HEDGE_MIN_DELAY,
+                         LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_PERCENTILE, LLM_HEDGING_ENABLED)
+from core.engine import LLMCallCancelled, _green_wait, _native_threading
+from core.redis_client import get_redis
+
+# Recent call latencies per (model, prompt_key) - shared by every worker process
+LATENCY_WINDOW = 200
+# How long a worker reuses a computed hedge delay before reading the window again
+DELAY_CACHE_SECONDS = 30
+
+_delay_cache = {}
+_delay_lock = threading.Lock()
+
+
+class _ThreadCall:
+    """One blocking generate_content call on a native thread, with the EngineCall interface.
+
+    Used in sync mode, only for calls that may get a hedge: the caller has to be free
+    to return when the hedge answers first. A running gRPC call in a plain thread can't be interrupted,
+    so cancel() only makes the call's result be ignored.
+    """
+
+    def __init__(self, client, prompt, request_options):
+        threading_ = _native_threading()
+        self._done = threading_.Event()
+        self._lock = threading_.Lock()
+        self._callbacks = []
+        self.result = None
+        self.error = None
+        threading_.Thread(target=self._run, args=(client, prompt, request_options), daemon=True).start()
+
+    def _run(self, client, prompt, request_options):
+        try:
+            result, error = client.generate_content(prompt, request_options=request_options), None
+        except Exception as e:
+            result, error = None, e
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.result, self.error = result, error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def cancel(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.error = LLMCallCancelled("LLM call cancelled")
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+
+def _start(client, prompt, request_options):
+    if LLM_EXECUTION_MODE == 'async':
+        from core.engine import get_engine
+        return get_engine().submit(client, prompt, request_options)
+    return _ThreadCall(client, prompt, request_options)
+
+
+class _Waiter:
+    """Wakes up when any watched call finishes; each call's callback is registered once"""
+
+    def __init__(self):
+        self._settled = _native_threading().Event()
+
+    def watch(self, call):
+        call.add_done_callback(lambda _call: self._settled.set())
+        return call
+
+    def wait(self, timeout):
+        """False if no call finished within timeout"""
+        settled = _green_wait(self._settled, max(timeout, 0))
+        # Callers check done() after waking, so a call finishing around the clear is not missed
+        self._settled.clear()
+        return settled
+
+
+def _first_success(calls, deadline, waiter):
+    """Result of the first call to succeed; the others are cancelled"""
+    pending = list(calls)
+    last_error = None
+    while pending:
+        finished = [c for c in pending if c.done()]
+        if not finished:
+            if not waiter.wait(deadline - time.monotonic()):
+                for call in pending:
+                    call.cancel()
+                raise TimeoutError("LLM call exceeded its deadline")
+            continue
+        for call in finished:
+            pending.remove(call)
+            if call.error is None:
+                for other in pending:
+                    other.cancel()
+                return call
+            last_error = call.error
+    raise last_error
+
+
+def record_latency(model_name, prompt_key, seconds):
+    try:
+        key = f"hedge:latency:{model_name}:{prompt_key}"
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.lpush(key, round(seconds, 3))
+        pipe.ltrim(key, 0, LATENCY_WINDOW - 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"Hedging warning: could not record latency: {e}")
+
+
+def hedge_delay(model_name, prompt_key):
+    """Seconds to wait before hedging a call, or None while there is too little history"""
+    cache_key = (model_name, prompt_key)
+    now = time.monotonic()
+    cached = _delay_cache.get(cache_key)
+    if cached and now - cached[0] < DELAY_CACHE_SECONDS:
+        return cached[1]
+
+    delay = None
+    try:
+        samples = sorted(float(v) for v in get_redis().lrange(f"hedge:latency:{model_name}:{prompt_key}", 0, -1))
+        if len(samples) >= LLM_HEDGE_MIN_SAMPLES:
+            delay = max(LLM_HEDGE_MIN_DELAY, samples[int(LLM_HEDGE_PERCENTILE * (len(samples) - 1))])
+    except Exception as e:
+        print(f"Hedging warning: could not read latencies: {e}")
+    with _delay_lock:
+        _delay_cache[cache_key] = (now, delay)
+    return delay
+
+
+def _budget_key(minute):
+    return f"hedge:budget:{minute}"
+
+
+def _count(field):
+    """Count a call or a hedge in the current one-minute budget bucket"""
+    try:
+        key = _budget_key(int(time.time() // 60))
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(key, field, 1)
+        pipe.expire(key, 180)
+        pipe.execute()
+    except Exception as e:
+        print(f"Hedging warning: could not update budget: {e}")
+
+
+def _recent_buckets():
+    """The current and previous one-minute buckets"""
+    minute = int(time.time() // 60)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hgetall(_budget_key(minute))
+    pipe.hgetall(_budget_key(minute - 1))
+    return pipe.execute()
+
+
+def calls_per_minute():
+    """LLM calls per minute over the last two minutes, across all workers"""
+    return sum(int(b.get('calls', 0)) for b in _recent_buckets()) / 2
+
+
+def budget_allows():
+    """True while hedges over the last two minutes stay under LLM_HEDGE_BUDGET of all calls"""
+    try:
+        buckets = _recent_buckets()
+    except Exception as e:
+        print(f"Hedging warning: could not read budget: {e}")
+        return False
+    calls = sum(int(b.get('calls', 0)) for b in buckets)
+    hedges = sum(int(b.get('hedges', 0)) for b in buckets)
+    return hedges + 1 <= LLM_HEDGE_BUDGET * calls
+
+
+def _alternate_client(client):
+    """Same model on the next API key, or None with a single key"""
+    keys = llm.pool.api_keys
+    if len(keys) < 2 or client.api_key not in keys:
+        return None
+    next_key = keys[(keys.index(client.api_key) + 1) % len(keys)]
+    return llm.get_client(next_key, client.model_name)
+
+
+def generate(client, prompt, request_options=None, prompt_key=None, cached_content=None):
+    """client.generate_content, hedged onto another key when the call is slower than usual"""
+    # Every call is counted - the buckets are also the load signal prefetching checks
+    _count('calls')
+    options = request_options or {}
+    timeout = options.get('timeout') or LLM_DEFAULT_TIMEOUT
+    started = time.monotonic()
+    labels = {'model': client.model_name, 'prompt_key': prompt_key}
+
+    # A cached context belongs to one key's project, so a call using it can't move to another key
+    delay = None
+    if LLM_HEDGING_ENABLED and not cached_content:
+        delay = hedge_delay(client.model_name, prompt_key)
+    hedgeable = delay is not None and delay < timeout
+    alternate = _alternate_client(client) if hedgeable else None
+
+    if alternate is None:
+        # Nothing to hedge onto, so the call runs on this thread
+        response = client.generate_content(prompt, request_options=request_options, cached_content=cached_content)
+        elapsed = time.monotonic() - started
+        record_latency(client.model_name, prompt_key, elapsed)
+        if hedgeable and elapsed > delay:
+            metrics.inc('resumeai_llm_hedges_total', outcome='no_alternate', **labels)
+        return response
+
+    deadline = started + timeout
+    waiter = _Waiter()
+    calls = [waiter.watch(_start(client, prompt, options))]
+    if not waiter.wait(delay):
+        if not budget_allows():
+            metrics.inc('resumeai_llm_hedges_total', outcome='over_budget', **labels)
+        else:
+            _count('hedges')
+            hedge_options = dict(options, timeout=deadline - time.monotonic())
+            calls.append(waiter.watch(_start(alternate, prompt, hedge_options)))
+            tracing.annotate(hedged=True, hedge_delay=round(delay, 2), hedge_key_index=alternate.key_index)
+
+    winner = _first_success(calls, deadline, waiter)
+    record_latency(client.model_name, prompt_key, time.monotonic() - started)
+    if len(calls) > 1:
+        outcome = 'hedge_won' if winner is calls[1] else 'primary_won'
+        metrics.inc('resumeai_llm_hedges_total', outcome=outcome, **labels)
+        tracing.annotate(hedge_outcome=outcome)
+    return winner.result
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import time
+
+from core import metrics
+from core.config import JOB_DEADLINES, LLM_MIN_ATTEMPT_SECONDS
+from core.redis_client import delete_if_equals, get_redis
+
+# Redis bookkeeping for generation jobs:
+#   cancel:<job_id>            reason the job was cancelled (checked by the worker between stages)
+#   session_jobs:<session_id>  ids of the session's running generation jobs
+#   active_job:<scope>         the newest job for a (session, resume, JD, scope) - older ones are superseded
+#   connections:<session_id>   open Socket.IO connections of the session
+#   checkpoint:<job_id>        finished stage results, reused when a later key/model attempt retries
+JOB_STATE_TTL_SECONDS = 3600
+
+
+class JobCancelled(Exception):
+    def __init__(self, job_id, reason='cancelled'):
+        super().__init__(f"Job {job_id} was {reason}")
+        self.job_id = job_id
+        self.reason = reason
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, job_id, remaining, needed):
+        super().__init__(
+            f"Job ran out of its time budget ({max(remaining, 0):.0f}s left, "
+            f"another attempt needs at least {needed:.0f}s). Please try again."
+        )
+        self.job_id = job_id
+
+
+def time_budget(kind, requested=None):
+    """Seconds a job of this kind may run; a caller can shorten the default but not extend it"""
+    budget = JOB_DEADLINES[kind]
+    try:
+        if requested is not None and 0 < float(requested) < budget:
+            return float(requested)
+    except (TypeError, ValueError):
+        pass
+    return budget
+
+
+def request_cancel(job_id, reason='cancelled'):
+    """Flag a job as cancelled; the worker stops at its next checkpoint"""
+    get_redis().set(f"cancel:{job_id}", reason, ex=JOB_STATE_TTL_SECONDS)
+
+
+def cancel_reason(job_id):
+    try:
+        return get_redis().get(f"cancel:{job_id}")
+    except Exception as e:
+        print(f"Warning: could not read cancellation flag for {job_id}: {e}")
+        return None
+
+
+def supersede_scope(session_id, resume_key, job_description, scope):
+    """Key identifying requests that replace each other (same session, resume, JD and part of the output)"""
+    jd_hash = hashlib.sha256((job_description or '').encode('utf-8')).hexdigest()[:16]
+    return f"active_job:{session_id}:{resume_key}:{jd_hash}:{scope}"
+
+
+def customization_scope(regenerate):
+    """Which part of a customization a request produces: full / paragraphs / cover_letter / one paragraph"""
+    if not regenerate:
+        return 'full'
+    if isinstance(regenerate, dict) and 'single_paragraph' in regenerate:
+        # The id keeps duplicate paragraphs (same text) from superseding each other
+        text = f"{regenerate.get('paragraph_id', '')}:{regenerate['single_paragraph'] or ''}"
+        return 'single_paragraph:' + hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+    return str(regenerate)
+
+
+def register(session_id, job_id, scope_key=None):
+    """Record a new job for its session and cancel the job it supersedes, if any.
+
+    Returns the id of the superseded job (or None).
+    """
+    client = get_redis()
+    pipe = client.pipeline()
+    pipe.sadd(f"session_jobs:{session_id}", job_id)
+    pipe.expire(f"session_jobs:{session_id}", JOB_STATE_TTL_SECONDS)
+    if scope_key:
+        # GETSET rather than SET ... GET so older Redis builds on Windows still work
+        pipe.getset(scope_key, job_id)
+        pipe.expire(scope_key, JOB_STATE_TTL_SECONDS)
+    results = pipe.execute()
+
+    previous = results[2] if scope_key else None
+    if previous and previous != job_id:
+        request_cancel(previous, 'superseded')
+        return previous
+    return None
+
+
+def active_job(scope_key):
+    """The job currently holding a supersede slot (the one a new request there would replace)"""
+    try:
+        return get_redis().get(scope_key)
+    except Exception as e:
+        print(f"Warning: could not read {scope_key}: {e}")
+        return None
+
+
+def accept_draft(session_id, job_id):
+    """The user kept a progressive job's draft (saved or downloaded it), so stop the upgrade"""
+    try:
+        if owns(session_id, job_id):
+            request_cancel(job_id, 'draft_accepted')
+    except Exception as e:
+        print(f"Warning: could not stop upgrade of job {job_id}: {e}")
+
+
+def owns(session_id, job_id):
+    return bool(get_redis().sismember(f"session_jobs:{session_id}", job_id))
+
+
+def finish(session_id, job_id, scope_key=None):
+    """Drop a finished job from the session's running set and its supersede slot"""
+    try:
+        get_redis().srem(f"session_jobs:{session_id}", job_id)
+        if scope_key:
+            delete_if_equals(scope_key, job_id)
+        get_redis().delete(f"checkpoint:{job_id}")
+    except Exception as e:
+        print(f"Warning: could not clear job state for {job_id}: {e}")
+
+
+def session_jobs(session_id):
+    return get_redis().smembers(f"session_jobs:{session_id}")
+
+
+def connection_opened(session_id):
+    client = get_redis()
+    count = client.incr(f"connections:{session_id}")
+    client.expire(f"connections:{session_id}", JOB_STATE_TTL_SECONDS)
+    return count
+
+
+def connection_closed(session_id):
+    count = get_redis().decr(f"connections:{session_id}")
+    if count < 0:
+        get_redis().set(f"connections:{session_id}", 0, ex=JOB_STATE_TTL_SECONDS)
+        count = 0
+    return count
+
+
+def open_connections(session_id):
+    return int(get_redis().get(f"connections:{session_id}") or 0)
+
+
+def cancel_abandoned(session_id):
+    """Cancel every running job of a session that no longer has an open socket"""
+    if open_connections(session_id) > 0:
+        return []
+    job_ids = list(session_jobs(session_id))
+    for job_id in job_ids:
+        request_cancel(job_id, 'abandoned')
+    return job_ids
+
+
+class JobContext:
+    """What a running task knows about its own job; passed down to the processor as `job`"""
+
+    def __init__(self, job_id, deadline=None, progress=None):
+        self.job_id = job_id
+        # Absolute wall-clock time (epoch seconds) set by the web process when enqueueing
+        self.deadline = deadline
+        self.progress = progress
+        # Keeps checkpoints of one pass apart from another (e.g. a progressive job's flash draft)
+        self.checkpoint_scope = None
+
+    def scoped(self, name):
+        """The same job with its own checkpoint namespace"""
+        scoped = JobContext(self.job_id, self.deadline, self.progress)
+        scoped.checkpoint_scope = name
+        return scoped
+
+    def _checkpoint_field(self, stage):
+        return f"{self.checkpoint_scope}:{stage}" if self.checkpoint_scope else stage
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def ensure_time(self, minimum=LLM_MIN_ATTEMPT_SECONDS):
+        remaining = self.remaining()
+        if remaining is not None and remaining < minimum:
+            raise DeadlineExceeded(self.job_id, remaining, minimum)
+
+    def call_timeout(self, timeout):
+        """Timeout for the next LLM call: the default, capped by what is left of the budget"""
+        self.ensure_time()
+        remaining = self.remaining()
+        return timeout if remaining is None else min(timeout, remaining)
+
+    def check(self):
+        """Stop here if the job was cancelled or can no longer finish in time"""
+        self.raise_if_cancelled()
+        self.ensure_time()
+
+    def cancelled(self):
+        return cancel_reason(self.job_id)
+
+    def raise_if_cancelled(self):
+        reason = self.cancelled()
+        if reason:
+            raise JobCancelled(self.job_id, reason)
+
+    def load_checkpoint(self, stage):
+        """Result of a stage an earlier attempt of this job already finished, or None"""
+        try:
+            raw = get_redis().hget(f"checkpoint:{self.job_id}", self._checkpoint_field(stage))
+        except Exception as e:
+            print(f"Warning: could not read checkpoint {stage} for {self.job_id}: {e}")
+            return None
+        if raw is None:
+            return None
+        metrics.inc('resumeai_checkpoint_total', stage=stage, result='reused')
+        if self.progress:
+            self.progress(f"Reusing {stage.replace('_', ' ')} from the previous attempt...", stage=f"checkpoint:{stage}")
+        return json.loads(raw)
+
+    def save_checkpoint(self, stage, result):
+        try:
+            key = f"checkpoint:{self.job_id}"
+            pipe = get_redis().pipeline()
+            pipe.hset(key, self._checkpoint_field(stage), json.dumps(result))
+            pipe.expire(key, JOB_STATE_TTL_SECONDS)
+            pipe.execute()
+            metrics.inc('resumeai_checkpoint_total', stage=stage, result='saved')
+        except Exception as e:
+            print(f"Warning: could not save checkpoint {stage} for {self.job_id}: {e}")
+            return
+        if self.progress:
+            self.progress(f"Saved {stage.replace('_', ' ')}.", stage=f"checkpoint:{stage}")
@@ -0,0 +1,141 @@
+import threading
+
+from core.config import GEMINI_API_ENDPOINT, GEMINI_MODELS, LLM_EXECUTION_MODE, load_api_keys
+
+_genai = None
+
+
+def get_genai():
+    """Import google.generativeai on first use - it pulls in grpc and protobuf and is slow to load"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        _genai = genai
+    return _genai
+
+
+class GeminiClient:
+    """A GenerativeModel bound to one API key through its own service client.
+
+    genai.configure() swaps a process-global client, so two tasks using different
+    keys at the same time could send requests with each other's key. Each
+    GeminiClient owns a GenerativeServiceClient created with its key instead;
+    the underlying channel is reused for every call and is safe to share.
+    """
+
+    def __init__(self, api_key, model_name, key_index):
+        genai = get_genai()
+        from google.ai import generativelanguage as glm
+
+        self.api_key = api_key
+        self.model_name = model_name
+        self.key_index = key_index
+        if GEMINI_API_ENDPOINT:
+            self._service = glm.GenerativeServiceClient(client_options={'api_key': api_key, 'api_endpoint': GEMINI_API_ENDPOINT},
+                                                        transport='rest')
+        else:
+            self._service = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+        self._model = genai.GenerativeModel(GEMINI_MODELS[model_name])
+        # GenerativeModel only falls back to the global default client when _client is unset
+        self._model._client = self._service
+        self._cache_service = None
+        self._cached_models = {}
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self):
+        return {'model': self.model_name, 'key_index': self.key_index}
+
+    def _model_for(self, cached_content):
+        """The shared model, or one bound to a provider-side cached context (see core/context_cache.py)"""
+        if cached_content is None:
+            return self._model
+        model = self._cached_models.get(cached_content)
+        if model is None:
+            with self._lock:
+                model = self._cached_models.get(cached_content)
+                if model is None:
+                    model = get_genai().GenerativeModel(GEMINI_MODELS[self.model_name])
+                    model._client = self._service
+                    model._async_client = self._model._async_client
+                    model._cached_content = cached_content
+                    self._cached_models[cached_content] = model
+        return model
+
+    def generate_content(self, prompt, request_options=None, cached_content=None):
+        if LLM_EXECUTION_MODE == 'async':
+            from core.engine import get_engine
+            return get_engine().run(self, prompt, request_options, cached_content=cached_content)
+        return self._model_for(cached_content).generate_content(prompt, request_options=request_options or {})
+
+    async def generate_content_async(self, prompt, request_options=None, cached_content=None):
+        """Coroutine version, only awaited on the engine loop (grpc.aio clients are tied to their loop)"""
+        if self._model._async_client is None:
+            from google.ai import generativelanguage as glm
+            self._model._async_client = glm.GenerativeServiceAsyncClient(client_options={'api_key': self.api_key})
+        model = self._model_for(cached_content)
+        model._async_client = self._model._async_client
+        return await model.generate_content_async(prompt, request_options=request_options or {})
+
+    def create_cached_content(self, system_instruction, text, ttl_seconds):
+        """Create a provider-side cached context for this key's project and model; returns its name"""
+        from datetime import timedelta
+        from google.ai import generativelanguage as glm
+
+        if self._cache_service is None:
+            self._cache_service = glm.CacheServiceClient(client_options={'api_key': self.api_key})
+        cached = glm.CachedContent(
+            model=f"models/{GEMINI_MODELS[self.model_name]}",
+            contents=[glm.Content(role='user', parts=[glm.Part(text=text)])],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+        if system_instruction:
+            cached.system_instruction = glm.Content(parts=[glm.Part(text=system_instruction)])
+        return self._cache_service.create_cached_content(cached_content=cached).name
+
+
+class ClientPool:
+    """Thread-safe cache of one GeminiClient per (api_key, model)"""
+
+    def __init__(self, api_keys=None):
+        self._api_keys = api_keys
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def api_keys(self):
+        if self._api_keys is None:
+            self._api_keys = load_api_keys()
+        return self._api_keys
+
+    def key_index(self, api_key):
+        """1-based position of an API key, used in logs and metrics instead of the key itself"""
+        try:
+            return self.api_keys.index(api_key) + 1
+        except ValueError:
+            return 0
+
+    def get(self, api_key, model_name):
+        key = (api_key, model_name)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = GeminiClient(api_key, model_name, self.key_index(api_key))
+                    self._clients[key] = client
+        return client
+
+    def warm(self, models=None):
+        """Create clients for every key and model up front (called at worker start)"""
+        for api_key in self.api_keys:
+            for model_name in models or GEMINI_MODELS:
+                self.get(api_key, model_name)
+        return len(self._clients)
+
+
+pool = ClientPool()
+
+
+def get_client(api_key, model_name):
+    return pool.get(api_key, model_name)
@@ -0,0 +1,140 @@
+import time
+from contextlib import contextmanager
+
+from core.redis_client import get_redis
+
+# Metrics are aggregated in Redis so the Flask process can expose numbers
+# recorded by every Celery worker process on a single /metrics endpoint.
+METRICS_PREFIX = 'metrics'
+
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300, 600)
+FAST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> (type, help text, histogram buckets)
+METRICS = {
+    'resumeai_llm_call_duration_seconds': ('histogram', 'Latency of a single Gemini generate_content call', DEFAULT_BUCKETS),
+    'resumeai_llm_retries_total': ('counter', 'Generation attempts retried with the next API key', None),
+    'resumeai_llm_fallbacks_total': ('counter', 'Generations that fell back to another model', None),
+    'resumeai_json_parse_path_total': ('counter', 'Which JSON parse/repair path produced the LLM result', None),
+    'resumeai_resume_cache_total': ('counter', 'Resume content cache lookups by result', None),
+    'resumeai_docx_render_duration_seconds': ('histogram', 'Time spent building DOCX files', FAST_BUCKETS),
+    'resumeai_pdf_conversion_duration_seconds': ('histogram', 'Time spent converting DOCX to PDF', FAST_BUCKETS),
+    'resumeai_task_duration_seconds': ('histogram', 'Celery task run time', DEFAULT_BUCKETS),
+    'resumeai_tasks_total': ('counter', 'Celery tasks by final state', None),
+    'resumeai_socket_emits_total': ('counter', 'Socket.IO events emitted', None),
+    'resumeai_progress_coalesced_total': ('counter', 'Progress updates dropped because newer ones superseded them', None),
+    'resumeai_deadline_exceeded_total': ('counter', 'Jobs that ran out of their time budget (including ones that expired in the queue)', None),
+    'resumeai_checkpoint_total': ('counter', 'Stage checkpoints saved and reused by retried attempts', None),
+    'resumeai_llm_hedges_total': ('counter', 'Slow LLM calls considered for hedging, by outcome (primary_won, hedge_won, over_budget, no_alternate)', None),
+    'resumeai_progressive_total': ('counter', 'Progressive jobs by how the flash draft ended (upgraded, draft_accepted, upgrade_failed)', None),
+    'resumeai_context_cache_total': ('counter', 'Cached prompt context lookups (hit, first_use, created, error, fallback)', None),
+    'resumeai_prefetch_total': ('counter', 'Background prefetches by outcome (enqueued, skipped_*, ready, failed, cancelled, used, used_running)', None),
+    'resumeai_result_bytes_total': ('counter', 'Size of finished job results as msgpack', None),
+    'resumeai_result_sample_bytes_total': ('counter', 'Size of a sample of job results as JSON and as msgpack (compare to see the saving)', None),
+    'resumeai_results_by_reference_total': ('counter', 'Results too large to inline, sent to the client as a /api/results reference', None),
+    'resumeai_sections_total': ('counter', 'Result sections (paragraphs, cover letter, interview question groups) reused from storage or computed', None),
+    'resumeai_admission_total': ('counter', 'Generation and download requests by admission outcome (admitted, session_concurrency, session_rate, fair_share, queue_full, unchecked)', None),
+    'resumeai_cassette_total': ('counter', 'LLM calls recorded to or replayed from cassettes (ok, error, hit, miss)', None),
+    'resumeai_queue_depth': ('gauge', 'Messages waiting in a Celery queue', None),
+}
+
+def _label_string(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter. Never raises - metrics must not break the hot path."""
+    try:
+        get_redis().hincrbyfloat(f"{METRICS_PREFIX}:{name}", _label_string(labels), amount)
+    except Exception as e:
+        print(f"Metrics warning: could not increment {name}: {e}")
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    try:
+        buckets = METRICS[name][2] or DEFAULT_BUCKETS
+        label_str = _label_string(labels)
+        pipe = get_redis().pipeline(transaction=False)
+        key = f"{METRICS_PREFIX}:{name}"
+        for bound in buckets:
+            if value <= bound:
+                pipe.hincrbyfloat(key, f"{label_str}|{bound}", 1)
+        pipe.hincrbyfloat(key, f"{label_str}|+Inf", 1)
+        pipe.hincrbyfloat(key, f"{label_str}|_sum", value)
+        pipe.hincrbyfloat(key, f"{label_str}|_count", 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"Metrics warning: could not observe {name}: {e}")
+
+
+@contextmanager
+def timer(name, **labels):
+    """Time a block into a histogram. An 'outcome' label is added automatically."""
+    start = time.time()
+    outcome = 'success'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        observe(name, time.time() - start, outcome=outcome, **labels)
+
+
+def queue_depths(queues=('celery',)):
+    """Read pending message counts straight from the Redis broker lists."""
+    depths = {}
+    for queue in queues:
+        try:
+            depths[queue] = get_redis().llen(queue)
+        except Exception as e:
+            print(f"Metrics warning: could not read depth of queue {queue}: {e}")
+    return depths
+
+
+def render_prometheus(queues=('celery',)):
+    """Render all stored metrics in the Prometheus text exposition format."""
+    lines = []
+    client = get_redis()
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+        if name == 'resumeai_queue_depth':
+            for queue, depth in queue_depths(queues).items():
+                lines.append(f'{name}{{queue="{queue}"}} {depth}')
+            continue
+
+        try:
+            values = client.hgetall(f"{METRICS_PREFIX}:{name}")
+        except Exception as e:
+            print(f"Metrics warning: could not read {name}: {e}")
+            continue
+
+        if metric_type == 'histogram':
+            series = {}
+            for field, value in values.items():
+                label_str, _, suffix = field.rpartition('|')
+                series.setdefault(label_str, {})[suffix] = value
+            for label_str, points in sorted(series.items()):
+                sep = ',' if label_str else ''
+                for bound in buckets:
+                    lines.append(f'{name}_bucket{{{label_str}{sep}le="{bound}"}} {_fmt(points.get(str(bound), 0))}')
+                lines.append(f'{name}_bucket{{{label_str}{sep}le="+Inf"}} {_fmt(points.get("+Inf", 0))}')
+                lines.append(f'{name}_sum{{{label_str}}} {_fmt(points.get("_sum", 0))}')
+                lines.append(f'{name}_count{{{label_str}}} {_fmt(points.get("_count", 0))}')
+        else:
+            for label_str, value in sorted(values.items()):
+                lines.append(f'{name}{{{label_str}}} {_fmt(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _fmt(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
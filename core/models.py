@@ -1,10 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from datetime import datetime
 from sqlalchemy.orm import joinedload, selectinload
 
 db = SQLAlchemy()
-migrate = Migrate()
 
 class Resume(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -167,3 +165,79 @@ class Job(db.Model):
             user_session_id=user_session_id,
             status='completed'
         ).order_by(cls.completed_date.desc()).all()
+
+# Custom prompt templates saved from the settings modal. Rows are never edited - saving
+# a changed text creates a new row - so tasks can reference them by id.
+class CustomPrompt(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    prompt_key = db.Column(db.String(50), nullable=False)  # 'paragraphs', 'single_paragraph', 'cover_letter', 'interview_prep'
+    text = db.Column(db.Text, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)  # SHA-256 of text
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    user_session_id = db.Column(db.String(100), nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'prompt_key': self.prompt_key,
+            'text': self.text,
+            'content_hash': self.content_hash,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+        }
+
+# Generation results written by the worker, so saving one as an Application is a small
+# request instead of the browser posting the whole result back. Promoting a row deletes it.
+class GenerationResult(db.Model):
+    RESULT_FIELDS = ('customized_paragraphs', 'paragraphs', 'cover_letter', 'match_score', 'match_score_analysis')
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False, unique=True)  # Celery task ID that produced it
+    user_session_id = db.Column(db.String(100), nullable=False, index=True)
+    resume_id = db.Column(db.Integer, db.ForeignKey('resume.id'), nullable=False)
+    company_name = db.Column(db.String(150), nullable=True)
+    job_description = db.Column(db.Text, nullable=True)
+    scraped_jd_id = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)  # RESULT_FIELDS of the latest result, regenerations merged in
+    sections = db.Column(db.JSON, nullable=True)  # Each section with the hash of its inputs (see core/sections.py)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    resume = db.relationship('Resume', backref=db.backref('generation_results', cascade="all, delete-orphan"))
+
+    @classmethod
+    def stored_sections(cls, job_id, session_id):
+        generation = cls.query.filter_by(job_id=job_id, user_session_id=session_id).first() if job_id else None
+        return generation.sections if generation else None
+
+    @classmethod
+    def record(cls, job_id, session_id, data, result, sections=None):
+        """Add or update the row for a job's result. Regenerations update the result they
+        regenerate (data['result_id']); returns None if that row is gone."""
+        fields = {key: result[key] for key in cls.RESULT_FIELDS if key in result}
+        if data.get('regenerate'):
+            generation = cls.query.filter_by(job_id=data.get('result_id'), user_session_id=session_id).first()
+            if generation is None:
+                return None
+            merged = dict(generation.result or {})
+            if result.get('complete'):
+                merged = fields
+                generation.sections = sections
+            elif 'original_paragraph' in result:
+                paragraphs = dict(merged.get('customized_paragraphs') or {})
+                paragraphs[result['original_paragraph']] = result.get('enhanced_text')
+                merged['customized_paragraphs'] = paragraphs
+            else:
+                merged.update(fields)
+            # Reassigned rather than mutated so SQLAlchemy sees the change
+            generation.result = merged
+            return generation
+
+        generation = cls.query.filter_by(job_id=job_id).first() or cls(job_id=job_id, user_session_id=session_id)
+        generation.resume_id = data.get('resume_id')
+        generation.company_name = data.get('company_name')
+        generation.job_description = data.get('job_description', '')
+        generation.scraped_jd_id = data.get('scraped_jd_id')
+        generation.result = fields
+        generation.sections = sections
+        db.session.add(generation)
+        return generation
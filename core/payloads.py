@@ -0,0 +1,67 @@
+import json
+import random
+import zlib
+
+from core import metrics
+from core.config import RESULT_INLINE_MAX_BYTES, RESULT_TTL_SECONDS
+from core.redis_client import get_binary_redis
+
+# Large job results (cover letters, interview prep) are stored once, packed, under
+#   result:<job_id>   hash of 'session' (owner) and 'data' (zlib-compressed msgpack)
+# and socket events / status responses carry a reference the client fetches instead.
+
+# Share of results also JSON-encoded, only to compare sizes - doing it for every result costs
+# as much as the packing itself
+JSON_SIZE_SAMPLE_RATE = 0.05
+
+
+def _msgpack():
+    import msgpack
+    return msgpack
+
+
+def pack(obj):
+    return zlib.compress(_msgpack().packb(obj, use_bin_type=True))
+
+
+def unpack(data):
+    return _msgpack().unpackb(zlib.decompress(data), raw=False)
+
+
+def result_url(job_id):
+    return f"/api/results/{job_id}"
+
+
+def store_result(job_id, session_id, result):
+    key = f"result:{job_id}"
+    pipe = get_binary_redis().pipeline()
+    pipe.hset(key, mapping={'session': session_id or '', 'data': pack(result)})
+    pipe.expire(key, RESULT_TTL_SECONDS)
+    pipe.execute()
+
+
+def load_result(job_id, session_id):
+    """A stored result, or None if it expired or belongs to another session"""
+    stored = get_binary_redis().hgetall(f"result:{job_id}")
+    if not stored or stored.get(b'session', b'').decode('utf-8') != (session_id or ''):
+        return None
+    return unpack(stored[b'data'])
+
+
+def by_reference(job_id, session_id, result, field='result'):
+    """{field: result} for small results; large ones are stored and sent as {field_ref: url}"""
+    packed_size = len(_msgpack().packb(result, use_bin_type=True))
+    metrics.inc('resumeai_result_bytes_total', amount=packed_size, encoding='msgpack')
+    if random.random() < JSON_SIZE_SAMPLE_RATE:
+        json_size = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        metrics.inc('resumeai_result_sample_bytes_total', amount=json_size, encoding='json')
+        metrics.inc('resumeai_result_sample_bytes_total', amount=packed_size, encoding='msgpack')
+    if packed_size <= RESULT_INLINE_MAX_BYTES:
+        return {field: result}
+    try:
+        store_result(job_id, session_id, result)
+    except Exception as e:
+        print(f"Result store warning: sending {job_id} inline: {e}")
+        return {field: result}
+    metrics.inc('resumeai_results_by_reference_total', field=field)
+    return {f"{field}_ref": result_url(job_id)}
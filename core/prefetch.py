@@ -0,0 +1,180 @@
+import json
+import time
+
+from core import hedging, metrics
+from core.config import (LLM_KEY_CALLS_PER_MINUTE, PREFETCH_DRAFT_TTL_SECONDS, PREFETCH_MAX_KEY_USAGE,
+                         PREFETCH_MAX_PENDING, PREFETCH_MAX_QUEUE_DEPTH, PREFETCH_QUEUE, load_api_keys)
+from core.redis_client import get_redis
+
+# Redis bookkeeping for background pre-generation of scraped JDs:
+#   prefetch:settings:<session_id>  opt-in, resume and model to prefetch with
+#   prefetch:job:<jd_id>            id of the prefetch job running for a JD
+#   prefetch:jobs:<job_id>          the JD a prefetch job belongs to
+#   prefetch:adopted:<job_id>       a user asked for the same result while it was running
+#   prefetch:draft:<jd_id>          the finished result, waiting to be used
+#   prefetch:stats                  outcome counters behind the hit rate
+JOB_TTL_SECONDS = 3600
+
+# The model is part of the draft's fingerprint, so it defaults to the one the UI customizes with
+DEFAULT_SETTINGS = {'enabled': False, 'resume_id': None, 'ai_model': 'gemini-2.5-pro', 'custom_prompt_ids': {}}
+
+# Hand a draft to exactly one request: take it only if it was made from the same inputs
+_TAKE_DRAFT_SCRIPT = """
+local raw = redis.call('get', KEYS[1])
+if not raw or cjson.decode(raw)['fingerprint'] ~= ARGV[1] then
+    return false
+end
+redis.call('del', KEYS[1])
+return raw
+"""
+
+# Adoption and storing the draft race at the end of a job; whichever runs first wins.
+# Adopt only while the job is still registered (KEYS: jobs, adopted)
+_ADOPT_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('set', KEYS[2], 1, 'EX', ARGV[1])
+return 1
+"""
+# Store the draft only if nobody adopted the job (KEYS: draft, job, jobs, adopted)
+_STORE_DRAFT_SCRIPT = """
+local adopted = redis.call('exists', KEYS[4])
+redis.call('del', KEYS[2], KEYS[3], KEYS[4])
+if adopted == 1 then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+def get_settings(session_id):
+    raw = get_redis().get(f"prefetch:settings:{session_id}")
+    return dict(DEFAULT_SETTINGS, **json.loads(raw)) if raw else dict(DEFAULT_SETTINGS)
+
+
+def save_settings(session_id, settings):
+    current = get_settings(session_id)
+    current.update({key: settings[key] for key in DEFAULT_SETTINGS if key in settings})
+    current['enabled'] = bool(current['enabled'])
+    get_redis().set(f"prefetch:settings:{session_id}", json.dumps(current))
+    return current
+
+
+def record(outcome):
+    metrics.inc('resumeai_prefetch_total', outcome=outcome)
+    try:
+        get_redis().hincrby('prefetch:stats', outcome, 1)
+    except Exception as e:
+        print(f"Prefetch warning: could not record {outcome}: {e}")
+
+
+def stats():
+    counts = {key: int(value) for key, value in get_redis().hgetall('prefetch:stats').items()}
+    ready = counts.get('ready', 0)
+    used = counts.get('used', 0) + counts.get('used_running', 0)
+    return {'counts': counts, 'hit_rate': round(used / ready, 3) if ready else None}
+
+
+def headroom_problem():
+    """Why a prefetch should not be queued right now, or None when there is spare capacity"""
+    depths = metrics.queue_depths(('celery', PREFETCH_QUEUE))
+    if len(depths) < 2:
+        return 'busy'
+    if depths['celery'] > PREFETCH_MAX_QUEUE_DEPTH:
+        return 'busy'
+    if depths[PREFETCH_QUEUE] >= PREFETCH_MAX_PENDING:
+        return 'backlog'
+    capacity = LLM_KEY_CALLS_PER_MINUTE * max(len(load_api_keys()), 1)
+    try:
+        if hedging.calls_per_minute() >= PREFETCH_MAX_KEY_USAGE * capacity:
+            return 'quota'
+    except Exception as e:
+        print(f"Prefetch warning: could not read call rate: {e}")
+        return 'quota'
+    return None
+
+
+def started(jd_id, job_id):
+    pipe = get_redis().pipeline()
+    pipe.set(f"prefetch:job:{jd_id}", job_id, ex=JOB_TTL_SECONDS)
+    pipe.set(f"prefetch:jobs:{job_id}", jd_id, ex=JOB_TTL_SECONDS)
+    pipe.execute()
+    record('enqueued')
+
+
+def jd_for_job(job_id):
+    """The JD a prefetch job is generating for, or None for ordinary jobs"""
+    try:
+        jd_id = get_redis().get(f"prefetch:jobs:{job_id}")
+    except Exception as e:
+        print(f"Prefetch warning: could not look up job {job_id}: {e}")
+        return None
+    return int(jd_id) if jd_id else None
+
+
+def adopt(job_id):
+    """A user request attached to a running prefetch job; it now reports to the session like a normal job.
+    False if the job already finished (its draft, if any, is waiting to be taken)."""
+    if not get_redis().eval(_ADOPT_SCRIPT, 2, f"prefetch:jobs:{job_id}", f"prefetch:adopted:{job_id}", JOB_TTL_SECONDS):
+        return False
+    record('used_running')
+    return True
+
+
+def adopted(job_id):
+    try:
+        return bool(get_redis().get(f"prefetch:adopted:{job_id}"))
+    except Exception as e:
+        print(f"Prefetch warning: could not read adoption of {job_id}: {e}")
+        return False
+
+
+def store_draft(jd_id, job_id, fingerprint, result):
+    """Keep a finished result as the JD's draft. False if a user adopted the job first;
+    the job then has to deliver the result itself."""
+    payload = {'job_id': job_id, 'fingerprint': fingerprint, 'result': result, 'created': time.time()}
+    stored = get_redis().eval(_STORE_DRAFT_SCRIPT, 4, f"prefetch:draft:{jd_id}", f"prefetch:job:{jd_id}",
+                              f"prefetch:jobs:{job_id}", f"prefetch:adopted:{job_id}",
+                              json.dumps(payload), PREFETCH_DRAFT_TTL_SECONDS)
+    record('ready')
+    return bool(stored)
+
+
+def finished(jd_id, job_id, outcome):
+    """A prefetch job ended without a draft (failed or cancelled)"""
+    try:
+        get_redis().delete(f"prefetch:job:{jd_id}", f"prefetch:jobs:{job_id}", f"prefetch:adopted:{job_id}")
+    except Exception as e:
+        print(f"Prefetch warning: could not clear job {job_id}: {e}")
+    record(outcome)
+
+
+def ready_jd_ids(jd_ids):
+    """Which of these JDs have a prefetched result waiting"""
+    jd_ids = list(jd_ids)
+    if not jd_ids:
+        return set()
+    pipe = get_redis().pipeline(transaction=False)
+    for jd_id in jd_ids:
+        pipe.exists(f"prefetch:draft:{jd_id}")
+    return {jd_id for jd_id, exists in zip(jd_ids, pipe.execute()) if exists}
+
+
+def take_draft(jd_id, fingerprint):
+    """The prefetched result for a JD if it was made from the same inputs; it is used up (atomically,
+    so two concurrent requests can't both take it)"""
+    raw = get_redis().eval(_TAKE_DRAFT_SCRIPT, 1, f"prefetch:draft:{jd_id}", fingerprint)
+    if not raw:
+        return None
+    record('used')
+    return json.loads(raw)
+
+
+def discard(jd_id):
+    """Drop a JD's prefetched result; returns the id of a prefetch job still running for it"""
+    client = get_redis()
+    job_id = client.get(f"prefetch:job:{jd_id}")
+    client.delete(f"prefetch:draft:{jd_id}", f"prefetch:job:{jd_id}")
+    return job_id
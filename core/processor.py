@@ -0,0 +1,783 @@
+import json
+import re
+import time
+import traceback
+
+from core import cassette, context_cache, hedging, llm, metrics, prompts, routing, sections as section_store, tracing
+from core.config import GEMINI_MODELS, LLM_DEFAULT_TIMEOUT, load_api_keys
+from core.document import ResumeDocument
+from core.jobs import DeadlineExceeded, JobCancelled
+
+
+class ResumeProcessor:
+    def __init__(self):
+        self.gemini_models = GEMINI_MODELS
+
+        # Load multiple API keys from environment
+        self.api_keys = load_api_keys()
+
+    def get_next_api_key(self, used_keys=None):
+        """Get the next available API key, rotating through available keys"""
+        if used_keys is None:
+            used_keys = set()
+
+        available_keys = [key for key in self.api_keys if key not in used_keys]
+
+        if not available_keys:
+            if used_keys:
+                # Reset and try all keys again
+                available_keys = self.api_keys
+            else:
+                raise Exception("No API keys available")
+
+        return available_keys[0]
+
+    def _call_gemini_api_with_fallback(self, model, prompt, request_options=None, used_keys=None):
+        """Call Gemini API with automatic fallback to other keys and models"""
+        if used_keys is None:
+            used_keys = set()
+
+        if request_options is None:
+            request_options = {}
+
+        last_error = None
+
+        # Try current model with all available API keys
+        while len(used_keys) < len(self.api_keys):
+            try:
+                api_key = self.get_next_api_key(used_keys)
+                used_keys.add(api_key)
+
+                print(f"Trying API key {len(used_keys)}/{len(self.api_keys)} with model {model}")
+                client = llm.get_client(api_key, model)
+                with metrics.timer('resumeai_llm_call_duration_seconds', prompt_key='raw', **client.labels):
+                    response = client.generate_content(prompt, request_options=request_options)
+
+                # Validate response
+                if response and response.text:
+                    json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+                    if not json_match:
+                        if response.text.strip().startswith('{'):
+                            return json.loads(response.text, strict=False)
+                        raise Exception("AI response did not contain a valid JSON object.")
+                    return json.loads(json_match.group(), strict=False)
+                else:
+                    raise Exception("Empty response from AI model")
+
+            except Exception as e:
+                print(f"API key {len(used_keys)} failed: {str(e)}")
+                metrics.inc('resumeai_llm_retries_total', source='processor', model=model)
+                last_error = e
+                continue
+
+        # If all API keys failed for current model, try alternative model
+        alternative_model = 'gemini-2.5-pro' if model == 'gemini-2.5-flash' else 'gemini-2.5-flash'
+
+        if alternative_model != model:
+            print(f"All API keys failed for {model}, trying {alternative_model}")
+            metrics.inc('resumeai_llm_fallbacks_total', source='processor', from_model=model, to_model=alternative_model)
+            try:
+                return self._call_gemini_api_with_fallback(alternative_model, prompt, request_options, set())
+            except Exception as e:
+                last_error = e
+
+        # If everything failed, raise the last error
+        if last_error:
+            raise last_error
+        else:
+            raise Exception("All API keys and models failed")
+
+    def _call_gemini_api(self, client, prompt, request_options=None, prompt_key=None, cached_content=None):
+        if request_options is None:
+            request_options = {}
+        # model / prompt_key / key_index, attached to the metrics and spans recorded for this call
+        labels = dict(client.labels, prompt_key=prompt_key)
+        try:
+            with tracing.span('llm_call', prompt_chars=len(prompt), cached_context=bool(cached_content), **labels) as call_span, \
+                    metrics.timer('resumeai_llm_call_duration_seconds', **labels):
+                started = time.monotonic()
+                try:
+                    response = cassette.generate(client, prompt, prompt_key,
+                                                 lambda: hedging.generate(client, prompt, request_options, prompt_key, cached_content))
+                except Exception:
+                    routing.record_call(client.model_name, prompt_key, time.monotonic() - started, ok=False)
+                    raise
+                routing.record_call(client.model_name, prompt_key, time.monotonic() - started, ok=True)
+                call_span.set(response_chars=len(response.text) if response and response.text else 0)
+
+            if not response or not response.text:
+                raise Exception("Empty response from AI model")
+
+            response_text = response.text.strip()
+
+            # Log full response for debugging (truncate if too long)
+            if len(response_text) > 1000:
+                print(f"AI Response (first 1000 chars of {len(response_text)} total): {response_text[:1000]}")
+                print(f"AI Response (last 1000 chars): {response_text[-1000:]}")
+            else:
+                print(f"AI Response (full {len(response_text)} chars): {response_text}")
+
+            parsed_json, path = self._parse_json_response(response_text)
+            self._record_parse_path(path, labels)
+            if path == 'no_json':
+                raise Exception(f"AI response did not contain a valid JSON object. Response length: {len(response_text)} chars. Response preview: {response_text[:500]}...")
+            print(f"Parsed JSON ({path}) with keys: {list(parsed_json.keys()) if isinstance(parsed_json, dict) else 'Not a dict'}")
+            return parsed_json
+
+        except Exception as e:
+            print(f"Error during Gemini API call or JSON parsing: {e}")
+            print(f"Full response text was: {response.text if 'response' in locals() else 'N/A'}")
+            raise
+
+    def _request_options(self, job=None, timeout=LLM_DEFAULT_TIMEOUT):
+        """Options for the next LLM call; with a job, stop if it was cancelled and shrink the timeout to its remaining budget"""
+        if job:
+            job.raise_if_cancelled()
+            timeout = job.call_timeout(timeout)
+        return {'timeout': timeout}
+
+    def _parse_json_response(self, response_text):
+        """Extract, clean and parse the JSON object in an answer, repairing it if needed.
+        Returns (parsed, path) where path names the step that produced it; (None, 'no_json') if none did."""
+        # Try to extract JSON from the response
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+
+        if json_match:
+            json_str = self._clean_json_string(json_match.group())
+            try:
+                return json.loads(json_str, strict=False), 'clean'
+            except json.JSONDecodeError as e:
+                print(f"JSON decode error at line {e.lineno}, column {e.colno}: {e.msg}")
+                print(f"Problematic JSON section: {json_str[max(0, e.pos-100):e.pos+100] if e.pos else 'N/A'}")
+                print(f"Attempting to fix JSON...")
+
+            # Try to fix common JSON issues
+            json_str = self._fix_common_json_issues(json_str)
+            try:
+                return json.loads(json_str, strict=False), 'fix_common_issues'
+            except json.JSONDecodeError as e2:
+                print(f"Failed to fix JSON at line {e2.lineno}, column {e2.colno}: {e2.msg}")
+                print(f"Problematic section after fix: {json_str[max(0, e2.pos-100):e2.pos+100] if e2.pos else 'N/A'}")
+                # If all else fails, try to extract just the essential parts
+                return self._extract_json_fallback(response_text), 'extract_fallback'
+
+        # If no JSON found but response starts with {, try the whole response
+        if response_text.startswith('{'):
+            json_str = self._clean_json_string(response_text)
+            try:
+                return json.loads(json_str, strict=False), 'full_response'
+            except json.JSONDecodeError as e:
+                print(f"JSON decode error on full response at line {e.lineno}, column {e.colno}: {e.msg}")
+                print(f"Problematic section: {json_str[max(0, e.pos-100):e.pos+100] if e.pos else 'N/A'}")
+            json_str = self._fix_common_json_issues(json_str)
+            try:
+                return json.loads(json_str, strict=False), 'full_response_fixed'
+            except json.JSONDecodeError as e2:
+                print(f"Failed to fix JSON on full response at line {e2.lineno}, column {e2.colno}: {e2.msg}")
+                print(f"Problematic section after fix: {json_str[max(0, e2.pos-100):e2.pos+100] if e2.pos else 'N/A'}")
+                return self._extract_interview_prep_fallback(response_text), 'interview_prep_fallback'
+
+        return None, 'no_json'
+
+    def _record_parse_path(self, path, labels):
+        """Count which JSON parse/repair path handled a response and tag the current trace span"""
+        metrics.inc('resumeai_json_parse_path_total', path=path, **labels)
+        tracing.annotate(json_parse_path=path)
+        routing.record_parse(labels['model'], labels['prompt_key'], path)
+
+    def _clean_json_string(self, json_str):
+        """Clean common JSON formatting issues"""
+        # Remove any markdown code blocks
+        json_str = re.sub(r'```json\s*', '', json_str)
+        json_str = re.sub(r'```\s*', '', json_str)
+
+        # Fix trailing commas before closing braces/brackets
+        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+
+        # More robust quote escaping - handle quotes within string values
+        # This is more complex because we need to be careful not to break valid JSON
+        json_str = self._escape_quotes_in_json(json_str)
+
+        # Additional cleaning for common issues in interview prep responses
+        # Remove any text before the first opening brace and after the last closing brace
+        first_brace = json_str.find('{')
+        last_brace = json_str.rfind('}')
+        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
+            json_str = json_str[first_brace:last_brace+1]
+
+        return json_str.strip()
+
+    def _escape_quotes_in_json(self, json_str):
+        """More robust quote escaping for JSON strings"""
+        try:
+            # Parse the JSON to identify string values that need escaping
+            # We'll use a more targeted approach to avoid breaking valid JSON
+
+            # First, let's try to identify and fix common issues
+            lines = json_str.split('\n')
+            cleaned_lines = []
+
+            for line in lines:
+                # Skip lines that are just structural (keys, braces, etc.)
+                stripped = line.strip()
+                if not stripped or stripped in ['{', '}', '[', ']', ','] or stripped.startswith('"') and stripped.endswith('",') or stripped.endswith('":'):
+                    cleaned_lines.append(line)
+                    continue
+
+                # For lines that contain actual content, escape problematic characters
+                if '"' in line:
+                    # Find the content between the first and last quote on this line
+                    first_quote = line.find('"')
+                    last_quote = line.rfind('"')
+
+                    if first_quote != -1 and last_quote != -1 and first_quote != last_quote:
+                        # Extract the part before first quote, the content, and after last quote
+                        before = line[:first_quote + 1]  # Include the opening quote
+                        content = line[first_quote + 1:last_quote]
+                        after = line[last_quote:]  # Include the closing quote and rest
+
+                        # Escape quotes and backslashes in the content
+                        escaped_content = content.replace('\\', '\\\\').replace('"', '\\"')
+                        cleaned_lines.append(before + escaped_content + after)
+                    else:
+                        cleaned_lines.append(line)
+                else:
+                    cleaned_lines.append(line)
+
+            return '\n'.join(cleaned_lines)
+
+        except Exception as e:
+            print(f"Error in quote escaping: {e}")
+            # Fallback to simple replacement
+            return json_str.replace('\\"', '"').replace('\\\\', '\\')
+
+    def _fix_common_json_issues(self, json_str):
+        """Fix common JSON formatting issues"""
+        # Fix trailing commas
+        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+
+        # Fix missing commas between objects
+        json_str = re.sub(r'}(\s*){', r'},', json_str)
+
+        # Fix missing commas between arrays
+        json_str = re.sub(r'](\s*)(\[)', r'],\1\2', json_str)
+
+        # Fix boolean values
+        json_str = re.sub(r'\bTrue\b', 'true', json_str)
+        json_str = re.sub(r'\bFalse\b', 'false', json_str)
+        json_str = re.sub(r'\bNone\b', 'null', json_str)
+
+        # Fix unescaped quotes in string values - this is the main issue
+        json_str = self._fix_unescaped_quotes(json_str)
+
+        return json_str
+
+    def _fix_unescaped_quotes(self, json_str):
+        """Fix unescaped quotes within JSON string values"""
+        try:
+            # More aggressive approach: find all string values and escape them properly
+            # This regex finds string values (content between quotes) while avoiding key names
+            import re
+
+            # Pattern to match string values (not keys) - looks for content after colon and comma
+            # This handles cases like: "key": "value with unescaped 'quotes' in it"
+            string_pattern = r'("[^"]*")\s*:\s*"((?:[^"\\]|\\.)*")'
+
+            def escape_string_content(match):
+                key = match.group(1)  # The key part (e.g., "answer":)
+                content = match.group(2)  # The content part
+
+                # Remove the trailing quote to work with just the content
+                if content.endswith('"'):
+                    content = content[:-1]
+
+                # Escape problematic characters in the content
+                # First, replace any existing backslashes to avoid double escaping
+                escaped_content = content.replace('\\', '\\\\')
+                # Then escape quotes
+                escaped_content = escaped_content.replace('"', '\\"')
+                # Handle newlines, tabs, and other special characters
+                escaped_content = escaped_content.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+                return f'{key}: "{escaped_content}"'
+
+            # Apply the fix to key-value pairs
+            fixed_json = re.sub(string_pattern, escape_string_content, json_str)
+
+            # Also handle string values in arrays (like in talking_points)
+            # Pattern to match array elements: "item1", "item with 'quotes'", "item3"
+            array_string_pattern = r',\s*"((?:[^"\\]|\\.)*")(?=\s*[,\]])'
+            single_array_item_pattern = r'\[\s*"((?:[^"\\]|\\.)*)"(?=\s*\])'  # For single item in array
+
+            def escape_array_item(match):
+                content = match.group(1)
+
+                # Remove the trailing quote to work with just the content
+                if content.endswith('"'):
+                    content = content[:-1]
+
+                # Escape problematic characters in the content
+                escaped_content = content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+                return f', "{escaped_content}"'
+
+            def escape_single_array_item(match):
+                content = match.group(1)
+
+                # Remove the trailing quote to work with just the content
+                if content.endswith('"'):
+                    content = content[:-1]
+
+                # Escape problematic characters in the content
+                escaped_content = content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+                return f'["{escaped_content}"'
+
+            # Apply fixes to array elements
+            fixed_json = re.sub(array_string_pattern, escape_array_item, fixed_json)
+            fixed_json = re.sub(single_array_item_pattern, escape_single_array_item, fixed_json)
+
+            # Handle remaining standalone strings that might be unescaped
+            # This is more complex - we'll use a state-based approach to identify string values vs. keys
+            result = []
+            i = 0
+            in_string = False
+            string_start_char = None
+            escape_next = False
+
+            while i < len(fixed_json):
+                char = fixed_json[i]
+
+                if escape_next:
+                    result.append(char)
+                    escape_next = False
+                elif char == '\\':
+                    result.append(char)
+                    escape_next = True
+                elif char in ('"', "'") and not escape_next:
+                    if not in_string:
+                        # Starting a new string
+                        in_string = True
+                        string_start_char = char
+                        result.append(char)
+                    elif char == string_start_char:
+                        # Ending the current string
+                        in_string = False
+                        string_start_char = None
+                        result.append(char)
+                    else:
+                        # This is a different quote character inside a string, escape it
+                        result.append('\\')
+                        result.append(char)
+                else:
+                    result.append(char)
+
+                i += 1
+
+            return ''.join(result)
+
+        except Exception as e:
+            print(f"Error in quote fixing: {e}")
+            # Fallback: try to manually escape all quotes that aren't already escaped
+            try:
+                # Simple fallback: escape all unescaped quotes
+                result = []
+                i = 0
+                while i < len(json_str):
+                    if json_str[i] == '"' and (i == 0 or json_str[i-1] != '\\'):
+                        # This is an unescaped quote, escape it
+                        result.append('\\"')
+                    else:
+                        result.append(json_str[i])
+                    i += 1
+                return ''.join(result)
+            except:
+                return json_str
+
+    def _extract_json_fallback(self, response_text):
+        """Fallback method to extract JSON when parsing fails"""
+        print(f"Attempting fallback JSON extraction from response text...")
+
+        # Try to extract cover letter
+        cover_letter_match = re.search(r'"cover_letter"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', response_text, re.DOTALL)
+        if cover_letter_match:
+            cover_letter = cover_letter_match.group(1)
+            # Unescape the content
+            cover_letter = cover_letter.replace('\\"', '"').replace('\\\\', '\\').replace('\\n', '\n')
+        else:
+            cover_letter = 'Error: Could not parse AI response'
+
+        # Try to extract match score
+        match_score_match = re.search(r'"match_score"\s*:\s*(\d+)', response_text)
+        match_score = int(match_score_match.group(1)) if match_score_match else 0
+
+        # Try to extract match score analysis
+        analysis_match = re.search(r'"match_score_analysis"\s*:\s*({[^}]*})', response_text, re.DOTALL)
+        if analysis_match:
+            try:
+                analysis = json.loads(analysis_match.group(1))
+            except:
+                analysis = {
+                    'strengths': 'Error parsing analysis',
+                    'gaps': 'Error parsing analysis',
+                    'justification': 'Error parsing analysis'
+                }
+        else:
+            analysis = {
+                'strengths': 'Error parsing analysis',
+                'gaps': 'Error parsing analysis',
+                'justification': 'Error parsing analysis'
+            }
+
+        # Try to extract paragraphs if present
+        paragraphs = {}
+        if 'customized_paragraphs' in response_text:
+            para_matches = re.findall(r'"([^"]+)"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', response_text)
+            for key, value in para_matches:
+                if key.startswith('paragraph') or len(key) < 50:  # Likely a paragraph key
+                    # Unescape the value
+                    unescaped_value = value.replace('\\"', '"').replace('\\\\', '\\').replace('\\n', '\n')
+                    paragraphs[key] = unescaped_value
+
+        result = {
+            'customized_paragraphs': paragraphs,
+            'cover_letter': cover_letter,
+            'match_score': match_score,
+            'match_score_analysis': analysis
+        }
+
+        print(f"Fallback extraction successful: {bool(cover_letter != 'Error: Could not parse AI response')}")
+        return result
+
+    def _extract_interview_prep_fallback(self, response_text):
+        """Specialized fallback method for interview prep JSON parsing"""
+        print(f"Attempting specialized interview prep JSON extraction...")
+
+        # Try to extract general_questions array
+        general_questions = []
+        role_based_questions = []
+
+        # Look for general_questions array
+        general_match = re.search(r'"general_questions"\s*:\s*(\[[^\]]*\])', response_text, re.DOTALL)
+        if general_match:
+            try:
+                general_questions = json.loads(general_match.group(1))
+                print(f"Successfully extracted {len(general_questions)} general questions")
+            except json.JSONDecodeError as e:
+                print(f"Failed to parse general_questions array: {e}")
+
+        # Look for role_based_questions array
+        role_match = re.search(r'"role_based_questions"\s*:\s*(\[[^\]]*\])', response_text, re.DOTALL)
+        if role_match:
+            try:
+                role_based_questions = json.loads(role_match.group(1))
+                print(f"Successfully extracted {len(role_based_questions)} role-based questions")
+            except json.JSONDecodeError as e:
+                print(f"Failed to parse role_based_questions array: {e}")
+
+        # If we got at least one type of questions, return them
+        if general_questions or role_based_questions:
+            result = {
+                'general_questions': general_questions,
+                'role_based_questions': role_based_questions
+            }
+            print(f"Interview prep fallback extraction successful: {len(general_questions)} general, {len(role_based_questions)} role-based questions")
+            return result
+
+        # If that didn't work, try a more aggressive approach
+        print("Trying aggressive JSON extraction for interview prep...")
+
+        # Look for any arrays that might contain question objects
+        question_arrays = re.findall(r'\[\s*\{[^}]*"question"[^}]*\}[^\]]*\]', response_text, re.DOTALL)
+
+        for i, array_str in enumerate(question_arrays):
+            try:
+                questions = json.loads(array_str)
+                if isinstance(questions, list) and len(questions) > 0:
+                    if i == 0:
+                        general_questions = questions
+                        print(f"Extracted {len(general_questions)} general questions from array {i}")
+                    else:
+                        role_based_questions = questions
+                        print(f"Extracted {len(role_based_questions)} role-based questions from array {i}")
+            except json.JSONDecodeError as e:
+                print(f"Failed to parse question array {i}: {e}")
+
+        if general_questions or role_based_questions:
+            result = {
+                'general_questions': general_questions,
+                'role_based_questions': role_based_questions
+            }
+            print(f"Aggressive interview prep extraction successful: {len(general_questions)} general, {len(role_based_questions)} role-based questions")
+            return result
+
+        print("All interview prep extraction methods failed")
+        return {
+            'general_questions': [],
+            'role_based_questions': []
+        }
+
+    def _call_with_cached_context(self, client, prompt_key, custom_prompts, placeholders, request_options=None):
+        """Call Gemini with the role instructions and resume served from a cached context when possible"""
+        template = prompts.get_template(prompt_key, custom_prompts)
+        split = context_cache.split_template(template.text)
+        cached_content = None
+        if split:
+            prefix, body = split
+            resume_text = str(placeholders['FULL_RESUME_TEXT'])
+            cached_content = context_cache.get_or_create(client, prefix, resume_text)
+        if cached_content is None:
+            return self._call_gemini_api(client, prompts.render(prompt_key, template, placeholders), request_options, prompt_key)
+
+        # Only the JD-specific part is sent; the resume is referenced instead of repeated
+        body_template = prompts.compile_template(prompt_key, body)
+        prompt = prompts.render(prompt_key, body_template, dict(placeholders, FULL_RESUME_TEXT=context_cache.RESUME_REFERENCE))
+        prompt, cached_content = context_cache.resolve(cached_content, prompt)
+        try:
+            return self._call_gemini_api(client, prompt, request_options, prompt_key, cached_content=cached_content)
+        except Exception as e:
+            if not context_cache.invalidate(client, prefix, resume_text, e):
+                raise
+            print(f"Cached context was rejected ({e}); retrying with the full prompt")
+            return self._call_gemini_api(client, prompts.render(prompt_key, template, placeholders), request_options, prompt_key)
+
+    def _get_prompt(self, prompt_key, custom_prompts_dict, placeholders):
+        return prompts.render(prompt_key, prompts.get_template(prompt_key, custom_prompts_dict), placeholders)
+
+    def _generate_paragraphs(self, client, resume_data, selected_paragraph_ids, job_description, company_name, regenerate_type, custom_prompts, request_options=None):
+        if isinstance(regenerate_type, dict) and 'single_paragraph' in regenerate_type:
+            para_text = regenerate_type['single_paragraph']
+            original_words = len(para_text.split())
+            placeholders = {
+                'COMPANY': company_name,
+                'JOB_TITLE': f"Role at {company_name}",
+                'JOB_DESCRIPTION': job_description,
+                'ORIGINAL_PARAGRAPH': para_text,
+                'WORD_LIMIT': original_words + 15,
+                'JSON_STRUCTURE': '{ "enhanced_text": "The new, enhanced paragraph text here..." }'
+            }
+            prompt = self._get_prompt('single_paragraph', custom_prompts, placeholders)
+            prompt_key = 'single_paragraph'
+        else:
+            selected_paragraphs_dict = {p['id']: p['text'] for p in resume_data['paragraphs'] if p['id'] in selected_paragraph_ids}
+            total_original_words = sum(len(text.split()) for text in selected_paragraphs_dict.values())
+            total_original_chars = sum(len(text) for text in selected_paragraphs_dict.values())
+            placeholders = {
+                'COMPANY': company_name,
+                'JOB_TITLE': f"Role at {company_name}",
+                'JOB_DESCRIPTION': job_description,
+                'PARAGRAPH_COUNT': len(selected_paragraphs_dict),
+                'SELECTED_PARAGRAPHS_JSON': json.dumps(selected_paragraphs_dict, indent=2),
+                'TOTAL_CHAR_LIMIT': total_original_chars + 150,
+                'TOTAL_WORD_LIMIT': total_original_words + 20,
+                'JSON_STRUCTURE': '{ "customized_paragraphs": { "paragraph_id_1": "new_text_1", ... } }'
+            }
+            prompt = self._get_prompt('paragraphs', custom_prompts, placeholders)
+            prompt_key = 'paragraphs'
+
+        return self._call_gemini_api(client, prompt, request_options=request_options, prompt_key=prompt_key)
+
+    def _reconstruct_resume_with_enhanced_paragraphs(self, resume_data, document, enhanced_paragraphs):
+        """
+        Reconstruct the full resume text with the enhanced paragraphs ({id: text}) swapped in,
+        preserving all other content, formatting, and structure.
+        """
+        if not enhanced_paragraphs:
+            return resume_data
+        enhanced_resume_data = resume_data.copy()
+        enhanced_resume_data['full_text'] = document.render(enhanced_paragraphs)
+        return enhanced_resume_data
+
+    def _generate_cover_letter(self, client, resume_data, job_description, company_name, custom_prompts, request_options=None):
+        placeholders = {
+            'COMPANY': company_name,
+            'JOB_TITLE': f"Role at {company_name}",
+            'JOB_DESCRIPTION': job_description,
+            'FULL_RESUME_TEXT': resume_data['full_text'],  # Now uses enhanced text
+            'JSON_STRUCTURE': '{\n  "cover_letter": "The full cover letter text here...",\n  "match_score": 85,\n  "match_score_analysis": {\n    "strengths": "Strengths of candidacy...",\n    "gaps": "Potential gaps and weaknesses...",\n    "justification": "Score justification..."\n  }\n}'
+        }
+        # Sent inline: the resume here carries the paragraphs customized for this JD, so a
+        # cached context keyed on it would be written once per JD and never reused
+        prompt = self._get_prompt('cover_letter', custom_prompts, placeholders)
+        return self._call_gemini_api(client, prompt, request_options, 'cover_letter')
+
+    def customization_prompt_keys(self, regenerate_type=None):
+        """Prompt types a customization request will run, used for model routing"""
+        if isinstance(regenerate_type, dict) and 'single_paragraph' in regenerate_type:
+            return ['single_paragraph']
+        if regenerate_type in ('paragraphs', 'cover_letter'):
+            return [regenerate_type]
+        return ['paragraphs', 'cover_letter']
+
+    def _stage(self, job, stage, span, compute, **span_labels):
+        """Run one LLM stage, reusing its checkpoint from an earlier key/model attempt of the job"""
+        result = job.load_checkpoint(stage) if job else None
+        if result is None:
+            options = self._request_options(job)
+            with tracing.span(span, timeout=round(options['timeout']), **span_labels):
+                result = compute(options)
+            if job:
+                job.save_checkpoint(stage, result)
+        return result
+
+    def generate_ai_customization(self, api_key, model_name, resume_data, selected_paragraph_ids, job_description, company_name, regenerate_type=None, custom_prompts=None, job=None, sections=None):
+        """Customized paragraphs, cover letter and match score.
+
+        `sections` are the stored sections of the result being regenerated: those made
+        from the same inputs are reused unless regenerate_type names them, and the
+        output is the complete result ('complete': True) with the 'sections' to store.
+        Regenerating a result stored without sections only produces what it names.
+        """
+        try:
+            client = llm.get_client(api_key, model_name)
+
+            final_output = {'customized_paragraphs': {}, 'cover_letter': '', 'match_score': None, 'enhanced_text': None}
+
+            incremental = regenerate_type is None or bool(sections)
+            single = regenerate_type if isinstance(regenerate_type, dict) and 'single_paragraph' in regenerate_type else None
+            do_paragraphs = incremental or regenerate_type == 'paragraphs' or single is not None
+            do_cover_letter = incremental or regenerate_type == 'cover_letter'
+            new_sections, reused, computed = {}, [], []
+            # Enhanced paragraph text by paragraph id
+            enhanced = {}
+
+            document = ResumeDocument.from_structured(resume_data)
+            selected = [pid for pid in document.ids if pid in (selected_paragraph_ids or ())]
+            single_id = None
+            if single is not None:
+                single_id = single.get('paragraph_id')
+                single_id = int(single_id) if str(single_id).isdigit() else document.id_for(single['single_paragraph'])
+            paragraph_version = prompts.get_template('paragraphs', custom_prompts).hash
+            paragraph_inputs = {pid: section_store.input_hash(paragraph_version, job_description, company_name, document.text(pid))
+                                for pid in selected}
+
+            if do_paragraphs:
+                todo = []
+                if incremental or regenerate_type == 'paragraphs':
+                    for pid in selected:
+                        if pid == single_id:
+                            continue
+                        name = section_store.paragraph(pid)
+                        found = None
+                        if regenerate_type != 'paragraphs':
+                            found = section_store.reusable(sections, name, paragraph_inputs[pid])
+                        if found:
+                            enhanced[pid] = found['value']
+                            new_sections[name] = found
+                            reused.append(name)
+                        else:
+                            todo.append(pid)
+
+                if single is not None:
+                    para_result = self._stage(job, 'single_paragraph', 'paragraph_call', lambda options: self._generate_paragraphs(
+                        client, resume_data, selected_paragraph_ids, job_description, company_name, regenerate_type, custom_prompts, options), selected_count=1)
+                    final_output['enhanced_text'] = para_result.get('enhanced_text')
+                    if final_output['enhanced_text'] is not None and single_id is not None:
+                        # Also returned by id, so the caller can update the id-keyed paragraphs it holds
+                        enhanced[single_id] = final_output['enhanced_text']
+                        if incremental and single_id in paragraph_inputs:
+                            new_sections[section_store.paragraph(single_id)] = section_store.entry(paragraph_inputs[single_id], final_output['enhanced_text'])
+                    computed.append('single_paragraph')
+
+                # Only paragraphs without a reusable section go to the model
+                if todo:
+                    para_result = self._stage(job, 'paragraphs', 'paragraph_call', lambda options: self._generate_paragraphs(
+                        client, resume_data, set(todo), job_description, company_name, None, custom_prompts, options), selected_count=len(todo))
+                    for returned_id, enhanced_text in para_result.get('customized_paragraphs', {}).items():
+                        pid = int(returned_id) if str(returned_id).isdigit() else None
+                        if document.text(pid) is None:
+                            print(f"!! DEBUG WARNING: AI returned paragraph ID '{returned_id}' which was not found. Skipping.")
+                            continue
+                        enhanced[pid] = enhanced_text
+                        if pid in paragraph_inputs:
+                            new_sections[section_store.paragraph(pid)] = section_store.entry(paragraph_inputs[pid], enhanced_text)
+                    computed.extend(section_store.paragraph(pid) for pid in todo)
+                final_output['paragraphs'] = document.paragraphs_view(enhanced)
+                final_output['customized_paragraphs'] = document.text_view(enhanced)
+
+            if do_cover_letter:
+                # NEW: Reconstruct resume text with enhanced paragraphs before generating cover letter
+                with tracing.span('reconstruction', replacements=len(enhanced)):
+                    enhanced_resume_data = self._reconstruct_resume_with_enhanced_paragraphs(resume_data, document, enhanced)
+                cover_letter_inputs = section_store.input_hash(
+                    prompts.get_template('cover_letter', custom_prompts).hash, job_description, company_name,
+                    resume_data['full_text'], sorted(paragraph_inputs.values()))
+                found = None
+                if incremental and regenerate_type != 'cover_letter':
+                    found = section_store.reusable(sections, 'cover_letter', cover_letter_inputs)
+                if found:
+                    cl_result = found['value']
+                    reused.append('cover_letter')
+                else:
+                    cl_result = self._stage(job, 'cover_letter', 'cover_letter_call', lambda options: self._generate_cover_letter(
+                        client, enhanced_resume_data, job_description, company_name, custom_prompts, options))
+                    computed.append('cover_letter')
+                new_sections['cover_letter'] = section_store.entry(cover_letter_inputs, {
+                    key: cl_result.get(key) for key in ('cover_letter', 'match_score', 'match_score_analysis')})
+                final_output['cover_letter'] = cl_result.get('cover_letter')
+                final_output['match_score'] = cl_result.get('match_score')
+                # Handle both old string format and new structured format for backward compatibility
+                match_analysis = cl_result.get('match_score_analysis')
+                if isinstance(match_analysis, dict):
+                    # New structured format
+                    final_output['match_score_analysis'] = match_analysis
+                else:
+                    # Old string format - convert to structured for consistency
+                    final_output['match_score_analysis'] = {
+                        'strengths': match_analysis or '',
+                        'gaps': '',
+                        'justification': 'Analysis converted from legacy format'
+                    }
+
+            section_store.count('customization', len(reused), len(computed))
+            tracing.annotate(reused_sections=len(reused), computed_sections=len(computed))
+            if incremental:
+                final_output['complete'] = True
+                final_output['sections'] = new_sections
+                final_output['reused_sections'] = reused
+            return final_output
+        except (JobCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            print(f"AI Generation Error: {traceback.format_exc()}")
+            raise Exception(f"Error generating AI customization: {str(e)}")
+            
+    def generate_interview_prep(self, api_key, model_name, resume_full_text, job_description, company_name, job_title, custom_prompts=None, job=None, previous=None, regenerate=None):
+        """Interview questions by group. Groups of the `previous` prep made from the same
+        inputs are kept unless `regenerate` names them; only the rest are asked for."""
+        try:
+            client = llm.get_client(api_key, model_name)
+
+            inputs = section_store.input_hash(prompts.get_template('interview_prep', custom_prompts).hash,
+                                              job_description, company_name, job_title, resume_full_text)
+            previous = previous or {}
+            wanted = section_store.interview_groups(regenerate)
+            keep = [group for group in section_store.INTERVIEW_GROUPS if group not in wanted and previous.get(group)
+                    and (previous.get('section_inputs') or {}).get(group) == inputs]
+            todo = [group for group in section_store.INTERVIEW_GROUPS if group not in keep]
+
+            json_structure = "{\n" + ",\n".join(
+                f'  "{group}": [\n    {{ "question": "...", "talking_points": ["..."], "answer": "..." }}\n  ]'
+                for group in todo) + "\n}"
+            placeholders = {
+                'COMPANY': company_name,
+                'JOB_TITLE': job_title,
+                'JOB_DESCRIPTION': job_description,
+                'FULL_RESUME_TEXT': resume_full_text,
+                'JSON_STRUCTURE': json_structure
+            }
+            # The prompt only describes the groups being generated, like JSON_STRUCTURE;
+            # with every group reused there is nothing to ask for
+            result = {}
+            if todo:
+                scoped_prompts = dict(custom_prompts or {}, interview_prep=prompts.interview_prep_text(todo, custom_prompts))
+                result = self._call_with_cached_context(client, 'interview_prep', scoped_prompts, placeholders, self._request_options(job))
+            section_store.count('interview_prep', len(keep), len(todo))
+            prep = {group: previous[group] if group in keep else result.get(group, []) for group in section_store.INTERVIEW_GROUPS}
+            prep['section_inputs'] = {group: inputs for group in section_store.INTERVIEW_GROUPS}
+            return prep
+        except (JobCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            print(f"Interview Prep Generation Error: {traceback.format_exc()}")
+            raise Exception(f"Error generating interview prep materials: {str(e)}")
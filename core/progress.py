@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+
+from core import metrics
+from core.config import PROGRESS_MAX_PENDING, PROGRESS_MIN_INTERVAL
+
+# Longest flush() waits for the dispatcher to finish an update it is already sending
+FLUSH_WAIT_SECONDS = 5
+
+
+class ProgressChannel:
+    """Delivers task_progress events from a background dispatcher instead of the task itself.
+
+    Updates are queued per session and sent at most once every `min_interval`
+    seconds (the old emit_progress slept for a second after every emit to space
+    out the toasts). If a session builds up more than `max_pending` updates, the
+    oldest are dropped - they are already superseded by newer ones.
+    """
+
+    def __init__(self, emit, min_interval=PROGRESS_MIN_INTERVAL, max_pending=PROGRESS_MAX_PENDING):
+        self._emit = emit
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._last_sent = {}
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def publish(self, session_id, payload):
+        """Queue an update and return immediately"""
+        with self._cond:
+            queue = self._pending.setdefault(session_id, deque())
+            queue.append(payload)
+            while len(queue) > self.max_pending:
+                queue.popleft()
+                metrics.inc('resumeai_progress_coalesced_total')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='progress-dispatcher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self, session_id):
+        """Send everything still queued for a session right away (before a task's final event)"""
+        with self._cond:
+            queue = self._pending.pop(session_id, deque())
+            self._last_sent[session_id] = time.monotonic()
+            # An update the dispatcher already took is older than these; let it go out first
+            # so it can't arrive after the task's final event
+            give_up_at = time.monotonic() + FLUSH_WAIT_SECONDS
+            while self._in_flight.get(session_id) and time.monotonic() < give_up_at:
+                self._cond.wait(give_up_at - time.monotonic())
+        for payload in queue:
+            self._send(session_id, payload)
+
+    def _send(self, session_id, payload):
+        try:
+            self._emit('task_progress', payload, session_id)
+        except Exception as e:
+            print(f"Warning: could not emit progress to {session_id}: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = []
+                next_wake = None
+                for session_id, queue in list(self._pending.items()):
+                    ready_at = self._last_sent.get(session_id, 0) + self.min_interval
+                    if ready_at <= now:
+                        due.append((session_id, queue.popleft()))
+                        self._in_flight[session_id] = self._in_flight.get(session_id, 0) + 1
+                        self._last_sent[session_id] = now
+                        if not queue:
+                            del self._pending[session_id]
+                    elif next_wake is None or ready_at < next_wake:
+                        next_wake = ready_at
+
+                # Forget idle sessions so the rate-limit table doesn't grow forever
+                for session_id, sent_at in list(self._last_sent.items()):
+                    if session_id not in self._pending and now - sent_at > 60:
+                        del self._last_sent[session_id]
+
+                if not due:
+                    self._cond.wait(None if next_wake is None else next_wake - now)
+                    continue
+
+            for session_id, payload in due:
+                self._send(session_id, payload)
+                with self._cond:
+                    self._in_flight[session_id] -= 1
+                    if not self._in_flight[session_id]:
+                        del self._in_flight[session_id]
+                    self._cond.notify_all()
+
+
+class ProgressReporter:
+    """Per-task progress callback: progress("message", stage='...', percent=40)"""
+
+    def __init__(self, channel, session_id, job_id=None, context=None):
+        self.channel = channel
+        self.session_id = session_id
+        self.job_id = job_id
+        self.context = context
+
+    def __call__(self, status, stage=None, percent=None):
+        payload = {'status': status, 'job_id': self.job_id, 'stage': stage, 'percent': percent}
+        if self.context:
+            payload['context'] = self.context
+        self.channel.publish(self.session_id, payload)
+
+    def flush(self):
+        self.channel.flush(self.session_id)
+
+
+class NullProgress:
+    """Progress callback for background jobs nobody is watching (prefetches)"""
+
+    def __call__(self, status, stage=None, percent=None):
+        pass
+
+    def flush(self):
+        pass
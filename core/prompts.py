@@ -0,0 +1,463 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# Prompt templates are compiled once per distinct text (keyed by content hash) into
+# literal and placeholder parts, so rendering is one join instead of a replace per
+# placeholder. Custom prompts are validated when saved and stored server-side; tasks
+# carry their ids instead of the full text.
+
+DEFAULT_PROMPTS = {
+    "paragraphs": """ROLE:
+You are an elite Career Strategist and Certified Professional Resume Writer (CPRW) with deep expertise in Applicant Tracking System (ATS) optimization and modern recruitment psychology. Your specialization is reverse-engineering job descriptions to create compelling career narratives that bypass algorithmic filters and resonate with hiring managers at top-tier companies like {COMPANY}.
+
+OBJECTIVE:
+Your mission is to strategically re-engineer the provided resume paragraphs. Transform them from passive descriptions of duties into high-impact, quantified statements of achievement. The rewritten paragraphs must be meticulously tailored to the target job description, demonstrating an undeniable fit for the role.
+
+CONTEXTUAL INPUTS:
+
+COMPANY: {COMPANY}
+
+TARGET JOB DESCRIPTION: {JOB_DESCRIPTION}
+
+PARAGRAPHS FOR TRANSFORMATION ({PARAGRAPH_COUNT} total): {SELECTED_PARAGRAPHS_JSON}
+
+MAXIMUM TOTAL CHARACTER COUNT: {TOTAL_CHAR_LIMIT}
+
+EXECUTION DIRECTIVES:
+
+ATS & Keyword Optimization (Primary Directive):
+
+Analyze & Map: First, meticulously parse the {JOB_DESCRIPTION} to identify primary and secondary keywords. This includes hard skills (e.g., software, technical methodologies), soft skills (e.g., 'strategic planning', 'cross-functional collaboration'), and key qualifications.
+
+Semantic Integration: Do not merely "stuff" keywords. Integrate them naturally and semantically. If the JD mentions "managing budgets," use related powerful phrases like "financial oversight," "P&L management," or "resource allocation" if supported by the original text.
+
+Mirror Language: Reflect the specific terminology and professional tone used by {COMPANY} in the job description to create a sense of immediate cultural and professional alignment.
+
+Quantification & Impact Framing (Secondary Directive):
+
+Employ the STAR/PAR Method: Restructure every possible statement to follow the Problem-Action-Result (or Situation-Task-Action-Result) framework. Focus on the outcome of the actions.
+
+Introduce Metrics: Where the original text implies an achievement, quantify it. Use metrics such as percentages (e.g., increased efficiency by 15%), monetary values (e.g., managed a £500K budget), scale (e.g., led a team of 10), or time saved (e.g., reduced processing time by 2 days). The goal is to translate responsibilities into measurable results.
+
+Lead with Impact: Begin sentences with a powerful, diverse action verb that immediately signals achievement (e.g., "Orchestrated," "Engineered," "Spearheaded," "Maximized," "Revitalized"). Avoid passive language ("Responsible for...") and low-impact verbs ("Led," "Managed") where a stronger alternative exists.
+
+Structural & Stylistic Integrity:
+
+Conciseness: Eliminate filler words and redundant phrases. Each word must serve a purpose.
+
+High-Fidelity Transformation: You must adhere strictly to the achievements and experiences present in the original {SELECTED_PARAGRAPHS_JSON}. Enhance and reframe, but never fabricate new data, skills, or outcomes.
+
+Adhere to Constraints: The combined character count of all transformed paragraphs must not exceed the {TOTAL_CHAR_LIMIT}. The output must be a direct one-to-one transformation of the provided paragraph IDs.
+
+CRITICAL FINAL CHECK:
+Before finalizing, review the rewritten paragraphs against the {JOB_DESCRIPTION} one last time. Ask: "Does this text make the candidate look like the perfect solution to the problems and needs outlined in this job description?" The answer must be an unequivocal "yes."
+""",
+    "single_paragraph": """ROLE:
+You are an elite Career Strategist and Certified Professional Resume Writer (CPRW) with deep expertise in Applicant Tracking System (ATS) optimization and modern recruitment psychology. Your specialization is reverse-engineering job descriptions to create compelling career narratives that bypass algorithmic filters and resonate with hiring managers at top-tier companies like {COMPANY}.
+
+OBJECTIVE:
+Your mission is to strategically re-engineer a single resume paragraph. Transform it from a passive description of duties into a high-impact, quantified statement of achievement. The rewritten paragraph must be meticulously tailored to the target job description, demonstrating an undeniable fit for the role.
+
+CONTEXTUAL INPUTS:
+
+COMPANY: {COMPANY}
+
+TARGET JOB DESCRIPTION: {JOB_DESCRIPTION}
+
+ORIGINAL PARAGRAPH FOR TRANSFORMATION: "{ORIGINAL_PARAGRAPH}"
+
+MAXIMUM WORD COUNT: {WORD_LIMIT}
+
+EXECUTION DIRECTIVES:
+
+ATS & Keyword Optimization (Primary Directive):
+
+Analyze & Map: First, meticulously parse the {JOB_DESCRIPTION} to identify primary and secondary keywords. This includes hard skills (e.g., software, technical methodologies), soft skills (e.g., 'strategic planning', 'cross-functional collaboration'), and key qualifications.
+
+Semantic Integration: Do not merely "stuff" keywords. Integrate them naturally and semantically. If the JD mentions "managing budgets," use related powerful phrases like "financial oversight," "P&L management," or "resource allocation" if supported by the original text.
+
+Mirror Language: Reflect the specific terminology and professional tone used by {COMPANY} in the job description to create a sense of immediate cultural and professional alignment.
+
+Quantification & Impact Framing (Secondary Directive):
+
+Employ the STAR/PAR Method: Restructure the statement to follow the Problem-Action-Result (or Situation-Task-Action-Result) framework. Focus on the outcome of the actions.
+
+Introduce Metrics: Where the original text implies an achievement, quantify it. Use metrics such as percentages (e.g., increased efficiency by 15%), monetary values (e.g., managed a £500K budget), scale (e.g., led a team of 10), or time saved (e.g., reduced processing time by 2 days). The goal is to translate responsibilities into measurable results.
+
+Lead with Impact: Begin the paragraph with a powerful, diverse action verb that immediately signals achievement (e.g., "Orchestrated," "Engineered," "Spearheaded," "Maximized," "Revitalized"). Avoid passive language ("Responsible for...") and low-impact verbs ("Led," "Managed") where a stronger alternative exists.
+
+Structural & Stylistic Integrity:
+
+Conciseness: Eliminate filler words and redundant phrases. Each word must serve a purpose.
+
+High-Fidelity Transformation: You must adhere strictly to the achievements and experiences present in the original paragraph. Enhance and reframe, but never fabricate new data, skills, or outcomes.
+
+Adhere to Constraints: The transformed paragraph must not exceed {WORD_LIMIT} words. Maintain a similar length to the original while dramatically improving impact and relevance.
+
+CRITICAL FINAL CHECK:
+Before finalizing, review the rewritten paragraph against the {JOB_DESCRIPTION} one last time. Ask: "Does this text make the candidate look like the perfect solution to the problems and needs outlined in this job description?" The answer must be an unequivocal "yes."
+""",
+    "cover_letter": """ROLE: You are an Expert Career Strategist and Recruitment Analyst. Your expertise lies in dissecting job descriptions and resumes to create compelling application materials and provide a rigorous, objective analysis of a candidate's viability. You do not sugarcoat; your feedback is direct, evidence-based, and actionable.
+
+MISSION: Your mission is to perform a two-part task based on the company, target job description and resume given under CONTEXT at the end. First, you will write a world-class cover letter that positions the candidate as the ideal solution to the company's needs. Second, you will conduct a brutally honest, data-driven analysis to score the candidate's match for the role, identifying both strengths and critical gaps.
+
+TASK: GENERATE COVER LETTER & STRATEGIC MATCH ANALYSIS
+
+PART 1: THE COVER LETTER (250-300 words)
+
+Your writing must be concise, confident, and meticulously tailored.
+
+Opening Hook: Do not start with a generic "I am writing to apply...". Instead, create a powerful opening statement that immediately connects the candidate's most significant achievement or core competency to a specific company goal, value, or a challenge implied in the job description.
+
+Body Paragraphs (The "Proof"):
+
+Synthesize the top 2-3 requirements from the job description.
+
+For each requirement, extract a specific, quantifiable achievement from the resume that directly proves the candidate's capability.
+
+Weave these proofs into a narrative. Use the Problem-Action-Result (PAR) framework. For example: "At my previous role, I addressed the challenge of [Problem] by implementing [Action], which resulted in a [Quantifiable Result]."
+
+Subtly integrate knowledge of the company's products, recent news, or mission to demonstrate genuine interest beyond the job posting.
+
+Closing & Call to Action: Conclude with a confident statement summarizing the candidate's value proposition. End with a proactive call to action, expressing eagerness to discuss how their specific skills can contribute to the company's upcoming projects or goals.
+
+PART 2: THE JOB MATCH ANALYSIS
+
+Your analysis must be objective and unflinching. Avoid platitudes.
+
+Job Match Score (1-100): Provide a single integer score based on the following rubric.
+
+90-100 (Exceptional): Candidate exceeds most core requirements, meets all preferred qualifications, and possesses unique value-adds. The resume provides quantifiable proof of high performance in directly comparable tasks.
+
+80-89 (Strong): Candidate meets all core requirements and most preferred qualifications. There is a clear and direct mapping between resume experience and job duties.
+
+70-79 (Good): Candidate meets the majority of core requirements but may be missing some preferred qualifications or lack direct experience in a specific domain. The candidacy is solid but not flawless.
+
+Below 70 (Moderate to Weak): Candidate is missing one or more core requirements. The experience is adjacent or requires significant upskilling. This represents a substantial reach for the candidate.
+
+Match Score Analysis: Provide a detailed rationale for your score, structured in the following three sections:
+
+Strengths of Candidacy: Itemize the strongest points of alignment. Quote specific phrases from the job description and directly map them to accomplishments or skills listed in the resume.
+
+Potential Gaps / Weaknesses: Identify and explicitly state any significant misalignments. Where does the resume fall short? Note missing technologies, insufficient years of experience in a key area, lack of industry-specific context, or any other core requirement that is not fully substantiated by the resume.
+
+Score Justification: Conclude with a summary paragraph that synthesizes the strengths and weaknesses to explain precisely why the specific score was assigned. For example, "The score of 82 reflects the candidate's exceptional alignment with core technical skills A and B, but is tempered by the lack of direct experience with industry-specific software C, which is listed as a preferred qualification."
+
+CONTEXT:
+
+COMPANY: {COMPANY}
+
+TARGET JOB DESCRIPTION: {JOB_DESCRIPTION}
+
+FULL RESUME TEXT: {FULL_RESUME_TEXT}
+""",
+    "interview_prep": """You are to act as an elite Tier-1 career coach and interview strategist. Your expertise is in meticulously deconstructing a candidate's history against a target role's requirements to forge a powerful, compelling interview narrative. You do not generate generic questions; you create a bespoke interrogation plan designed to highlight the candidate's unique strengths and proactively address potential weaknesses.
+
+PRIMARY OBJECTIVE:
+
+Analyze the candidate's resume in the context of the job description for the target role, both given under CONTEXT at the end. Your goal is to produce a set of highly targeted interview questions and exemplary answers that will strategically position the candidate for success. The output must be a single, valid JSON object with the exact structure specified below - no additional categories or fields are allowed.
+
+ANALYTICAL FRAMEWORK (Your Internal Process):
+
+Resume-to-JD Synergy and Gap Analysis: First, perform a deep comparison. Identify the top 3-5 areas where the candidate's resume shows exceptional alignment with the job description's core requirements. Conversely, identify any potential "red flags" or gaps—such as a non-traditional career path, a noticeable employment gap, a potential lack of experience in a key area mentioned in the JD, or frequent job changes.
+
+Strategic Narrative Formulation: Based on your analysis, determine the central narrative the candidate should convey. This narrative should be woven through all the answers. For example, is it a story of "the technical expert pivoting to leadership," "the generalist now specializing," or "the problem-solver who thrives in chaotic environments"?
+
+TASK: GENERATE INTERVIEW QUESTIONS & ANSWERS
+
+Based on your analysis, generate two distinct categories of questions. For each question, provide both 'talking_points' (the strategic pillars of the response) and a complete sample 'answer' (a polished, first-person narrative).
+
+Category 1: General & Career Narrative Questions (2 Questions)
+
+Mandate: These questions must stem directly from your analysis of the candidate's career trajectory as presented in the resume. They should probe their motivations, rationale for key transitions, and self-awareness. Target the potential "red flags" you identified, framing them as opportunities for the candidate to demonstrate growth, resilience, or strategic thinking. Do not ask generic questions like "Tell me about yourself." Instead, ask pointed questions like, "I noticed you transitioned from [Industry/Role A] to [Industry/Role B]. What catalyzed that specific change, and how did it prepare you for the challenges outlined in our job description?"
+
+Answer Construction: The answers here should solidify the candidate's career narrative. They must explain the "why" behind their decisions, connecting past experiences to their future ambitions for this specific role.
+
+Category 2: Role-Based Questions (2 Questions)
+
+Mandate: These questions must be surgical strikes that connect a specific, critical requirement from the job description with a concrete project or achievement from the resume. Frame the questions behaviorally to compel storytelling. For example, instead of "Do you have experience with X?", ask, "The job requires extensive experience with [Tool/Skill X from JD]. Describe your most challenging project from your time at [Company from Resume] where you leveraged this skill to overcome a significant obstacle."
+
+Answer Construction: The answers MUST implicitly or explicitly follow the STAR method (Situation, Task, Action, Result).
+
+Situation: Briefly set the context of the project or challenge.
+
+Task: Describe the specific goal or objective you were responsible for.
+
+Action: Detail the specific, individual steps you took to address the task. This is the most important part.
+
+Result: Quantify the outcome. Use metrics, data, and tangible business impact (e.g., "reduced latency by 30%", "increased user engagement by 15%", "saved the project $50k in operational costs"). The result must tie back to the value sought in the job description.
+
+STRICT OUTPUT REQUIREMENTS:
+
+You must return ONLY a valid JSON object with the following EXACT structure. Do not include any text before or after the JSON object. Do not create additional categories beyond these two (no "behavioral_questions" or other categories).
+
+IMPORTANT: Ensure that ALL quotes within your JSON string values are properly escaped with backslashes (e.g., "He said \"Hello\" to me"). Also ensure that all special characters like newlines are properly escaped as \\n. This is CRITICAL for the JSON to be parseable.
+
+```json
+{
+  "general_questions": [
+    {
+      "question": "Specific question targeting career narrative...",
+      "talking_points": ["Key point 1", "Key point 2", "Key point 3"],
+      "answer": "Complete first-person answer using STAR method with properly escaped quotes like \\\"example\\\"..."
+    }
+  ],
+  "role_based_questions": [
+    {
+      "question": "Specific role-based question...",
+      "talking_points": ["Key point 1", "Key point 2", "Key point 3"],
+      "answer": "Complete first-person answer using STAR method with properly escaped quotes like \\\"example\\\"..."
+    }
+  ]
+}
+```
+
+QUALITY DIRECTIVES:
+
+No Generic Content: Every question and answer must be rigorously tailored to the provided resume and job description.
+
+Strategic Talking Points: The talking_points should not be a mere summary of the answer. They should be concise, strategic bullet points outlining the core message and the key skills being demonstrated (e.g., "Demonstrate proactive problem-solving," "Highlight quantitative impact," "Connect past project to this company's specific needs").
+
+Authentic Voice: The sample answer should be written in a confident, professional, and natural first-person voice. It should be comprehensive but not verbose.
+
+CONTEXT:
+
+COMPANY: {COMPANY}
+
+JOB TITLE: {JOB_TITLE}
+
+JOB DESCRIPTION: {JOB_DESCRIPTION}
+
+FULL RESUME TEXT: {FULL_RESUME_TEXT}"""
+}
+
+# Placeholders each prompt type is rendered with; a template has to use the required ones
+PLACEHOLDERS = {
+    'paragraphs': {
+        'required': ('JOB_DESCRIPTION', 'SELECTED_PARAGRAPHS_JSON'),
+        'optional': ('COMPANY', 'JOB_TITLE', 'PARAGRAPH_COUNT', 'TOTAL_CHAR_LIMIT', 'TOTAL_WORD_LIMIT', 'JSON_STRUCTURE'),
+    },
+    'single_paragraph': {
+        'required': ('JOB_DESCRIPTION', 'ORIGINAL_PARAGRAPH'),
+        'optional': ('COMPANY', 'JOB_TITLE', 'WORD_LIMIT', 'JSON_STRUCTURE'),
+    },
+    'cover_letter': {
+        'required': ('JOB_DESCRIPTION', 'FULL_RESUME_TEXT'),
+        'optional': ('COMPANY', 'JOB_TITLE', 'JSON_STRUCTURE'),
+    },
+    'interview_prep': {
+        'required': ('JOB_DESCRIPTION', 'FULL_RESUME_TEXT'),
+        'optional': ('COMPANY', 'JOB_TITLE', 'JSON_STRUCTURE'),
+    },
+}
+
+# Appended to every prompt, custom ones included, so the response stays parseable
+OUTPUT_REQUIREMENTS = {
+    'paragraphs': ("\n\nCRITICAL OUTPUT: Your entire response MUST be a single, valid JSON object with this exact structure:\n",
+                   '{ "customized_paragraphs": { "paragraph_id_1": "new_text_1", ... } }'),
+    'single_paragraph': ("\n\nCRITICAL OUTPUT: Your entire response MUST be a single, valid JSON object with this exact structure:\n",
+                         '{ "enhanced_text": "The new, enhanced paragraph text here..." }'),
+    'cover_letter': ("\n\nCRITICAL OUTPUT: Your entire response MUST be a single, valid JSON object with this exact structure:\n",
+                     '{\n "cover_letter": "The full cover letter text here...",\n  "match_score": 85,\n  "match_score_analysis": {\n    "strengths": "Strengths of candidacy...",\n    "gaps": "Potential gaps and weaknesses...",\n    "justification": "Score justification..."\n }\n}'),
+    'interview_prep': ("\n\nCRITICAL OUTPUT: Your entire response MUST be a single, valid JSON object with this exact structure. Do not add any text or markdown before or after the JSON object.\n",
+                       '{\n "general_questions": [\n    { "question": "...", "talking_points": ["..."], "answer": "..." }\n ],\n  "role_based_questions": [\n    { "question": "...", "talking_points": ["..."], "answer": "..." }\n  ]\n}'),
+}
+
+MAX_PROMPT_CHARS = 50000
+# Distinct template texts kept compiled per process (defaults, custom prompts, cached-context bodies)
+COMPILED_CACHE_SIZE = 256
+
+_placeholder_re = re.compile(r'\{([A-Z_]+)\}')
+# Anything that looks like a placeholder, to catch {company} or { COMPANY } typos
+_loose_placeholder_re = re.compile(r'\{\s*([A-Za-z][A-Za-z_ ]*?)\s*\}')
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+# Stored prompts never change (a new text is a new row), so workers keep them once loaded
+_stored = {}
+
+
+class PromptValidationError(ValueError):
+    def __init__(self, prompt_key, problems):
+        super().__init__(f"Invalid {prompt_key} prompt: " + '; '.join(problems))
+        self.prompt_key = prompt_key
+        self.problems = problems
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class PromptTemplate:
+    """A prompt template split into literal text and placeholder names"""
+
+    def __init__(self, prompt_key, text, digest=None):
+        self.prompt_key = prompt_key
+        self.text = text
+        self.hash = digest or content_hash(text)
+        # re.split with one group alternates literal, name, literal, ...
+        parts = _placeholder_re.split(text)
+        self._literals = parts[0::2]
+        self._names = parts[1::2]
+        self.placeholders = frozenset(self._names)
+
+    def render(self, values):
+        """Fill in the placeholders in one pass; ones without a value stay as they are"""
+        out = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:]):
+            out.append(str(values[name]) if name in values else '{' + name + '}')
+            out.append(literal)
+        return ''.join(out)
+
+
+def compile_template(prompt_key, text):
+    digest = content_hash(text)
+    cache_key = (prompt_key, digest)
+    with _compiled_lock:
+        template = _compiled.get(cache_key)
+        if template is not None:
+            _compiled.move_to_end(cache_key)
+            return template
+    template = PromptTemplate(prompt_key, text, digest)
+    with _compiled_lock:
+        _compiled[cache_key] = template
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return template
+
+
+def validate(prompt_key, text):
+    """Problems that would make a template render badly; empty when it is fine"""
+    spec = PLACEHOLDERS.get(prompt_key)
+    if spec is None:
+        return [f"Unknown prompt type '{prompt_key}'"]
+    if not isinstance(text, str) or not text.strip():
+        return ["Prompt is empty"]
+    if len(text) > MAX_PROMPT_CHARS:
+        return [f"Prompt is longer than {MAX_PROMPT_CHARS} characters"]
+
+    allowed = set(spec['required']) | set(spec['optional'])
+    used = compile_template(prompt_key, text).placeholders
+    problems = [f"Missing required placeholder {{{name}}}" for name in spec['required'] if name not in used]
+    problems += [f"Unknown placeholder {{{name}}}" for name in sorted(used - allowed)]
+    for match in _loose_placeholder_re.finditer(text):
+        name = match.group(1).strip().upper().replace(' ', '_')
+        if name in allowed and match.group(0) != f"{{{name}}}":
+            problems.append(f"Malformed placeholder {match.group(0)} (did you mean {{{name}}}?)")
+    return problems
+
+
+def get_template(prompt_key, custom_prompts=None):
+    """Compiled template for a prompt type: the custom text if there is one, otherwise the default"""
+    return compile_template(prompt_key, (custom_prompts or {}).get(prompt_key) or DEFAULT_PROMPTS[prompt_key])
+
+
+# Where each question group's section starts in the default interview prompt
+INTERVIEW_SECTIONS = {
+    'general_questions': 'Category 1: General & Career Narrative Questions',
+    'role_based_questions': 'Category 2: Role-Based Questions',
+}
+_INTERVIEW_SECTIONS_END = 'STRICT OUTPUT REQUIREMENTS:'
+_json_group_re = re.compile(r'  "(\w+)": \[\n.*?\n  \]', re.DOTALL)
+
+
+def interview_prep_text(groups, custom_prompts=None):
+    """Interview prep template text that only asks for the given question groups.
+
+    The default prompt loses the sections and example JSON of the other groups;
+    a custom prompt can't be cut safely, so it gets a note naming the groups instead.
+    """
+    text = (custom_prompts or {}).get('interview_prep') or DEFAULT_PROMPTS['interview_prep']
+    skipped = [group for group in INTERVIEW_SECTIONS if group not in groups]
+    if not skipped:
+        return text
+    if text != DEFAULT_PROMPTS['interview_prep']:
+        names = ', '.join(f'"{group}"' for group in groups)
+        return text + f"\n\nOnly generate {names} this time; the other question groups are already done."
+
+    starts = sorted((text.index(heading), group) for group, heading in INTERVIEW_SECTIONS.items())
+    ends = [start for start, _ in starts[1:]] + [text.index(_INTERVIEW_SECTIONS_END)]
+    for (start, group), end in reversed(list(zip(starts, ends))):
+        if group in skipped:
+            text = text[:start] + text[end:]
+    example = text[text.index('```json'):text.index('```', text.index('```json') + 7)]
+    kept = ',\n'.join(m.group(0) for m in _json_group_re.finditer(example) if m.group(1) in groups)
+    text = text.replace(example, '```json\n{\n' + kept + '\n}\n')
+    count = 'one category' if len(groups) == 1 else f"{len(groups)} distinct categories"
+    return (text.replace('generate two distinct categories of questions', f"generate {count} of questions")
+                .replace('Do not create additional categories beyond these two', 'Do not create any other categories'))
+
+
+def render(prompt_key, template, placeholders):
+    """Final prompt text: the filled-in template plus the JSON output requirement"""
+    header, structure = OUTPUT_REQUIREMENTS[prompt_key]
+    return template.render(placeholders) + header + str(placeholders.get('JSON_STRUCTURE', structure))
+
+
+def save_custom(session_id, prompt_key, text):
+    """Validate and store a custom prompt; saving the same text again returns the existing one"""
+    from core.models import db, CustomPrompt  # here so importing core.processor doesn't load SQLAlchemy
+
+    problems = validate(prompt_key, text)
+    if problems:
+        raise PromptValidationError(prompt_key, problems)
+    digest = content_hash(text)
+    prompt = CustomPrompt.query.filter_by(user_session_id=session_id, prompt_key=prompt_key, content_hash=digest).first()
+    if prompt is None:
+        prompt = CustomPrompt(user_session_id=session_id, prompt_key=prompt_key, text=text, content_hash=digest)
+        db.session.add(prompt)
+        db.session.commit()
+    return prompt
+
+
+def load_custom(prompt_ids, session_id):
+    """{prompt_key: text} for stored prompt ids ({prompt_key: id}) owned by the session"""
+    custom = {}
+    for prompt_key, prompt_id in (prompt_ids or {}).items():
+        try:
+            prompt_id = int(prompt_id)
+        except (TypeError, ValueError):
+            raise PromptValidationError(prompt_key, [f"Invalid prompt id {prompt_id!r}"])
+        stored = _stored.get(prompt_id)
+        if stored is None:
+            from core.models import CustomPrompt
+            prompt = CustomPrompt.query.get(prompt_id)
+            if prompt is None:
+                raise PromptValidationError(prompt_key, [f"Custom prompt {prompt_id} not found"])
+            stored = _stored[prompt_id] = (prompt.user_session_id, prompt.prompt_key, prompt.text)
+        owner, stored_key, text = stored
+        if owner != session_id or stored_key != prompt_key:
+            raise PromptValidationError(prompt_key, [f"Custom prompt {prompt_id} not found"])
+        custom[prompt_key] = text
+    return custom
+
+
+def normalize_request(data, session_id):
+    """Check a generation request's custom prompts before it is queued.
+
+    Stored prompts (custom_prompt_ids) must belong to the session. Inline ones
+    (custom_prompts, sent by older clients) are validated and dropped when they are
+    just the defaults, so the task payload only carries real customizations.
+    Raises PromptValidationError.
+    """
+    prompt_ids = {key: value for key, value in (data.get('custom_prompt_ids') or {}).items() if value}
+    load_custom(prompt_ids, session_id)
+    inline = {}
+    for prompt_key, text in (data.get('custom_prompts') or {}).items():
+        if not text or prompt_key in prompt_ids or text == DEFAULT_PROMPTS.get(prompt_key):
+            continue
+        problems = validate(prompt_key, text)
+        if problems:
+            raise PromptValidationError(prompt_key, problems)
+        inline[prompt_key] = text
+    data['custom_prompt_ids'] = prompt_ids
+    data['custom_prompts'] = inline
+
+
+def for_task(data):
+    """{prompt_key: text} of the custom prompts a queued task should use"""
+    custom = dict(data.get('custom_prompts') or {})
+    custom.update(load_custom(data.get('custom_prompt_ids'), data.get('session_id')))
+    return custom
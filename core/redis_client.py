@@ -0,0 +1,35 @@
+import redis
+
+from core.config import REDIS_URL
+
+_redis_client = None
+_binary_client = None
+
+
+def get_redis():
+    """Process-wide Redis client for caching, metrics and tracing (created on first use)"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+def get_binary_redis():
+    """Client without response decoding, for packed (msgpack + zlib) values"""
+    global _binary_client
+    if _binary_client is None:
+        _binary_client = redis.Redis.from_url(REDIS_URL)
+    return _binary_client
+
+
+# Delete a key only while it still holds the expected value (an ownership-safe unlock)
+_DELETE_IF_EQUALS_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def delete_if_equals(key, value):
+    return get_redis().eval(_DELETE_IF_EQUALS_SCRIPT, 1, key, value)
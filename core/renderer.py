@@ -0,0 +1,268 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from core import metrics
+from core.config import UPLOAD_FOLDER
+
+
+def get_pythoncom():
+    """pythoncom ships with pywin32 and only exists on Windows; return None elsewhere"""
+    try:
+        import pythoncom
+        return pythoncom
+    except ImportError:
+        return None
+
+
+class DocumentRenderer:
+    """Reads resumes from DOCX and renders customized resumes, cover letters and PDFs"""
+
+    def __init__(self, upload_folder=UPLOAD_FOLDER):
+        self.upload_folder = upload_folder
+
+    def warm_up(self):
+        """Initialize COM and python-docx ahead of the first request (the slow part of a cold download)"""
+        from docx import Document
+        pythoncom = get_pythoncom()
+        try:
+            if pythoncom is not None:
+                pythoncom.CoInitialize()
+            temp_doc = Document()
+            temp_doc.add_paragraph("Initialization test")
+            temp_path = tempfile.mktemp(suffix='.docx')
+            temp_doc.save(temp_path)
+            os.remove(temp_path)
+            # Import modules that might be slow on first use
+            import docx2pdf
+        finally:
+            try:
+                if pythoncom is not None:
+                    pythoncom.CoUninitialize()
+            except:
+                pass
+
+    def extract_text_from_docx(self, file_path):
+        from docx import Document
+        try:
+            doc = Document(file_path)
+            paragraphs = []
+            full_text = []
+            for i, paragraph in enumerate(doc.paragraphs):
+                text = paragraph.text.strip()
+                if not text:
+                    continue
+                full_text.append(text)
+                para_info = {'id': i, 'text': text}
+                paragraphs.append(para_info)
+            return {'paragraphs': paragraphs, 'full_text': '\n'.join(full_text)}
+        except Exception as e:
+            raise Exception(f"Error processing DOCX file: {str(e)}")
+
+    def update_docx_with_customizations(self, original_file_path, customizations):
+        # Handle case where customized_paragraphs might be a JSON string from database
+        customized_paragraphs_dict = customizations.get('customized_paragraphs', {})
+
+        # If it's a string (from database), parse it back to dict
+        if isinstance(customized_paragraphs_dict, str):
+            try:
+                customized_paragraphs_dict = json.loads(customized_paragraphs_dict)
+            except json.JSONDecodeError:
+                print(f"Warning: Could not parse customized_paragraphs JSON string: {customized_paragraphs_dict}")
+                customized_paragraphs_dict = {}
+
+        # Ensure it's a dictionary
+        if not isinstance(customized_paragraphs_dict, dict):
+            print(f"Warning: customized_paragraphs is not a dict: {type(customized_paragraphs_dict)}")
+            customized_paragraphs_dict = {}
+
+        # Newer results also carry {"<paragraph id>": {"original", "enhanced"}}; the id is the index in doc.paragraphs
+        paragraphs_by_id = customizations.get('paragraphs')
+        if not isinstance(paragraphs_by_id, dict):
+            paragraphs_by_id = {}
+
+        from docx import Document
+        try:
+            with metrics.timer('resumeai_docx_render_duration_seconds', document='resume'):
+                doc = Document(original_file_path)
+                doc_paragraphs = doc.paragraphs
+                if paragraphs_by_id:
+                    applied_ids, applied_texts = set(), set()
+                    for pid, customized in paragraphs_by_id.items():
+                        pid = int(pid) if str(pid).isdigit() else -1
+                        if not 0 <= pid < len(doc_paragraphs) or not isinstance(customized, dict):
+                            continue
+                        para = doc_paragraphs[pid]
+                        if customized.get('original') is not None and para.text.strip() != customized['original']:
+                            print(f"Warning: paragraph {pid} no longer matches its original text; skipped")
+                            continue
+                        para.text = ""
+                        para.add_run(customized.get('enhanced') or '')
+                        applied_ids.add(pid)
+                        applied_texts.add(customized.get('original'))
+                    # Text-keyed entries the id map doesn't know about (e.g. a paragraph regenerated on its own
+                    # by an older client) still apply, to paragraphs that weren't customized by id
+                    for pid, para in enumerate(doc_paragraphs):
+                        original_text = para.text.strip()
+                        if pid not in applied_ids and original_text not in applied_texts \
+                                and original_text in customized_paragraphs_dict:
+                            para.text = ""
+                            para.add_run(customized_paragraphs_dict[original_text])
+                else:
+                    for para in doc_paragraphs:
+                        original_text = para.text.strip()
+                        if original_text in customized_paragraphs_dict:
+                            new_text = customized_paragraphs_dict[original_text]
+                            para.text = ""
+                            para.add_run(new_text)
+                temp_path = tempfile.mktemp(suffix='.docx')
+                doc.save(temp_path)
+            return temp_path
+        except Exception as e:
+            raise Exception(f"Error updating DOCX: {str(e)}")
+
+    def create_cover_letter_docx(self, cover_letter_text, company_name, user_name):
+        """Create a DOCX document from cover letter text - just plain text, nothing else"""
+        from docx import Document
+        try:
+            with metrics.timer('resumeai_docx_render_duration_seconds', document='cover_letter'):
+                doc = Document()
+
+                # Add cover letter content as plain text - no headers, footers, or formatting
+                # Split into paragraphs and add each one
+                paragraphs = cover_letter_text.split('\n\n')
+                for para_text in paragraphs:
+                    if para_text.strip():
+                        para = doc.add_paragraph()
+                        para.add_run(para_text.strip())
+
+                # Save to temporary file
+                temp_path = tempfile.mktemp(suffix='_resume.docx')
+                doc.save(temp_path)
+            return temp_path
+
+        except Exception as e:
+            raise Exception(f"Error creating cover letter DOCX: {str(e)}")
+
+    def convert_docx_to_pdf(self, docx_path, output_filename):
+        """Convert DOCX to PDF using a method that works in Celery workers"""
+        start_time = time.time()
+        try:
+            pdf_filename = f"{output_filename}.pdf"
+            pdf_path = os.path.join(self.upload_folder, pdf_filename)
+
+            print(f"Attempting PDF conversion: {docx_path} -> {pdf_path}")
+
+            # Try multiple PDF conversion methods
+            conversion_method = None
+
+            # Method 1: Try docx2pdf with better error handling (preserves formatting best)
+            pythoncom = get_pythoncom()
+            try:
+                if pythoncom is None:
+                    raise Exception("docx2pdf needs Microsoft Word through COM, which is only available on Windows")
+                pythoncom.CoInitialize()
+                from docx2pdf import convert
+                convert(docx_path, pdf_path)
+
+                if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+                    print(f"PDF conversion successful using docx2pdf: {pdf_path}")
+                    conversion_method = 'docx2pdf'
+                else:
+                    raise Exception("PDF file was not created or is empty")
+
+            except Exception as e:
+                print(f"docx2pdf failed: {e}")
+                # Try method 2: Use pypandoc with DOCX as intermediate format
+                try:
+                    import pypandoc
+
+                    # First convert DOCX to DOCX (this preserves formatting)
+                    # Then convert to PDF
+                    temp_docx_path = tempfile.mktemp(suffix='.docx')
+
+                    # Use pandoc to convert DOCX to PDF with better formatting preservation
+                    output = pypandoc.convert_file(
+                        docx_path,
+                        'pdf',
+                        outputfile=pdf_path,
+                        extra_args=[
+                            '--pdf-engine=pdflatex',  # Use LaTeX for better formatting
+                            '--standalone',           # Create standalone document
+                            '--self-contained',       # Embed all resources
+                            '--number-sections',      # Number sections
+                            '--toc',                  # Table of contents
+                            '--toc-depth=2',          # TOC depth
+                        ]
+                    )
+
+                    if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+                        print(f"PDF conversion successful using pypandoc with LaTeX: {pdf_path}")
+                        conversion_method = 'pandoc_latex'
+                    else:
+                        raise Exception("PDF file was not created or is empty")
+
+                except ImportError:
+                    print("pypandoc not available")
+                except Exception as e2:
+                    print(f"pypandoc failed: {e2}")
+                    # Try method 3: Simple pypandoc conversion
+                    try:
+                        import pypandoc
+                        output = pypandoc.convert_file(docx_path, 'pdf', outputfile=pdf_path)
+                        if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+                            print(f"PDF conversion successful using simple pypandoc: {pdf_path}")
+                            conversion_method = 'pandoc'
+                        else:
+                            raise Exception("PDF file was not created or is empty")
+                    except Exception as e3:
+                        print(f"Simple pypandoc also failed: {e3}")
+
+            finally:
+                # Always clean up COM
+                try:
+                    if pythoncom is not None:
+                        pythoncom.CoUninitialize()
+                except:
+                    pass
+
+            if conversion_method:
+                metrics.observe('resumeai_pdf_conversion_duration_seconds', time.time() - start_time, method=conversion_method, outcome='success')
+                return pdf_path, pdf_filename
+            else:
+                raise Exception("All PDF conversion methods failed")
+
+        except Exception as e:
+            print(f"PDF conversion failed: {e}. Falling back to DOCX.")
+            print(f"Error type: {type(e).__name__}")
+            print(f"Error details: {str(e)}")
+
+            # Try to clean up any partially created files
+            try:
+                pdf_filename = f"{output_filename}.pdf"
+                pdf_path = os.path.join(self.upload_folder, pdf_filename)
+                if os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+                    print(f"Cleaned up failed PDF file: {pdf_path}")
+            except Exception as cleanup_error:
+                print(f"Warning: Could not clean up failed PDF file: {cleanup_error}")
+
+            # Fallback to DOCX
+            docx_filename = f"{output_filename}.docx"
+            final_docx_path = os.path.join(self.upload_folder, docx_filename)
+            shutil.copy2(docx_path, final_docx_path)
+            metrics.observe('resumeai_pdf_conversion_duration_seconds', time.time() - start_time, method='docx_fallback', outcome='error')
+            return final_docx_path, docx_filename
+
+    def convert_docx_to_docx(self, docx_path, output_filename):
+        """Simple function to just copy DOCX file - for when user explicitly requests DOCX"""
+        try:
+            docx_filename = f"{output_filename}.docx"
+            final_docx_path = os.path.join(self.upload_folder, docx_filename)
+            shutil.copy2(docx_path, final_docx_path)
+            print(f"DOCX copy successful: {final_docx_path}")
+            return final_docx_path, docx_filename
+        except Exception as e:
+            raise Exception(f"Error copying DOCX file: {str(e)}")
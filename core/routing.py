@@ -0,0 +1,150 @@
+import json
+import time
+
+from core.config import (GEMINI_MODELS, LLM_ROUTING_ENABLED, LLM_ROUTING_MAX_ERROR_RATE,
+                         LLM_ROUTING_MAX_PARSE_FAILURE_RATE, LLM_ROUTING_MIN_SAMPLES, LLM_ROUTING_SLOS,
+                         LLM_ROUTING_WINDOW_SECONDS)
+from core.redis_client import get_redis
+
+# Rolling outcome windows per (model, prompt_key), shared by every worker:
+#   route:calls:<model>:<prompt_key>   "<time>|<latency>|<ok>" for the last STATS_WINDOW calls
+#   route:parse:<model>:<prompt_key>   "<time>|<1/0>" per response - did it parse without the lossy fallbacks
+#   route:decisions                    the last DECISION_LOG_SIZE routing decisions (JSON)
+# Samples older than LLM_ROUTING_WINDOW_SECONDS are ignored. A model routed away from
+# gets no new samples, so this is what lets it recover.
+STATS_WINDOW = 100
+DECISION_LOG_SIZE = 500
+
+# Parse paths that recovered the whole JSON object; the others salvage fragments or fail
+CLEAN_PARSE_PATHS = {'clean', 'fix_common_issues', 'full_response', 'full_response_fixed'}
+
+
+def _push(key, value):
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.lpush(key, value)
+    pipe.ltrim(key, 0, STATS_WINDOW - 1)
+    pipe.execute()
+
+
+def record_call(model_name, prompt_key, seconds, ok):
+    try:
+        _push(f"route:calls:{model_name}:{prompt_key}", f"{time.time():.0f}|{seconds:.3f}|{1 if ok else 0}")
+    except Exception as e:
+        print(f"Routing warning: could not record call: {e}")
+
+
+def record_parse(model_name, prompt_key, path):
+    try:
+        _push(f"route:parse:{model_name}:{prompt_key}", f"{time.time():.0f}|{1 if path in CLEAN_PARSE_PATHS else 0}")
+    except Exception as e:
+        print(f"Routing warning: could not record parse result: {e}")
+
+
+def _recent(entries, fields):
+    """Entries newer than the routing window, without their timestamp"""
+    cutoff = time.time() - LLM_ROUTING_WINDOW_SECONDS
+    recent = []
+    for entry in entries:
+        parts = entry.split('|')
+        if len(parts) == fields + 1 and float(parts[0]) >= cutoff:
+            recent.append(parts[1:])
+    return recent
+
+
+def model_stats(model_name, prompt_key):
+    """p90 latency of successful calls, error rate and parse failure rate over the recent window"""
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.lrange(f"route:calls:{model_name}:{prompt_key}", 0, -1)
+    pipe.lrange(f"route:parse:{model_name}:{prompt_key}", 0, -1)
+    calls, parses = pipe.execute()
+
+    outcomes = _recent(calls, 2)
+    parses = [clean for clean, in _recent(parses, 1)]
+    latencies = sorted(float(latency) for latency, ok in outcomes if ok == '1')
+    return {
+        'samples': len(outcomes),
+        'p90_latency': latencies[int(0.9 * (len(latencies) - 1))] if latencies else None,
+        'error_rate': round(sum(1 for _, ok in outcomes if ok == '0') / len(outcomes), 3) if outcomes else None,
+        'parse_failure_rate': round(parses.count('0') / len(parses), 3) if parses else None,
+    }
+
+
+def _problems(stats, prompt_key):
+    """Why a model currently misses its SLO for a prompt type (empty when healthy or not enough data)"""
+    if stats['samples'] < LLM_ROUTING_MIN_SAMPLES:
+        return []
+    problems = []
+    slo = LLM_ROUTING_SLOS.get(prompt_key)
+    if slo and stats['p90_latency'] is not None and stats['p90_latency'] > slo:
+        problems.append(f"{prompt_key} p90 {stats['p90_latency']:.1f}s > {slo}s")
+    if stats['error_rate'] is not None and stats['error_rate'] > LLM_ROUTING_MAX_ERROR_RATE:
+        problems.append(f"{prompt_key} error rate {stats['error_rate']:.0%}")
+    if stats['parse_failure_rate'] is not None and stats['parse_failure_rate'] > LLM_ROUTING_MAX_PARSE_FAILURE_RATE:
+        problems.append(f"{prompt_key} parse failures {stats['parse_failure_rate']:.0%}")
+    return problems
+
+
+def _has_data(stats_by_key):
+    return all(stats['samples'] >= LLM_ROUTING_MIN_SAMPLES for stats in stats_by_key.values())
+
+
+def _log_decision(decision):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.lpush('route:decisions', json.dumps(decision))
+        pipe.ltrim('route:decisions', 0, DECISION_LOG_SIZE - 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"Routing warning: could not log decision: {e}")
+
+
+def choose_models(requested_model, prompt_keys, job_id=None):
+    """Order in which a task should try models for the given prompt types.
+
+    Starts from the user's model with the usual fallback to flash. If the requested
+    model is missing its latency SLO (or erroring / returning unparseable JSON) for
+    any of the prompt types and another model is healthy over at least
+    LLM_ROUTING_MIN_SAMPLES calls, the healthy one goes first and the requested model
+    becomes the fallback. Models without that much data are never promoted.
+    """
+    models = [requested_model]
+    if requested_model != 'gemini-2.5-flash':
+        models.append('gemini-2.5-flash')
+    if not LLM_ROUTING_ENABLED:
+        return models
+
+    decision = {'time': time.time(), 'job_id': job_id, 'prompt_keys': list(prompt_keys),
+                'requested': requested_model, 'stats': {}, 'problems': {}}
+    try:
+        for model in GEMINI_MODELS:
+            stats = {key: model_stats(model, key) for key in prompt_keys}
+            decision['stats'][model] = stats
+            decision['problems'][model] = [p for key in prompt_keys for p in _problems(stats[key], key)]
+    except Exception as e:
+        print(f"Routing warning: could not read model stats, keeping {requested_model}: {e}")
+        return models
+
+    problems = decision['problems'].get(requested_model)
+    if problems is None:
+        decision['reason'] = 'unknown model, keeping the default order'
+    elif problems:
+        # Only fail over to models whose health is backed by enough recent calls
+        healthy = [m for m in GEMINI_MODELS if m != requested_model and not decision['problems'][m]
+                   and _has_data(decision['stats'][m])]
+        if healthy:
+            models = [healthy[0]] + [m for m in models if m != healthy[0]]
+            decision['reason'] = f"{requested_model} degraded: " + '; '.join(problems)
+        else:
+            decision['reason'] = 'no other model proven healthy, keeping requested model'
+    else:
+        decision['reason'] = 'requested model within SLO'
+
+    decision['chosen'] = models
+    if models[0] != requested_model:
+        print(f"🔀 Routing {'/'.join(prompt_keys)} to {models[0]} instead of {requested_model}: {decision['reason']}")
+    _log_decision(decision)
+    return models
+
+
+def recent_decisions(limit=50):
+    return [json.loads(item) for item in get_redis().lrange('route:decisions', 0, limit - 1)]
@@ -0,0 +1,46 @@
+import hashlib
+import json
+
+from core import metrics
+
+# Generated sections of a result, each stored with a hash of the exact inputs that made it:
+#   {"paragraph:<id>": {"inputs": <hash>, "value": <enhanced text>},
+#    "cover_letter":   {"inputs": <hash>, "value": {cover_letter, match_score, match_score_analysis}}}
+# Interview prep keeps {group: <hash>} under 'section_inputs' of the prep itself.
+# A regeneration recomputes the sections it names and any whose inputs changed; the rest are reused.
+# The cover letter depends on the paragraphs' inputs rather than their text, so regenerating
+# a paragraph with the same inputs doesn't make the cover letter stale.
+
+INTERVIEW_GROUPS = ('general_questions', 'role_based_questions')
+
+
+def input_hash(*inputs):
+    encoded = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:24]
+
+
+def entry(inputs, value):
+    return {'inputs': inputs, 'value': value}
+
+
+def paragraph(paragraph_id):
+    return f"paragraph:{paragraph_id}"
+
+
+def reusable(stored, name, inputs):
+    """The stored entry of a section if it was made from these inputs, else None"""
+    found = (stored or {}).get(name)
+    return found if found and found.get('inputs') == inputs else None
+
+
+def interview_groups(requested):
+    """Question groups a regeneration asks for; None (or nothing valid) means all of them"""
+    groups = [group for group in requested or () if group in INTERVIEW_GROUPS]
+    return groups or list(INTERVIEW_GROUPS)
+
+
+def count(kind, reused, computed):
+    if reused:
+        metrics.inc('resumeai_sections_total', amount=reused, kind=kind, result='reused')
+    if computed:
+        metrics.inc('resumeai_sections_total', amount=computed, kind=kind, result='computed')
@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from core.redis_client import delete_if_equals, get_redis
+
+# How long an in-flight claim lives if the worker never releases it (crash, lost task)
+SINGLEFLIGHT_TTL_SECONDS = 900
+
+
+def request_key(kind, **fields):
+    """Stable key for a generation request - identical inputs give the same key"""
+    canonical = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"singleflight:{kind}:{digest}"
+
+
+def claim(key, job_id, ttl=SINGLEFLIGHT_TTL_SECONDS):
+    """Register job_id as the owner of key.
+
+    Returns None when the claim succeeded (caller should enqueue the job), or the
+    id of the job already running for the same inputs. If Redis is unavailable the
+    request is never deduplicated.
+    """
+    try:
+        client = get_redis()
+        if client.set(key, job_id, nx=True, ex=ttl):
+            return None
+        return client.get(key)
+    except Exception as e:
+        print(f"Single-flight warning: could not claim {key}: {e}")
+        return None
+
+
+def release(key, job_id):
+    """Drop the claim once the job has finished so later identical requests run again"""
+    if not key:
+        return
+    try:
+        # Only the owning job may release - the claim may have expired and been re-taken
+        delete_if_equals(key, job_id)
+    except Exception as e:
+        print(f"Single-flight warning: could not release {key}: {e}")
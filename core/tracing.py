@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from core.redis_client import get_redis
+
+# Spans for one task are appended to a capped Redis list; the index of recent
+# traces is capped too, so tracing can stay on in production. The session that
+# started a trace is stored next to it (trace:<id>:owner) before the first span.
+TRACE_TTL_SECONDS = 24 * 3600
+MAX_SPANS_PER_TRACE = 500
+MAX_TRACES = 1000
+
+# eventlet.monkey_patch() turns this into greenlet-local storage, so concurrent
+# tasks in one worker process each see their own span stack.
+_local = threading.local()
+
+
+class Span:
+    def __init__(self, trace_id, name, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.status = 'ok'
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration_ms': round(((self.end or time.time()) - self.start) * 1000, 2),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned when no trace is active (e.g. processor methods called from the web app)"""
+
+    def set(self, **attributes):
+        pass
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _record(span):
+    try:
+        client = get_redis()
+        key = f"trace:{span.trace_id}"
+        pipe = client.pipeline(transaction=False)
+        pipe.rpush(key, json.dumps(span.to_dict(), default=str))
+        pipe.ltrim(key, -MAX_SPANS_PER_TRACE, -1)
+        pipe.expire(key, TRACE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        print(f"Tracing warning: could not record span {span.name}: {e}")
+
+
+def _register_trace(trace_id, owner):
+    try:
+        client = get_redis()
+        if owner:
+            client.set(f"trace:{trace_id}:owner", owner, ex=TRACE_TTL_SECONDS)
+        client.zadd('traces:index', {trace_id: time.time()})
+        overflow = client.zcard('traces:index') - MAX_TRACES
+        if overflow > 0:
+            stale = client.zrange('traces:index', 0, overflow - 1)
+            if stale:
+                client.delete(*[f"trace:{trace_id}" for trace_id in stale], *[f"trace:{trace_id}:owner" for trace_id in stale])
+                client.zrem('traces:index', *stale)
+    except Exception as e:
+        print(f"Tracing warning: could not register trace {trace_id}: {e}")
+
+
+@contextmanager
+def _run(span):
+    stack = _stack()
+    stack.append(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = 'error'
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end = time.time()
+        stack.pop()
+        _record(span)
+
+
+@contextmanager
+def start_trace(trace_id, name, **attributes):
+    """Open the root span of a trace (one per Celery task, keyed by task id)"""
+    _register_trace(trace_id, attributes.get('session_id'))
+    saved = _stack()[:]
+    _local.stack = []
+    try:
+        with _run(Span(trace_id, name, attributes=attributes)) as root:
+            yield root
+    finally:
+        _local.stack = saved
+
+
+@contextmanager
+def span(name, **attributes):
+    """Open a child span of the current span; a no-op when no trace is active"""
+    stack = _stack()
+    if not stack:
+        yield _NoopSpan()
+        return
+    parent = stack[-1]
+    with _run(Span(parent.trace_id, name, parent_id=parent.span_id, attributes=attributes)) as child:
+        yield child
+
+
+def annotate(**attributes):
+    """Attach attributes to the innermost open span, if any"""
+    stack = _stack()
+    if stack:
+        stack[-1].set(**attributes)
+
+
+def trace_owner(trace_id):
+    """Session id that started a trace, or None if it had none or is gone"""
+    return get_redis().get(f"trace:{trace_id}:owner")
+
+
+def get_trace(trace_id):
+    """Return the spans of a trace ordered by start time"""
+    spans = [json.loads(item) for item in get_redis().lrange(f"trace:{trace_id}", 0, -1)]
+    return sorted(spans, key=lambda s: s['start'])
+
+
+def build_waterfall(spans):
+    """Lay spans out as rows (depth-first under their parent) with offsets relative to the trace start"""
+    if not spans:
+        return {'total_ms': 0, 'rows': []}
+
+    trace_start = min(s['start'] for s in spans)
+    trace_end = max(s['end'] or s['start'] for s in spans)
+    total_ms = max((trace_end - trace_start) * 1000, 1)
+
+    children = {}
+    for s in spans:
+        children.setdefault(s['parent_id'], []).append(s)
+
+    known_ids = {s['span_id'] for s in spans}
+    rows = []
+
+    def visit(s, depth):
+        offset_ms = (s['start'] - trace_start) * 1000
+        rows.append(dict(s, depth=depth, offset_ms=round(offset_ms, 2),
+                         offset_pct=round(offset_ms / total_ms * 100, 3),
+                         width_pct=round(max(s['duration_ms'] / total_ms * 100, 0.2), 3)))
+        for child in children.get(s['span_id'], []):
+            visit(child, depth + 1)
+
+    # Roots are spans without a parent, or whose parent was trimmed from the capped list
+    for s in spans:
+        if s['parent_id'] is None or s['parent_id'] not in known_ids:
+            visit(s, 0)
+
+    return {'total_ms': round(total_ms, 2), 'rows': rows}
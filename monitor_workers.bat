@@ -26,22 +26,22 @@ echo.
 
 REM Check Celery workers
 echo Checking Celery workers...
-celery -A app.celery inspect ping > nul 2>&1
+celery -A celery_worker.celery inspect ping > nul 2>&1
 if %errorlevel% neq 0 (
     echo ❌ No Celery workers are running!
 ) else (
     echo ✅ Celery workers are responding
     echo.
     echo Active workers:
-    celery -A app.celery inspect active
+    celery -A celery_worker.celery inspect active
     echo.
     echo Worker statistics:
-    celery -A app.celery inspect stats
+    celery -A celery_worker.celery inspect stats
 )
 
 echo.
 echo Registered tasks:
-celery -A app.celery inspect registered
+celery -A celery_worker.celery inspect registered
 
 echo.
 echo Press Ctrl+C to stop monitoring...
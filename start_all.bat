@@ -8,6 +8,13 @@ if "%1"=="" (
     set "worker_count=%1"
 )
 
+REM Tasks each worker runs at once; raise it (e.g. 20) with LLM_EXECUTION_MODE=async
+if "%2"=="" (
+    set "worker_concurrency=1"
+) else (
+    set "worker_concurrency=%2"
+)
+
 echo Starting ResumeAI with %worker_count% Celery workers...
 echo.
 
@@ -28,14 +35,14 @@ timeout /t 2 /nobreak > nul
 REM Start multiple Celery workers dynamically
 echo Starting %worker_count% Celery workers...
 for /l %%i in (1,1,%worker_count%) do (
-    start /B celery -A app.celery worker --loglevel=info -P eventlet --concurrency=1 -n worker%%i@%h
+    start /B celery -A celery_worker.celery worker --loglevel=info -P eventlet -Q celery,prefetch --concurrency=%worker_concurrency% -n worker%%i@%h
 )
 
 echo.
 echo All services started successfully!
 echo - Flask app: http://127.0.0.1:5001
 echo - Redis: localhost:6379
-echo - Celery workers: %worker_count% workers running (background)
+echo - Celery workers: %worker_count% workers x %worker_concurrency% tasks running (background)
 echo.
 echo To stop all services, run: stop_workers.bat
 echo.
@@ -1 +1 @@
-celery -A app.celery worker --loglevel=info -P eventlet
\ No newline at end of file
+celery -A celery_worker.celery worker --loglevel=info -P eventlet -Q celery,prefetch
\ No newline at end of file
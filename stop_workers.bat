@@ -4,7 +4,7 @@ echo.
 
 REM Method 1: Celery graceful shutdown
 echo Attempting graceful shutdown...
-celery -A app.celery control shutdown > nul 2>&1
+celery -A celery_worker.celery control shutdown > nul 2>&1
 
 REM Method 2: Kill by process name (more forceful)
 echo Stopping any remaining workers...
@@ -18,7 +18,7 @@ taskkill /FI "WINDOWTITLE eq Celery Worker*" /F > nul 2>&1
 
 echo.
 echo Checking if workers are stopped...
-celery -A app.celery inspect ping > nul 2>&1
+celery -A celery_worker.celery inspect ping > nul 2>&1
 if %errorlevel% neq 0 (
     echo ✅ All workers stopped successfully
 ) else (